@@ -0,0 +1,389 @@
+# ================================
+#  ⏱ BENCHMARK: Dados Sintéticos → Bronze → Silver → Gold → Consultas
+# ================================
+# Gera CSVs sintéticos (separador ';') com duplicatas, formatos de data e
+# tokens nulos controlados, executa o pipeline sem interação e salva os
+# resultados (linhas/s, percentis de latência, pico de memória) em JSON.
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import resource
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+# Formatos reconhecidos por `detectar_formato_data` (um por coluna de data)
+FORMATOS_DATA = {
+    "data_iso": "%Y-%m-%d",
+    "data_br": "%d/%m/%Y",
+    "data_traco": "%d-%m-%Y",
+    "data_barra": "%Y/%m/%d",
+    "data_hora": "%d%b%Y:%H:%M:%S",
+}
+TOKENS_NULOS = ["", " ", "NULL", "null", "None"]
+# Regras de limpeza da etapa 'limpeza' (todas ligadas, para medir o custo de cada uma)
+LIMPEZA_BENCH = {"aparar": True, "caixa": "minusculas", "remover_acentos": True, "decimal": ","}
+CATEGORIAS = ["São Paulo", "Curitiba", "Florianópolis", "Belém", "Goiânia", "Maceió", "Vitória", "Brasília"]
+PRODUTOS = [f"produto_{i:03d}" for i in range(200)]
+ENCODING_MISTO = "misto"  # utf-8 e latin-1 no mesmo arquivo
+MESES_EN = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+# --------------------------
+# 🧪 GERADOR DE DADOS SINTÉTICOS
+# --------------------------
+def _formatar_datas(datas, fmt):
+    if fmt == "%d%b%Y:%H:%M:%S":
+        # Mês abreviado em inglês e maiúsculo, independente do locale
+        meses = np.array(MESES_EN)[datas.month - 1]
+        return (datas.strftime("%d") + meses + datas.strftime("%Y:%H:%M:%S")).to_numpy()
+    return datas.strftime(fmt).to_numpy()
+
+
+def _gerar_bloco(rng, n, pct_duplicatas, pct_nulos, id_inicial):
+    n_unicas = max(1, int(round(n * (1 - pct_duplicatas))))
+    inicio = np.datetime64("2020-01-01T00:00:00")
+    segundos = rng.integers(0, 5 * 365 * 86400, size=n_unicas)
+    datas = pd.DatetimeIndex(inicio + segundos.astype("timedelta64[s]"))
+
+    bloco = pd.DataFrame({"id": np.arange(id_inicial, id_inicial + n_unicas).astype(str)})
+    for col, fmt in FORMATOS_DATA.items():
+        bloco[col] = _formatar_datas(datas, fmt)
+    bloco["cidade"] = np.array(CATEGORIAS)[rng.integers(0, len(CATEGORIAS), n_unicas)]
+    bloco["produto"] = np.array(PRODUTOS)[rng.integers(0, len(PRODUTOS), n_unicas)]
+    bloco["valor"] = np.round(rng.gamma(2.0, 150.0, n_unicas), 2).astype(str)
+    bloco["quantidade"] = rng.integers(1, 50, n_unicas).astype(str)
+
+    # Tokens nulos espalhados nas colunas não-chave (exceto as datas, para manter a detecção)
+    for col in ["cidade", "produto", "valor", "quantidade"]:
+        mascara = rng.random(n_unicas) < pct_nulos
+        bloco.loc[mascara, col] = rng.choice(TOKENS_NULOS, mascara.sum())
+
+    # Duplicatas exatas: reamostra linhas já geradas no bloco
+    n_dup = n - n_unicas
+    if n_dup > 0:
+        bloco = pd.concat([bloco, bloco.iloc[rng.integers(0, n_unicas, n_dup)]], ignore_index=True)
+        bloco = bloco.iloc[rng.permutation(n)]
+    return bloco, n_unicas
+
+
+def gerar_csv_sintetico(path, linhas, pct_duplicatas=0.1, pct_nulos=0.05,
+                        encoding="utf-8", seed=42, chunksize=500_000):
+    """
+    Gera um CSV ';' com `linhas` linhas em blocos (memória limitada ao bloco).
+    Com encoding="misto", a primeira metade de cada bloco sai em utf-8 e a
+    segunda em latin-1, no mesmo arquivo: a detecção vê utf-8 no início e o
+    Bronze precisa cair no fallback para latin-1.
+    Retorna um dicionário com a especificação gerada.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    escritas = 0
+    unicas = 0
+    with open(path, "wb") as f:
+        while escritas < linhas:
+            n = min(chunksize, linhas - escritas)
+            bloco, n_unicas = _gerar_bloco(rng, n, pct_duplicatas, pct_nulos, unicas)
+            if encoding == ENCODING_MISTO:
+                partes = [(bloco.iloc[: n // 2], "utf-8"), (bloco.iloc[n // 2:], "latin-1")]
+            else:
+                partes = [(bloco, encoding)]
+            for i, (parte, enc) in enumerate(partes):
+                cabecalho = escritas == 0 and i == 0
+                f.write(parte.to_csv(sep=";", index=False, header=cabecalho).encode(enc))
+            escritas += n
+            unicas += n_unicas
+    return {
+        "arquivo": path,
+        "linhas": escritas,
+        "linhas_unicas": unicas,
+        "pct_duplicatas": pct_duplicatas,
+        "pct_nulos": pct_nulos,
+        "encoding": encoding,
+        "seed": seed,
+        "bytes": os.path.getsize(path),
+    }
+
+
+# --------------------------
+# 📏 MEDIÇÃO (um processo por etapa)
+# --------------------------
+def _pico_memoria_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return pico / (1024 * 1024) if platform.system() == "Darwin" else pico / 1024
+
+
+def _percentis(latencias):
+    arr = np.array(latencias)
+    return {
+        "p50_s": float(np.percentile(arr, 50)),
+        "p90_s": float(np.percentile(arr, 90)),
+        "p99_s": float(np.percentile(arr, 99)),
+        "min_s": float(arr.min()),
+        "max_s": float(arr.max()),
+    }
+
+
+def _executar_etapa(etapa, db_path, csv_path, repeticoes, fila):
+    """Executado em processo filho: roda a etapa e devolve latências e pico de memória."""
+    import pipeline
+
+    pipeline.CURRENT_DB = db_path
+    latencias = []
+    extra = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if etapa == "bronze":
+                inicio = time.perf_counter()
+                pipeline.run_bronze(csv_file=csv_path)
+                latencias.append(time.perf_counter() - inicio)
+            elif etapa == "silver":
+                inicio = time.perf_counter()
+                pipeline.run_silver(db_path, "bronze", force_recompile=True)
+                latencias.append(time.perf_counter() - inicio)
+            elif etapa == "gold":
+                inicio = time.perf_counter()
+                pipeline.run_gold(db_path, force_recompile=True)
+                latencias.append(time.perf_counter() - inicio)
+            elif etapa == "gold_incremental":
+                # Altera uma linha do Silver: só a partição dela deve ser recomposta
+                conn = pipeline.conectar(db_path)
+                conn.execute("UPDATE silver SET hash_id = md5(hash_id) WHERE rowid = (SELECT MIN(rowid) FROM silver)")
+                conn.close()
+                inicio = time.perf_counter()
+                pipeline.run_gold(db_path, force_recompile=True, incremental=True)
+                latencias.append(time.perf_counter() - inicio)
+            elif etapa == "menu_pos_gold":
+                # Latência até o menu voltar após recompilar o Gold: métricas
+                # síncronas (antes) x em segundo plano (depois)
+                sincronas = []
+                for _ in range(repeticoes):
+                    pipeline.METRICAS_EM_SEGUNDO_PLANO = False
+                    inicio = time.perf_counter()
+                    pipeline.run_gold(db_path, force_recompile=True)
+                    sincronas.append(time.perf_counter() - inicio)
+
+                    pipeline.METRICAS_EM_SEGUNDO_PLANO = True
+                    inicio = time.perf_counter()
+                    pipeline.run_gold(db_path, force_recompile=True)
+                    latencias.append(time.perf_counter() - inicio)
+                    pipeline.aguardar_metricas_gold()  # Fora da medição
+                extra["metricas_sincronas"] = _percentis(sincronas)
+                extra["ganho_p50_s"] = extra["metricas_sincronas"]["p50_s"] - float(np.percentile(latencias, 50))
+            elif etapa == "limpeza":
+                # Vazão da limpeza do Silver por coluna (expressões SQL com todas
+                # as regras) e extração do Bronze limpo: SELECT compilado com as
+                # regras padrão (depois) x fetchdf() + replace do pandas (antes)
+                conn = pipeline.conectar(db_path)
+                spec = pipeline.carregar_limpeza(json.dumps(LIMPEZA_BENCH))
+                colunas = {}
+                for nome, tipo, *_ in conn.execute("DESCRIBE bronze").fetchall():
+                    linhas, mb = conn.execute(
+                        f'SELECT COUNT(*), COALESCE(SUM(strlen("{nome}")), 0) / 1024 ^ 2 FROM bronze'
+                    ).fetchone()
+                    sql = pipeline.sql_limpeza(conn, "bronze", spec, colunas=[pipeline.normalizar_nome_coluna(nome)])
+                    tempos = []
+                    for _ in range(repeticoes):
+                        inicio = time.perf_counter()
+                        conn.execute(f"CREATE OR REPLACE TEMP TABLE _limpeza AS {sql}")
+                        tempos.append(time.perf_counter() - inicio)
+                    p50 = float(np.percentile(tempos, 50))
+                    colunas[nome] = {"tempo_p50_s": p50, "linhas_por_s": linhas / p50, "mb_por_s": mb / p50}
+                extra["colunas"] = colunas
+
+                padrao = pipeline.carregar_limpeza()
+                todas, pandas_replace = [], []
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    conn.execute(pipeline.sql_limpeza(conn, "bronze", padrao)).fetchdf()
+                    latencias.append(time.perf_counter() - inicio)
+
+                    inicio = time.perf_counter()
+                    conn.execute(pipeline.sql_limpeza(conn, "bronze", spec)).fetchdf()
+                    todas.append(time.perf_counter() - inicio)
+
+                    inicio = time.perf_counter()
+                    df = conn.execute("SELECT * FROM bronze").fetchdf()
+                    df.columns = [pipeline.normalizar_nome_coluna(c) for c in df.columns]
+                    df = df.replace(padrao["nulos"], pd.NA)
+                    pandas_replace.append(time.perf_counter() - inicio)
+                conn.close()
+                extra["todas_regras"] = _percentis(todas)
+                extra["pandas_replace"] = _percentis(pandas_replace)
+                extra["ganho_p50_s"] = extra["pandas_replace"]["p50_s"] - float(np.percentile(latencias, 50))
+            elif etapa == "abertura_gold":
+                # Reabertura do Gold pelo menu: cache Arrow mapeado em memória
+                # (depois) x fetchdf() do DuckDB (antes). A primeira abertura
+                # grava o cache, se faltar, fora da medição
+                extra["cache_arrow"] = pipeline.CACHE_GOLD
+                pipeline.carregar_gold_df(db_path)
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    pipeline.carregar_gold_df(db_path)
+                    latencias.append(time.perf_counter() - inicio)
+                extra["pico_memoria_cache_mb"] = _pico_memoria_mb()
+
+                pipeline.CACHE_GOLD = False
+                sem_cache = []
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    pipeline.carregar_gold_df(db_path)
+                    sem_cache.append(time.perf_counter() - inicio)
+                extra["sem_cache"] = _percentis(sem_cache)
+                extra["ganho_p50_s"] = extra["sem_cache"]["p50_s"] - float(np.percentile(latencias, 50))
+            else:
+                df = pipeline.carregar_gold_df(db_path)
+                consulta = CONSULTAS[etapa]
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    resultado = consulta(pipeline, df)
+                    latencias.append(time.perf_counter() - inicio)
+                extra["linhas_resultado"] = len(resultado)
+        fila.put({"latencias": latencias, "pico_memoria_mb": _pico_memoria_mb(), **extra})
+    except Exception as e:
+        fila.put({"erro": f"{type(e).__name__}: {e}"})
+
+
+CONSULTAS = {
+    "query_topk": lambda p, df: p.executar_topk(df, "valor", 100),
+    "query_rollup_temporal": lambda p, df: p.consulta_rollup_batch(df, "temporal", "data_iso", "valor")[0],
+    "query_rollup_textual": lambda p, df: p.consulta_rollup_batch(df, "textual", "cidade", "valor")[0],
+    "query_movavg": lambda p, df: p.executar_media_movel(df, "valor", 7),
+}
+ETAPAS = ["bronze", "limpeza", "silver", "gold", "gold_incremental", "menu_pos_gold", "abertura_gold"] + list(CONSULTAS)
+
+
+def medir_etapa(etapa, db_path, csv_path, linhas, repeticoes):
+    ctx = mp.get_context("spawn")
+    fila = ctx.Queue()
+    proc = ctx.Process(target=_executar_etapa, args=(etapa, db_path, csv_path, repeticoes, fila))
+    proc.start()
+    resultado = fila.get()
+    proc.join()
+
+    if "erro" in resultado:
+        return {"etapa": etapa, "status": "erro", "erro": resultado["erro"]}
+
+    latencias = resultado.pop("latencias")
+    total = sum(latencias)
+    return {
+        "etapa": etapa,
+        "status": "ok",
+        "execucoes": len(latencias),
+        "tempo_total_s": total,
+        "linhas_por_s": linhas * len(latencias) / total if total > 0 else None,
+        **_percentis(latencias),
+        **resultado,
+    }
+
+
+# --------------------------
+# 🚀 EXECUÇÃO DO BENCHMARK
+# --------------------------
+def executar_benchmark(tamanhos, pct_duplicatas, pct_nulos, encodings, repeticoes,
+                       seed, pasta, etapas=ETAPAS, manter_arquivos=False):
+    execucoes = []
+    for i, linhas in enumerate(tamanhos):
+        encoding = encodings[i % len(encodings)]
+        csv_path = os.path.join(pasta, f"sintetico_{linhas}_{encoding}.csv")
+        db_path = os.path.join(pasta, f"bench_{linhas}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+        print(f"🧪 Gerando {linhas:,} linhas ({encoding})...", file=sys.stderr)
+        inicio = time.perf_counter()
+        spec = gerar_csv_sintetico(csv_path, linhas, pct_duplicatas, pct_nulos, encoding, seed)
+        spec["tempo_geracao_s"] = time.perf_counter() - inicio
+
+        resultados = []
+        for etapa in etapas:
+            print(f"  ⏱ {etapa}...", file=sys.stderr)
+            r = medir_etapa(etapa, db_path, csv_path, linhas, repeticoes)
+            resultados.append(r)
+            if r["status"] != "ok":
+                print(f"  ❌ {etapa}: {r['erro']}", file=sys.stderr)
+                break
+
+        execucoes.append({"dados": spec, "etapas": resultados})
+        if not manter_arquivos:
+            for arq in (csv_path, db_path):
+                if os.path.exists(arq):
+                    os.remove(arq)
+            cache = os.path.join(pasta, "cache")
+            for nome in (os.listdir(cache) if os.path.isdir(cache) else []):
+                if nome.startswith(f"bench_{linhas}.gold."):
+                    os.remove(os.path.join(cache, nome))
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "duckdb": __import__("duckdb").__version__,
+        },
+        "parametros": {
+            "tamanhos": tamanhos,
+            "pct_duplicatas": pct_duplicatas,
+            "pct_nulos": pct_nulos,
+            "encodings": encodings,
+            "repeticoes": repeticoes,
+            "seed": seed,
+        },
+        "execucoes": execucoes,
+    }
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        description="Benchmark reprodutível do pipeline com dados sintéticos.",
+    )
+    parser.add_argument("--linhas", type=int, nargs="+", default=[100_000],
+                        help="Tamanhos a gerar (ex: 100000 1000000 100000000)")
+    parser.add_argument("--pct-duplicatas", type=float, default=0.1, help="Fração de duplicatas exatas (0-1)")
+    parser.add_argument("--pct-nulos", type=float, default=0.05, help="Fração de tokens nulos por coluna (0-1)")
+    parser.add_argument("--encodings", nargs="+", default=["utf-8", "latin-1"],
+                        choices=["utf-8", "latin-1", "ISO-8859-1", ENCODING_MISTO],
+                        help="Encodings alternados entre os tamanhos "
+                             f"('{ENCODING_MISTO}': utf-8 e latin-1 no mesmo arquivo)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Execuções por consulta (percentis)")
+    parser.add_argument("--etapas", nargs="+", default=ETAPAS, choices=ETAPAS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--pasta", default="bench_dados", help="Pasta para CSVs e bancos temporários")
+    parser.add_argument("--manter-arquivos", action="store_true", help="Não apaga CSVs/bancos ao final")
+    parser.add_argument("--saida", default="results/benchmark.json", help="Arquivo JSON de resultados")
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    if not 0 <= args.pct_duplicatas < 1 or not 0 <= args.pct_nulos <= 1:
+        print("❌ Frações devem estar entre 0 e 1.", file=sys.stderr)
+        return 2
+
+    resultado = executar_benchmark(
+        args.linhas, args.pct_duplicatas, args.pct_nulos, args.encodings,
+        args.repeticoes, args.seed, args.pasta, args.etapas, args.manter_arquivos,
+    )
+
+    os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+    with open(args.saida, "w") as f:
+        json.dump(resultado, f, indent=4, ensure_ascii=False)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(f"💾 Resultados salvos em: {args.saida}", file=sys.stderr)
+
+    falhou = any(r["status"] != "ok" for e in resultado["execucoes"] for r in e["etapas"])
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# ================================
+#  🧮 SQL DAS CONSULTAS sobre Gold/Silver
+# ================================
+# Top-K, Rollup, Média móvel e paginação do Silver montados em SQL para o
+# DuckDB, a partir de parâmetros no formato de query string ({nome: [valor]}).
+# Usado pelo serviço de consultas (query_service.py) e pela exportação em
+# streaming do pipeline (COPY ... TO), sem que um dependa do outro.
+import duckdb
+
+TIPOS_DATA = ("DATE", "TIMESTAMP")
+TIPOS_NUMERICOS = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "FLOAT", "DOUBLE", "DECIMAL",
+                   "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT")
+
+
+class ErroConsulta(Exception):
+    """Parâmetro inválido na consulta (HTTP 400 no serviço, ValueError na exportação)."""
+
+
+def _q(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+class CatalogoTabelas:
+    """Esquema de Gold/Silver lido na inicialização (valida colunas sem tocar nos dados)."""
+
+    def __init__(self, conn):
+        self.tabelas = {}
+        for tabela in ("gold", "silver"):
+            try:
+                linhas = conn.execute(f"DESCRIBE {tabela}").fetchall()
+            except duckdb.Error:
+                continue
+            self.tabelas[tabela] = {nome: tipo for nome, tipo, *_ in linhas}
+
+    def colunas(self, tabela="gold"):
+        if tabela not in self.tabelas:
+            raise ErroConsulta(f"Tabela '{tabela}' não encontrada.")
+        return self.tabelas[tabela]
+
+    def exigir(self, col, tipos=None, tabela="gold"):
+        colunas = self.colunas(tabela)
+        if col not in colunas:
+            raise ErroConsulta(f"Coluna '{col}' não existe em {tabela}.")
+        if tipos and not colunas[col].startswith(tipos):
+            raise ErroConsulta(f"Coluna '{col}' ({colunas[col]}) não é do tipo esperado.")
+        return col
+
+
+def _inteiro(params, nome, padrao, minimo=1):
+    valor = params.get(nome, [str(padrao)])[0]
+    if not valor.isdigit() or int(valor) < minimo:
+        raise ErroConsulta(f"Parâmetro '{nome}' deve ser um inteiro >= {minimo}.")
+    return int(valor)
+
+
+def _texto(params, nome):
+    if nome not in params:
+        raise ErroConsulta(f"Parâmetro '{nome}' é obrigatório.")
+    return params[nome][0]
+
+
+def _numerico(catalogo, col):
+    # Colunas textuais são convertidas como no pandas (pd.to_numeric errors='coerce')
+    tipo = catalogo.colunas()[col]
+    return _q(col) if tipo.startswith(TIPOS_NUMERICOS) else f"TRY_CAST({_q(col)} AS DOUBLE)"
+
+
+def sql_topk(catalogo, params):
+    col = catalogo.exigir(_texto(params, "col"))
+    k = _inteiro(params, "k", 10)
+    return f"""
+        SELECT {_numerico(catalogo, col)} AS {_q(col)}
+        FROM gold
+        ORDER BY 1 DESC NULLS LAST
+        LIMIT {k}
+    """
+
+
+def sql_rollup(catalogo, params):
+    tipo = params.get("tipo", ["textual"])[0]
+    col_soma = catalogo.exigir(_texto(params, "col_soma"), TIPOS_NUMERICOS + ("VARCHAR",))
+    valor = _numerico(catalogo, col_soma)
+    total = _q("total_" + col_soma)
+
+    if tipo == "temporal":
+        base = _q(catalogo.exigir(_texto(params, "col_base"), TIPOS_DATA))
+        return f"""
+            SELECT
+                COALESCE(mes, 'Total Geral') AS mes,
+                COALESCE(semana, 'Total Mensal') AS semana,
+                COALESCE(dia, 'Total Semanal') AS dia,
+                {total}
+            FROM (
+                SELECT
+                    strftime({base}, '%Y-%m') AS mes,
+                    strftime({base}, '%Y-W%W') AS semana,
+                    strftime({base}, '%Y-%m-%d') AS dia,
+                    SUM({valor}) AS {total}
+                FROM gold
+                GROUP BY ROLLUP(mes, semana, dia)
+            )
+            ORDER BY {total} DESC, mes DESC, semana DESC, dia DESC
+        """
+    if tipo == "textual":
+        base = catalogo.exigir(_texto(params, "col_base"), ("VARCHAR",))
+        return f"""
+            SELECT COALESCE({_q(base)}, 'Total') AS {_q(base)}, SUM({valor}) AS {total}
+            FROM gold
+            GROUP BY ROLLUP({_q(base)})
+            ORDER BY 2 DESC
+        """
+    raise ErroConsulta("Parâmetro 'tipo' deve ser 'temporal' ou 'textual'.")
+
+
+def sql_media_movel(catalogo, params):
+    col = catalogo.exigir(_texto(params, "col"))
+    janela = _inteiro(params, "janela", 7)
+    linhas = _inteiro(params, "linhas", 20, minimo=0)
+    valor = _numerico(catalogo, col)
+    sql = f"""
+        SELECT rowid AS _ordem, {valor} AS {_q(col)},
+               AVG({valor}) OVER (ORDER BY rowid ROWS BETWEEN {janela - 1} PRECEDING AND CURRENT ROW) AS media_movel
+        FROM gold
+    """
+    if linhas:
+        # Últimas N linhas, na ordem original (equivale ao .tail(N) do pandas)
+        sql = f"SELECT * FROM ({sql} ORDER BY _ordem DESC LIMIT {linhas}) ORDER BY _ordem"
+    else:
+        sql += " ORDER BY _ordem"
+    return f"SELECT * EXCLUDE (_ordem) FROM ({sql})"
+
+
+def sql_silver(catalogo, params):
+    catalogo.colunas("silver")
+    tamanho = _inteiro(params, "tamanho", 100)
+    pagina = _inteiro(params, "pagina", 1)
+    return f"SELECT * FROM silver ORDER BY rowid LIMIT {tamanho} OFFSET {(pagina - 1) * tamanho}"
+
+
+ROTAS = {
+    "/topk": sql_topk,
+    "/rollup": sql_rollup,
+    "/movavg": sql_media_movel,
+    "/silver": sql_silver,
+}
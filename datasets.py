@@ -0,0 +1,304 @@
+# ================================
+#  🗂️ AGENDADOR DE DATASETS: vários pipelines Bronze → Silver → Gold em paralelo
+# ================================
+# Cada dataset tem a própria pasta, o próprio arquivo DuckDB, a especificação
+# de entrada (CSV + dedup) e metadados em cache (assinatura da entrada, linhas
+# e tempos da última execução). O agendador roda um `pipeline.py run-all` por
+# dataset em processos separados, com um orçamento de workers (datasets
+# simultâneos) e de threads do DuckDB dividido entre eles.
+#
+#   python3 datasets.py --config datasets.json --workers 2 --threads 8
+#   python3 datasets.py --dataset vendas=dados/vendas.csv --dataset estoque=dados/estoque.csv
+#
+# Formato do datasets.json:
+#   {"datasets": [{"nome": "vendas", "entrada": "dados/vendas.csv",
+#                  "dedup_chaves": ["id"], "dedup_ordem": "atualizado_em",
+#                  "limpeza": {"aparar": true, "remover_acentos": true}}]}
+import os
+import re
+import sys
+import json
+import hashlib
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PIPELINE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline.py")
+PASTA_PADRAO = "datasets"
+
+
+class Dataset:
+    """Um dataset: entrada CSV, pasta e arquivo DuckDB próprios, metadados em cache."""
+
+    def __init__(self, nome, entrada, pasta=PASTA_PADRAO, db=None, dedup_chaves=None,
+                 dedup_ordem=None, dedup_estrategia=None, incremental=False, limpeza=None):
+        if not re.fullmatch(r"[A-Za-z0-9_\-]+", nome):
+            raise ValueError(f"Nome de dataset inválido: '{nome}' (use letras, números, '_' ou '-').")
+        self.nome = nome
+        self.entrada = os.path.abspath(entrada)
+        self.pasta = os.path.abspath(os.path.join(pasta, nome))
+        self.db = os.path.abspath(db) if db else os.path.join(self.pasta, f"{nome}.db")
+        self.dedup_chaves = dedup_chaves or []
+        self.dedup_ordem = dedup_ordem
+        self.dedup_estrategia = dedup_estrategia
+        self.incremental = incremental
+        # Regras de limpeza do Silver: objeto JSON ou caminho de arquivo
+        self.limpeza = os.path.abspath(limpeza) if isinstance(limpeza, str) else limpeza
+        self.caminho_metadados = os.path.join(self.pasta, "metadados.json")
+        self.caminho_log = os.path.join(self.pasta, "pipeline.log")
+        self.metadados = self._ler_metadados()
+
+    @classmethod
+    def de_spec(cls, spec, pasta=PASTA_PADRAO):
+        campos = ("db", "dedup_chaves", "dedup_ordem", "dedup_estrategia", "incremental", "limpeza")
+        return cls(spec["nome"], spec["entrada"], pasta, **{c: spec[c] for c in campos if c in spec})
+
+    def _ler_metadados(self):
+        try:
+            with open(self.caminho_metadados) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def assinatura_entrada(self):
+        info = os.stat(self.entrada)
+        return f"{info.st_size}:{int(info.st_mtime)}"
+
+    def assinatura_spec(self):
+        """Hash da especificação efetiva (dedup, incremental, limpeza e banco)."""
+        spec = {
+            "db": self.db,
+            "dedup_chaves": self.dedup_chaves,
+            "dedup_ordem": self.dedup_ordem,
+            "dedup_estrategia": self.dedup_estrategia,
+            "incremental": bool(self.incremental),
+            "limpeza": self.limpeza,
+        }
+        if isinstance(self.limpeza, str) and os.path.exists(self.limpeza):
+            # Regras em arquivo: editar o arquivo também muda a especificação
+            with open(self.limpeza, "rb") as f:
+                spec["limpeza_conteudo"] = hashlib.sha256(f.read()).hexdigest()
+        texto = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+    def em_dia(self):
+        """True se a entrada e a especificação não mudaram desde a última execução bem-sucedida."""
+        return (
+            self.metadados.get("status") == "ok"
+            and self.metadados.get("assinatura_entrada") == self.assinatura_entrada()
+            and self.metadados.get("assinatura_spec") == self.assinatura_spec()
+            and os.path.exists(self.db)
+        )
+
+    def custo_estimado(self):
+        """Tempo da última execução, ou o tamanho da entrada (para ordenar a fila)."""
+        return self.metadados.get("tempo_s") or os.path.getsize(self.entrada) / 1e6
+
+    def comando(self):
+        cmd = [sys.executable, PIPELINE_SCRIPT, "--db", self.db, "run-all", "--input", self.entrada]
+        if self.dedup_chaves:
+            cmd += ["--dedup-chaves", ",".join(self.dedup_chaves)]
+        if self.dedup_ordem:
+            cmd += ["--dedup-ordem", self.dedup_ordem]
+        if self.dedup_estrategia:
+            cmd += ["--dedup-estrategia", self.dedup_estrategia]
+        if self.limpeza:
+            cmd += ["--limpeza", self.limpeza if isinstance(self.limpeza, str) else json.dumps(self.limpeza)]
+        if self.incremental:
+            cmd.append("--incremental")
+        return cmd
+
+    def salvar_metadados(self, resumo, saida):
+        self.metadados = {
+            "nome": self.nome,
+            "entrada": self.entrada,
+            "db": self.db,
+            "assinatura_entrada": resumo.get("assinatura_entrada"),
+            "assinatura_spec": resumo.get("assinatura_spec"),
+            "status": resumo["status"],
+            "executado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "tempo_s": resumo["tempo_s"],
+            "linhas": resumo.get("linhas", {}),
+            "colunas_gold": sorted((saida.get("metricas") or {}).get("distintos_aprox", {})),
+        }
+        with open(self.caminho_metadados, "w") as f:
+            json.dump(self.metadados, f, indent=2, ensure_ascii=False)
+
+
+# --------------------------
+# ⏱ EXECUÇÃO DE UM DATASET
+# --------------------------
+def executar_dataset(dataset, threads, memoria=None):
+    """
+    Roda o pipeline completo do dataset em um processo separado (cwd = pasta
+    do dataset, para que results/ e perfis não se misturem) e resume a vazão.
+    """
+    os.makedirs(dataset.pasta, exist_ok=True)
+    env = dict(os.environ, PIPELINE_DUCKDB_THREADS=str(threads))
+    if memoria:
+        env["PIPELINE_DUCKDB_MEMORIA"] = memoria
+
+    assinatura = dataset.assinatura_entrada()
+    assinatura_spec = dataset.assinatura_spec()
+    tamanho_mb = os.path.getsize(dataset.entrada) / (1024 * 1024)
+    inicio = time.perf_counter()
+    with open(dataset.caminho_log, "w") as log:
+        proc = subprocess.run(dataset.comando(), cwd=dataset.pasta, env=env,
+                              stdout=subprocess.PIPE, stderr=log, text=True)
+    duracao = time.perf_counter() - inicio
+
+    try:
+        saida = json.loads(proc.stdout)
+    except ValueError:
+        saida = {"status": "erro", "erro": f"Saída inválida (código {proc.returncode}); veja {dataset.caminho_log}"}
+
+    etapas = saida.get("etapas", {})
+    linhas = {etapa: info.get("linhas") for etapa, info in etapas.items()}
+    resumo = {
+        "dataset": dataset.nome,
+        "status": saida.get("status", "erro"),
+        "codigo_saida": proc.returncode,
+        "db": dataset.db,
+        "threads": threads,
+        "tempo_s": duracao,
+        "tempos_etapas_s": {etapa: info.get("tempo_s") for etapa, info in etapas.items()},
+        "linhas": linhas,
+        "entrada_mb": tamanho_mb,
+        "mb_por_s": tamanho_mb / duracao if duracao > 0 else None,
+        "linhas_bronze_por_s": (linhas.get("bronze") or 0) / duracao if duracao > 0 else None,
+        "assinatura_entrada": assinatura,
+        "assinatura_spec": assinatura_spec,
+    }
+    if resumo["status"] != "ok":
+        resumo["erro"] = saida.get("erro")
+    dataset.salvar_metadados(resumo, saida)
+    return resumo
+
+
+# --------------------------
+# 🗓️ AGENDADOR
+# --------------------------
+def agendar_datasets(datasets, workers=2, threads=None, memoria=None, forcar=False):
+    """
+    Executa os datasets com no máximo `workers` simultâneos. As `threads` do
+    DuckDB são divididas igualmente entre os workers. Os datasets mais caros
+    (pela última execução) entram primeiro na fila.
+    """
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(workers, len(datasets) or 1))
+    threads_por_dataset = max(1, threads // workers)
+
+    resultados = []
+    pendentes = []
+    for dataset in datasets:
+        if not forcar and dataset.em_dia():
+            print(f"✔ {dataset.nome}: entrada e especificação sem alterações, pulando.", file=sys.stderr)
+            resultados.append({"dataset": dataset.nome, "status": "em_dia", "db": dataset.db,
+                               "linhas": dataset.metadados.get("linhas", {})})
+        else:
+            pendentes.append(dataset)
+    pendentes.sort(key=lambda d: d.custo_estimado(), reverse=True)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(executar_dataset, d, threads_por_dataset, memoria): d for d in pendentes}
+        for futuro in as_completed(futuros):
+            resumo = futuro.result()
+            print(f"{'✅' if resumo['status'] == 'ok' else '❌'} {resumo['dataset']}: "
+                  f"{resumo['tempo_s']:.2f}s, {resumo['mb_por_s'] or 0:.2f} MB/s", file=sys.stderr)
+            resultados.append(resumo)
+    duracao = time.perf_counter() - inicio
+
+    executados = [r for r in resultados if r["status"] not in ("em_dia",)]
+    total_mb = sum(r.get("entrada_mb", 0) for r in executados)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "workers": workers,
+        "threads_total": threads,
+        "threads_por_dataset": threads_por_dataset,
+        "duracao_s": duracao,
+        "mb_por_s_total": total_mb / duracao if duracao > 0 else None,
+        "erros": sum(1 for r in executados if r["status"] != "ok"),
+        "datasets": sorted(resultados, key=lambda r: r["dataset"]),
+    }
+
+
+def imprimir_resumo(resultado):
+    print(f"\n--- 🗂️ Resumo por dataset ({resultado['workers']} workers, "
+          f"{resultado['threads_por_dataset']} threads cada) ---", file=sys.stderr)
+    for r in resultado["datasets"]:
+        if r["status"] == "em_dia":
+            print(f"  - {r['dataset']}: em dia (não executado)", file=sys.stderr)
+            continue
+        gold = r["linhas"].get("gold")
+        print(f"  - {r['dataset']}: {r['status']}, {r['tempo_s']:.2f}s, {r['mb_por_s'] or 0:.2f} MB/s, "
+              f"{r['linhas_bronze_por_s'] or 0:,.0f} linhas/s, Gold: {gold if gold is not None else '-'}",
+              file=sys.stderr)
+    print(f"  Total: {resultado['duracao_s']:.2f}s, {resultado['mb_por_s_total'] or 0:.2f} MB/s", file=sys.stderr)
+
+
+def carregar_datasets(config=None, especificacoes=(), pasta=PASTA_PADRAO):
+    """Datasets do arquivo JSON `config` e/ou de especificações 'nome=arquivo.csv'."""
+    datasets = []
+    if config:
+        # Caminhos relativos do arquivo valem a partir da pasta dele, não do cwd
+        base = os.path.dirname(os.path.abspath(config))
+        with open(config) as f:
+            for spec in json.load(f)["datasets"]:
+                spec = dict(spec)
+                for campo in ("entrada", "db", "pasta", "limpeza"):
+                    if isinstance(spec.get(campo), str):
+                        spec[campo] = os.path.join(base, spec[campo])
+                datasets.append(Dataset.de_spec(spec, spec.get("pasta", pasta)))
+    for spec in especificacoes:
+        nome, sep, entrada = spec.partition("=")
+        if not sep:
+            raise ValueError(f"Use NOME=ARQUIVO.csv em --dataset (recebido: '{spec}').")
+        datasets.append(Dataset(nome, entrada, pasta))
+    nomes = [d.nome for d in datasets]
+    repetidos = {n for n in nomes if nomes.count(n) > 1}
+    if repetidos:
+        raise ValueError(f"Datasets repetidos: {', '.join(sorted(repetidos))}")
+    for dataset in datasets:
+        if not os.path.isfile(dataset.entrada):
+            raise ValueError(f"Entrada do dataset '{dataset.nome}' não encontrada: {dataset.entrada}")
+    return datasets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="datasets.py",
+                                     description="Executa o pipeline de vários datasets em paralelo.")
+    parser.add_argument("--config", help="Arquivo JSON com a lista de datasets")
+    parser.add_argument("--dataset", action="append", default=[], metavar="NOME=CSV",
+                        help="Dataset avulso (repetível)")
+    parser.add_argument("--pasta", default=PASTA_PADRAO, help="Pasta base dos datasets (padrão: %(default)s)")
+    parser.add_argument("--workers", type=int, default=2, help="Datasets executados ao mesmo tempo")
+    parser.add_argument("--threads", type=int, help="Threads do DuckDB no total (padrão: núcleos da máquina)")
+    parser.add_argument("--memoria", help="Limite de memória do DuckDB por dataset, ex: 2GB "
+                             "(PIPELINE_DUCKDB_MEMORIA; não limita os DataFrames pandas do processo)")
+    parser.add_argument("--forcar", action="store_true", help="Executa mesmo os datasets com entrada inalterada")
+    parser.add_argument("--saida", default="results/datasets.json", help="Arquivo JSON do resumo")
+    args = parser.parse_args(argv)
+
+    try:
+        datasets = carregar_datasets(args.config, args.dataset, args.pasta)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if not datasets:
+        parser.error("informe --config ou ao menos um --dataset")
+
+    resultado = agendar_datasets(datasets, args.workers, args.threads, args.memoria, args.forcar)
+    imprimir_resumo(resultado)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+    with open(args.saida, "w") as f:
+        f.write(texto)
+    return 1 if resultado["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# ================================
+#  🔥 TESTE DE CARGA do serviço de consultas (query_service.py)
+# ================================
+# Dispara requisições concorrentes (N clientes) contra o serviço e reporta
+# latência p50/p99 por rota, vazão e erros em JSON.
+#
+#   python3 loadtest.py --porta 8765 --clientes 16 --requisicoes 400 \
+#       --rota "/topk?col=valor&k=10" --rota "/rollup?tipo=textual&col_base=cidade&col_soma=valor"
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+ROTAS_PADRAO = ["/saude"]
+
+
+async def _requisicao(host, porta, unix, rota):
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, porta)
+    writer.write(f"GET {rota} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    resposta = await reader.read()  # O servidor fecha a conexão ao final do streaming
+    writer.close()
+    status = int(resposta.split(b" ", 2)[1]) if resposta.startswith(b"HTTP/") else 0
+    return status, len(resposta)
+
+
+async def _cliente(fila, host, porta, unix, resultados):
+    while True:
+        try:
+            rota = fila.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        inicio = time.perf_counter()
+        try:
+            status, tamanho = await _requisicao(host, porta, unix, rota)
+        except OSError:
+            status, tamanho = 0, 0
+        resultados.append((rota, time.perf_counter() - inicio, status, tamanho))
+
+
+async def executar_carga(rotas, clientes, requisicoes, host="127.0.0.1", porta=8765, unix=None):
+    fila = asyncio.Queue()
+    for i in range(requisicoes):
+        fila.put_nowait(rotas[i % len(rotas)])
+
+    resultados = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente(fila, host, porta, unix, resultados) for _ in range(clientes)))
+    duracao = time.perf_counter() - inicio
+
+    por_rota = {}
+    for rota in rotas:
+        amostras = [r for r in resultados if r[0] == rota]
+        latencias = np.array([r[1] for r in amostras])
+        por_rota[rota] = {
+            "requisicoes": len(amostras),
+            "erros": sum(1 for r in amostras if r[2] != 200),
+            "bytes_medio": float(np.mean([r[3] for r in amostras])) if amostras else 0.0,
+            "p50_s": float(np.percentile(latencias, 50)) if len(latencias) else None,
+            "p99_s": float(np.percentile(latencias, 99)) if len(latencias) else None,
+        }
+
+    latencias = np.array([r[1] for r in resultados])
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "clientes": clientes,
+        "requisicoes": len(resultados),
+        "duracao_s": duracao,
+        "requisicoes_por_s": len(resultados) / duracao if duracao > 0 else None,
+        "erros": sum(1 for r in resultados if r[2] != 200),
+        "p50_s": float(np.percentile(latencias, 50)),
+        "p99_s": float(np.percentile(latencias, 99)),
+        "rotas": por_rota,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="loadtest.py", description="Teste de carga do serviço de consultas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--unix", help="Socket Unix do serviço (substitui host/porta)")
+    parser.add_argument("--clientes", type=int, default=8, help="Clientes concorrentes")
+    parser.add_argument("--requisicoes", type=int, default=200, help="Total de requisições")
+    parser.add_argument("--rota", action="append", help="Rota com parâmetros (repetível)")
+    parser.add_argument("--saida", help="Arquivo JSON para os resultados")
+    args = parser.parse_args(argv)
+
+    resultado = asyncio.run(executar_carga(
+        args.rota or ROTAS_PADRAO, args.clientes, args.requisicoes, args.host, args.porta, args.unix,
+    ))
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.saida:
+        with open(args.saida, "w") as f:
+            f.write(texto)
+    return 1 if resultado["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
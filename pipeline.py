@@ -2,16 +2,39 @@
 #  📦 ETL COMPLETO: Bronze → Silver → Gold → Consultas Interativas
 # ================================
 import os
+import io
 import re
+import sys
+import argparse
+import contextlib
 import chardet
 import duckdb
 import pandas as pd
+import consultas_sql
 from tqdm import tqdm
 import hashlib
 import json
 import time
 import uuid
-import matplotlib.pyplot as plt 
+import cProfile
+import pstats
+import tempfile
+import threading
+import queue
+import atexit
+import warnings
+from matplotlib.figure import Figure
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    from IPython import get_ipython
+    from IPython.display import HTML, display
+except ImportError:
+    get_ipython = None
 
 # --------------------------------------------------
 # 🔌 SE ESTIVER NO COLAB, MONTAR GOOGLE DRIVE
@@ -25,7 +48,6 @@ def montar_drive_no_colab():
     except ImportError:
         print("⚠ Rodando localmente, Google Drive não montado.")
 
-montar_drive_no_colab()
 
 # --------------------------
 # GLOBAL
@@ -34,9 +56,31 @@ CURRENT_DB = "bronze_duck.db"
 # Variáveis globais para rastrear o tempo de execução
 SILVER_RUNTIME = 0.0
 GOLD_RUNTIME = 0.0
+# Orçamento de recursos do DuckDB neste processo (definido pelo agendador de
+# datasets para que vários pipelines em paralelo não disputem os mesmos núcleos)
+DUCKDB_CONFIG = {
+    chave: valor
+    for chave, valor in (
+        ("threads", os.environ.get("PIPELINE_DUCKDB_THREADS")),
+        ("memory_limit", os.environ.get("PIPELINE_DUCKDB_MEMORIA")),
+    )
+    if valor
+}
 
 def get_conn():
-    return duckdb.connect(CURRENT_DB)
+    return conectar(CURRENT_DB)
+
+
+def conectar(db_path=None):
+    """
+    Abre uma conexão DuckDB (em memória se `db_path` for None).
+    Durante uma etapa perfilada, a conexão registra o perfil de cada SQL executado.
+    """
+    conn = duckdb.connect(db_path or ":memory:", config=DUCKDB_CONFIG)
+    # Só a thread da etapa perfilada registra SQL (não a thread de métricas)
+    if _PERFIL_ATUAL is not None and _PERFIL_ATUAL["thread"] is threading.current_thread():
+        return _ConexaoPerfilada(conn, _PERFIL_ATUAL["sql"])
+    return conn
 
 def tabela_existe(conn, table_name):
     """Verifica se uma tabela existe no banco de dados DuckDB."""
@@ -52,6 +96,182 @@ def tabela_existe(conn, table_name):
         return False
 
 
+def carregar_gold_df(db_path):
+    # Com o cache Arrow, o DataFrame é montado sobre o arquivo mapeado em memória
+    if CACHE_GOLD:
+        df = abrir_cache_gold(db_path)
+        if df is not None:
+            return df
+    conn = conectar(db_path)
+    try:
+        return conn.execute("SELECT * FROM gold").fetchdf()
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# 🔬 PROFILING (OPCIONAL)
+# ---------------------------
+# Ativado por `PIPELINE_PROFILE=1` ou pela flag `--profile` do CLI.
+# Desativado, nenhuma função é envolvida: o custo é nulo.
+PROFILING = None        # Configuração e perfis coletados quando ativo
+_PERFIL_ATUAL = None    # Etapa sendo perfilada no momento (evita perfis aninhados)
+
+FUNCOES_PERFILADAS = [
+    "run_bronze", "run_silver", "run_gold",
+    "consulta_topk", "consulta_rollup", "consulta_media_movel",
+    "executar_topk", "consulta_rollup_batch", "executar_media_movel",
+]
+
+
+class _ConexaoPerfilada:
+    """
+    Repassa as chamadas para a conexão DuckDB, guardando o perfil JSON
+    (equivalente ao EXPLAIN ANALYZE) de cada SQL emitido.
+    """
+    def __init__(self, conn, destino):
+        fd, self._arquivo = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        self._conn = conn
+        self._destino = destino
+        self._pendente = None
+        conn.execute("PRAGMA enable_profiling='json'")
+        conn.execute(f"PRAGMA profiling_output='{self._arquivo}'")
+
+    def _coletar(self):
+        # O DuckDB sobrescreve o arquivo a cada consulta: lê o perfil da anterior
+        # e esvazia o arquivo (consultas de catálogo não geram perfil)
+        if self._pendente is None:
+            return
+        try:
+            with open(self._arquivo) as f:
+                perfil = json.load(f)
+        except (OSError, ValueError):
+            perfil = None
+        open(self._arquivo, "w").close()
+        self._destino.append({
+            "sql": " ".join(self._pendente.split()),
+            "latencia_s": (perfil or {}).get("latency", (perfil or {}).get("timing")),
+            "perfil": perfil,
+        })
+        self._pendente = None
+
+    def execute(self, sql, *args, **kwargs):
+        self._coletar()
+        self._pendente = sql
+        self._conn.execute(sql, *args, **kwargs)
+        return self
+
+    def query(self, sql, *args, **kwargs):
+        self._coletar()
+        self._pendente = sql
+        return self._conn.query(sql, *args, **kwargs)
+
+    sql = query
+
+    def close(self):
+        self._coletar()
+        self._conn.close()
+        if os.path.exists(self._arquivo):
+            os.remove(self._arquivo)
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+
+def _resumo_cprofile(profiler, top_n, chave):
+    stats = pstats.Stats(profiler).sort_stats(chave)
+    resumo = []
+    for func in stats.fcn_list[:top_n]:
+        cc, ncalls, tottime, cumtime, _ = stats.stats[func]
+        arquivo, linha, nome = func
+        resumo.append({
+            "funcao": f"{os.path.basename(arquivo)}:{linha}({nome})",
+            "chamadas": ncalls,
+            "tottime_s": round(tottime, 6),
+            "cumtime_s": round(cumtime, 6),
+        })
+    return resumo
+
+
+def _salvar_perfil(nome, profiler, sqls, duracao):
+    pasta = PROFILING["pasta"]
+    top_n = PROFILING["top_n"]
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.join(pasta, f"{nome}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+    profiler.dump_stats(base + ".prof")
+    with open(base + ".txt", "w") as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top_n)
+    with open(base + "_duckdb.json", "w") as f:
+        json.dump(sqls, f, indent=2, default=str)
+
+    sql_lentos = sorted(sqls, key=lambda s: s["latencia_s"] or 0, reverse=True)[:top_n]
+    resumo = {
+        "duracao_s": duracao,
+        "arquivo_prof": base + ".prof",
+        "top_tottime": _resumo_cprofile(profiler, top_n, "tottime"),
+        "top_cumtime": _resumo_cprofile(profiler, top_n, "cumulative"),
+        "sql": [{"sql": s["sql"][:200], "latencia_s": s["latencia_s"]} for s in sql_lentos],
+    }
+    PROFILING["perfis"][nome] = resumo
+    _anexar_perfil_metricas(nome, resumo)
+
+
+def _anexar_perfil_metricas(nome, resumo):
+    # Etapas terminam depois de registrar_metricas_gold: atualiza o JSON já escrito
+    # (a thread de métricas inclui os perfis já coletados quando escreve depois)
+    json_path = "results/metricas.json"
+    with _METRICAS_LOCK:
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path) as f:
+                metricas = json.load(f)
+        except ValueError:
+            return
+        metricas.setdefault("profiling", {})[nome] = resumo
+        with open(json_path, "w") as f:
+            json.dump(metricas, f, indent=4)
+
+
+def _perfilar(func, nome):
+    def wrapper(*args, **kwargs):
+        global _PERFIL_ATUAL
+        if _PERFIL_ATUAL is not None:
+            return func(*args, **kwargs)
+
+        _PERFIL_ATUAL = {"sql": [], "thread": threading.current_thread()}
+        profiler = cProfile.Profile()
+        inicio = time.time()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            sqls = _PERFIL_ATUAL["sql"]
+            _PERFIL_ATUAL = None
+            _salvar_perfil(nome, profiler, sqls, time.time() - inicio)
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def ativar_profiling(pasta="results/profiles", top_n=None):
+    """Envolve as etapas e consultas com cProfile + perfil do DuckDB."""
+    global PROFILING
+    if PROFILING is not None:
+        return
+    if top_n is None:
+        top_n = int(os.environ.get("PIPELINE_PROFILE_TOP", "15"))
+    PROFILING = {"pasta": pasta, "top_n": top_n, "perfis": {}}
+    modulo = globals()
+    for nome in FUNCOES_PERFILADAS:
+        modulo[nome] = _perfilar(modulo[nome], nome)
+
+
 # ---------------------------
 # 🚀 Funções Auxiliares
 # ---------------------------
@@ -119,26 +339,6 @@ def navegar_pastas(start_path="/content/drive/MyDrive"):
             return selecionado
 
 
-def load_csv_progress(csv_path, encoding, sep=";"):
-    total = sum(1 for _ in open(csv_path, encoding=encoding, errors="ignore"))
-    chunksize = 50000
-    dfs = []
-    for chunk in tqdm(
-        pd.read_csv(
-            csv_path,
-            encoding=encoding,
-            sep=sep,
-            dtype=str,
-            chunksize=chunksize,
-            low_memory=False,
-        ),
-        total=total // chunksize + 1,
-    ):
-        dfs.append(chunk)
-
-    df = pd.concat(dfs, ignore_index=True)
-    return df
-
 def detectar_formato_data(serie):
     amostras = serie.dropna().astype(str).head(50).tolist()
 
@@ -147,8 +347,8 @@ def detectar_formato_data(serie):
         r"^\d{2}/\d{2}/\d{4}": "%d/%m/%Y",
         r"^\d{2}-\d{2}-\d{4}": "%d-%m-%Y",
         r"^\d{4}/\d{2}/\d{2}": "%Y/%m/%d",
-        # NOVO FORMATO ADICIONADO: DDMMMYYYY:HH:MM:SS
-        r"^\d{2}[A-Z]{3}\d{4}:\d{2}:\d{2}:\d{2}": "%d%b%Y:%H:%M:%S", 
+        # NOVO FORMATO ADICIONADO: DDMMMYYYY:HH:MM:SS (mês em qualquer caixa: a limpeza pode normalizá-la)
+        r"^\d{2}[A-Za-z]{3}\d{4}:\d{2}:\d{2}:\d{2}": "%d%b%Y:%H:%M:%S", 
     }
 
     for padrao, fmt in formatos.items():
@@ -198,14 +398,158 @@ def show_query_in_new_tab(query, conn, max_rows=1000):
 # ---------------------------
 # 🥉 ETAPA BRONZE
 # ---------------------------
-def run_bronze():
-    conn = duckdb.connect(CURRENT_DB)
+# Ingestão em blocos: cada bloco é gravado em 'bronze_staging' junto com o
+# checkpoint (offset em bytes + linhas) na mesma transação. Se o processo
+# morrer, a próxima execução retoma do último bloco confirmado.
+BRONZE_CHUNK_LINHAS = 50000
+
+
+def _assinatura_arquivo(csv_file):
+    st = os.stat(csv_file)
+    return os.path.abspath(csv_file), st.st_size, int(st.st_mtime)
+
+
+def ler_checkpoint_bronze(conn):
+    """Retorna o checkpoint de uma ingestão Bronze interrompida, ou None."""
+    if not tabela_existe(conn, 'bronze_checkpoint') or not tabela_existe(conn, 'bronze_staging'):
+        return None
+    row = conn.execute(
+        "SELECT arquivo, tamanho, mtime, encoding, sep, offset_bytes, linhas FROM bronze_checkpoint"
+    ).fetchone()
+    if row is None:
+        return None
+    chaves = ["arquivo", "tamanho", "mtime", "encoding", "sep", "offset_bytes", "linhas"]
+    return dict(zip(chaves, row))
+
+
+def descartar_checkpoint_bronze(conn):
+    conn.execute("DROP TABLE IF EXISTS bronze_staging")
+    conn.execute("DROP TABLE IF EXISTS bronze_checkpoint")
+
+
+def _ler_bloco_linhas(f, n_linhas):
+    """Lê até `n_linhas` linhas (bytes), sem quebrar campos entre aspas com quebra de linha."""
+    linhas = []
+    aspas = 0
+    for linha in f:
+        linhas.append(linha)
+        aspas += linha.count(b'"')
+        if len(linhas) >= n_linhas and aspas % 2 == 0:
+            break
+    return b"".join(linhas)
+
+
+def ingerir_bronze(conn, csv_file, encoding, sep=";", checkpoint=None):
+    """
+    Carrega o CSV em blocos para 'bronze_staging', confirmando cada bloco com
+    seu checkpoint. Com `checkpoint`, retoma do offset gravado.
+    Retorna o total de linhas gravadas.
+    """
+    arquivo, tamanho, mtime = _assinatura_arquivo(csv_file)
+
+    with open(csv_file, "rb") as f:
+        cabecalho = f.readline()
+        if checkpoint:
+            offset = checkpoint["offset_bytes"]
+            linhas = checkpoint["linhas"]
+            f.seek(offset)
+        else:
+            offset = f.tell()
+            linhas = 0
+            colunas = pd.read_csv(io.BytesIO(cabecalho), encoding=encoding, sep=sep, dtype=str).columns
+            colunas_sql = ", ".join(f'"{c}" VARCHAR' for c in colunas)
+            conn.execute("BEGIN TRANSACTION")
+            descartar_checkpoint_bronze(conn)
+            conn.execute(f"CREATE TABLE bronze_staging ({colunas_sql})")
+            conn.execute("""
+                CREATE TABLE bronze_checkpoint (
+                    arquivo VARCHAR, tamanho BIGINT, mtime BIGINT, encoding VARCHAR,
+                    sep VARCHAR, offset_bytes BIGINT, linhas BIGINT, atualizado_em TIMESTAMP
+                )
+            """)
+            conn.execute(
+                "INSERT INTO bronze_checkpoint VALUES (?, ?, ?, ?, ?, ?, 0, now())",
+                [arquivo, tamanho, mtime, encoding, sep, offset],
+            )
+            conn.execute("COMMIT")
+
+        with tqdm(total=tamanho, initial=offset, unit="B", unit_scale=True) as barra:
+            while True:
+                bloco = _ler_bloco_linhas(f, BRONZE_CHUNK_LINHAS)
+                if not bloco:
+                    break
+                df = pd.read_csv(
+                    io.BytesIO(cabecalho + bloco),
+                    encoding=encoding,
+                    sep=sep,
+                    dtype=str,
+                    low_memory=False,
+                )
+                novo_offset = f.tell()
+
+                conn.execute("BEGIN TRANSACTION")
+                if len(df):
+                    conn.register("df_chunk", df)
+                    conn.execute("INSERT INTO bronze_staging SELECT * FROM df_chunk")
+                    conn.unregister("df_chunk")
+                conn.execute(
+                    "UPDATE bronze_checkpoint SET offset_bytes = ?, linhas = linhas + ?, atualizado_em = now()",
+                    [novo_offset, len(df)],
+                )
+                conn.execute("COMMIT")
+
+                linhas += len(df)
+                barra.update(novo_offset - offset)
+                offset = novo_offset
+
+    return linhas
+
+
+def finalizar_bronze(conn):
+    """Troca atomicamente 'bronze_staging' por 'bronze' e remove o checkpoint."""
+    aguardar_metricas_gold()  # A thread de métricas lê o Bronze
+    conn.execute("BEGIN TRANSACTION")
+    conn.execute("DROP TABLE IF EXISTS bronze")
+    conn.execute("ALTER TABLE bronze_staging RENAME TO bronze")
+    conn.execute("DROP TABLE bronze_checkpoint")
+    conn.execute("COMMIT")
+
+
+def run_bronze(csv_file=None):
+    """
+    Cria a tabela Bronze a partir de um CSV.
+    Se `csv_file` for informado (modo batch), não há prompts: o Bronze é recriado.
+    Uma ingestão interrompida do mesmo arquivo é retomada do último bloco gravado.
+    """
+    conn = conectar(CURRENT_DB)
     tabela_ja_existe = tabela_existe(conn, 'bronze')
+    checkpoint = ler_checkpoint_bronze(conn)
     conn.close()
-    
-    csv_file = None
 
-    if tabela_ja_existe:
+    if checkpoint and csv_file is None:
+        while True:
+            print("\n⚠️ Existe uma ingestão Bronze interrompida.")
+            print(f"   Arquivo: {checkpoint['arquivo']} ({checkpoint['linhas']:,} linhas já gravadas)")
+            print("[1] Retomar a ingestão")
+            print("[2] Descartar e seguir")
+            opc = input("Escolha a opção (1/2): ").strip()
+
+            if opc == "1":
+                csv_file = checkpoint["arquivo"]
+                break
+
+            elif opc == "2":
+                conn = conectar(CURRENT_DB)
+                descartar_checkpoint_bronze(conn)
+                conn.close()
+                checkpoint = None
+                print("🗑️ Ingestão interrompida descartada.")
+                break
+
+            else:
+                print("Opção inválida.")
+
+    if tabela_ja_existe and csv_file is None:
         while True:
             print("\n⚠️ Já existe um Bronze gerado anteriormente.")
             print("[1] Usar este Bronze existente")
@@ -223,61 +567,1139 @@ def run_bronze():
             else:
                 print("Opção inválida.")
 
-    print("📁 Selecione arquivo CSV:")
-    csv_file = navegar_pastas()
+    if csv_file is None:
+        print("📁 Selecione arquivo CSV:")
+        csv_file = navegar_pastas()
     
     if not csv_file:
         raise Exception("Nenhum arquivo CSV selecionado.")
 
-    enc = detectar_encoding(csv_file)
-    tentativas = [enc] if enc else []
-    tentativas += ["utf-8", "latin-1", "ISO-8859-1"]
-
-    df = None
+    # O checkpoint só vale para o mesmo arquivo, sem alterações desde a interrupção
+    if checkpoint:
+        arquivo, tamanho, mtime = _assinatura_arquivo(csv_file)
+        if (checkpoint["arquivo"], checkpoint["tamanho"], checkpoint["mtime"]) != (arquivo, tamanho, mtime):
+            print("⚠️ Checkpoint pertence a outro arquivo (ou o arquivo mudou). Reiniciando ingestão.")
+            checkpoint = None
+
+    if checkpoint:
+        print(f"⏩ Retomando Bronze a partir da linha {checkpoint['linhas']:,} "
+              f"(byte {checkpoint['offset_bytes']:,}).")
+        tentativas = [checkpoint["encoding"]]
+    else:
+        enc = detectar_encoding(csv_file)
+        tentativas = [enc] if enc else []
+        tentativas += ["utf-8", "latin-1", "ISO-8859-1"]
+
+    linhas = None
     encoding_ok = None
 
+    conn = conectar(CURRENT_DB)
     for e in tentativas:
         try:
-            df = load_csv_progress(csv_file, e)
+            linhas = ingerir_bronze(conn, csv_file, e, checkpoint=checkpoint)
             encoding_ok = e
             break
-        except Exception as ex:
+        except (UnicodeDecodeError, LookupError) as ex:
             # print(f"Falha com encoding {e}: {ex}") # Para debug
+            # Encoding errado (a decodificação ocorre fora da transação do bloco):
+            # descarta os blocos já gravados e tenta o próximo
+            descartar_checkpoint_bronze(conn)
+            checkpoint = None
             continue
 
-    if df is None:
+    if linhas is None:
+        conn.close()
         raise Exception("Não foi possível abrir CSV.")
 
     print(f"📘 Encoding utilizado: {encoding_ok}")
 
-    conn = duckdb.connect(CURRENT_DB)
-    conn.execute("DROP TABLE IF EXISTS bronze")
-
-    conn.register("df_temp", df)
-    conn.execute("CREATE TABLE bronze AS SELECT * FROM df_temp")
-    conn.unregister("df_temp")
-
+    finalizar_bronze(conn)
     conn.close()
-    print(f"✅ Bronze criado com {len(df)} linhas.")
+    print(f"✅ Bronze criado com {linhas} linhas.")
 
     return CURRENT_DB, "bronze"
 
 
+# ---------------------------
+# 🗃️ VERSÕES DAS CAMADAS (SNAPSHOTS)
+# ---------------------------
+# Cada build do Silver/Gold gera uma versão. As ativas continuam sendo tabelas
+# com os nomes de sempre (rowid e DML incremental não funcionam sobre views); o
+# que sai delas vai para '<tabela>__v<n>'. O build completo renomeia a tabela
+# ativa; o incremental arquiva só as partições que substitui. Reverter é uma
+# transação: renomeia se a versão de destino está inteira no arquivo dela,
+# senão troca só as partições que diferem (custo proporcional a elas). Ficam as
+# VERSOES_MANTIDAS versões mais recentes além da ativa.
+VERSOES_MANTIDAS = int(os.environ.get("PIPELINE_VERSOES", "3"))
+TABELAS_CAMADA = {
+    "silver": ["silver", "silver_dedup"],
+    "gold": ["gold", "gold_amostra", "gold_amostra_mes", "gold_amostra_estratos",
+             "gold_estatisticas", "gold_estatisticas_particoes", "gold_zonas", "gold_particoes"],
+}
+
+
+def _nome_versao(tabela, versao):
+    return tabela if versao is None else f"{tabela}__v{versao}"
+
+
+def _garantir_registro_versoes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS camadas_versoes (
+            camada VARCHAR, versao INTEGER, criado_em TIMESTAMP, modo VARCHAR,
+            linhas BIGINT, versao_silver INTEGER, ativa BOOLEAN
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS camadas_metricas (
+            camada VARCHAR, versao INTEGER, registrado_em TIMESTAMP, metricas VARCHAR
+        )
+    """)
+    # Manifesto: partições da tabela principal em cada versão (mês da primeira
+    # coluna de data, ver 🧩). `bloco` identifica a escrita que pôs as linhas na
+    # tabela ativa: amostras e catálogo do Gold dependem da ordem das linhas
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS camadas_particoes (
+            camada VARCHAR, versao INTEGER, particao VARCHAR, coluna VARCHAR, linhas BIGINT, checksum UBIGINT,
+            bloco BIGINT
+        )
+    """)
+    # Onde está cada partição arquivada: '<camada>__v<versao>'. `inteira`: a
+    # partição chegou ao arquivo com a tabela ativa renomeada (ordem preservada)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS camadas_arquivo (
+            camada VARCHAR, versao INTEGER, particao VARCHAR, coluna VARCHAR, linhas BIGINT, checksum UBIGINT,
+            inteira BOOLEAN
+        )
+    """)
+
+
+def versao_ativa(conn, camada):
+    if not tabela_existe(conn, 'camadas_versoes'):
+        return None
+    linha = conn.execute("SELECT versao FROM camadas_versoes WHERE camada = ? AND ativa", [camada]).fetchone()
+    return linha[0] if linha else None
+
+
+def _proxima_versao(conn, camada):
+    return conn.execute(
+        "SELECT COALESCE(MAX(versao), 0) + 1 FROM camadas_versoes WHERE camada = ?", [camada]
+    ).fetchone()[0]
+
+
+def _renomear_auxiliares(conn, camada, origem, destino):
+    """Renomeia as tabelas auxiliares da camada da versão `origem` para `destino` (None = ativas)."""
+    for tabela in TABELAS_CAMADA[camada][1:]:
+        if tabela_existe(conn, _nome_versao(tabela, origem)):
+            conn.execute(
+                f'ALTER TABLE "{_nome_versao(tabela, origem)}" RENAME TO "{_nome_versao(tabela, destino)}"'
+            )
+
+
+def _registrar_versao(conn, camada, versao, modo):
+    versao_silver = versao_ativa(conn, "silver") if camada == "gold" else None
+    linhas = conn.execute(f"SELECT COUNT(*) FROM {camada}").fetchone()[0]
+    conn.execute("UPDATE camadas_versoes SET ativa = false WHERE camada = ?", [camada])
+    conn.execute("INSERT INTO camadas_versoes VALUES (?, ?, now(), ?, ?, ?, true)",
+                 [camada, versao, modo, linhas, versao_silver])
+
+
+# --- Manifesto das versões ---
+
+def _assinaturas(conn, tabela, col, particoes=None):
+    """{particao: (coluna, linhas, checksum)} das linhas de `tabela` (ou só das `particoes`)."""
+    expr = expr_particao(col)
+    filtro = f"WHERE list_contains(?, {expr})" if particoes is not None else ""
+    return {
+        particao: (col, linhas, checksum)
+        for particao, linhas, checksum in conn.execute(
+            f'SELECT {expr}, COUNT(*), bit_xor(hash(hash_id)) FROM "{tabela}" {filtro} GROUP BY 1',
+            [list(particoes)] if particoes is not None else None,
+        ).fetchall()
+    }
+
+
+def _assinaturas_ativas(conn, camada, particoes=None):
+    """Assinaturas da tabela ativa. No Gold, vêm de 'gold_particoes' (sem ler dados)."""
+    if camada == "gold" and tabela_existe(conn, 'gold_particoes'):
+        return {
+            particao: (coluna, linhas, checksum)
+            for particao, coluna, linhas, checksum in conn.execute(
+                "SELECT particao, coluna, linhas, checksum FROM gold_particoes"
+            ).fetchall()
+            if particoes is None or particao in particoes
+        }
+    return _assinaturas(conn, camada, coluna_particao(conn, camada), particoes)
+
+
+def _novo_bloco(conn, camada):
+    return conn.execute(
+        "SELECT COALESCE(MAX(bloco), 0) + 1 FROM camadas_particoes WHERE camada = ?", [camada]
+    ).fetchone()[0]
+
+
+def _com_bloco(conn, camada, assinaturas):
+    """Acrescenta às `assinaturas` um bloco novo (as linhas delas acabaram de ser escritas)."""
+    bloco = _novo_bloco(conn, camada)
+    return {particao: (*assinatura, bloco) for particao, assinatura in assinaturas.items()}
+
+
+def _gravar_manifesto(conn, camada, versao, manifesto):
+    conn.execute("DELETE FROM camadas_particoes WHERE camada = ? AND versao = ?", [camada, versao])
+    if manifesto:
+        conn.executemany("INSERT INTO camadas_particoes VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (camada, versao, particao, *assinatura) for particao, assinatura in manifesto.items()
+        ])
+
+
+def _regravar_blocos(conn, camada, versao, manifesto):
+    """A tabela ativa foi reescrita inteira: todas as partições da versão passam a um bloco novo."""
+    _gravar_manifesto(conn, camada, versao, _com_bloco(conn, camada, {p: a[:3] for p, a in manifesto.items()}))
+
+
+def _marcar_bloco(conn, camada, versao, particoes):
+    """As `particoes` regravadas no fim da tabela ativa formam um bloco novo da versão."""
+    conn.execute(
+        "UPDATE camadas_particoes SET bloco = ? WHERE camada = ? AND versao = ? AND list_contains(?, particao)",
+        [_novo_bloco(conn, camada), camada, versao, particoes],
+    )
+
+
+def _manifesto(conn, camada, versao):
+    """
+    {particao: (coluna, linhas, checksum, bloco)} da versão `versao`, ou None
+    se ela não existe. Versões anteriores ao manifesto (a ativa, ou arquivadas
+    inteiras) são lidas uma vez e registradas.
+    """
+    registrada = conn.execute(
+        "SELECT ativa FROM camadas_versoes WHERE camada = ? AND versao = ?", [camada, versao]
+    ).fetchone()
+    if registrada is None:
+        return None
+    linhas = conn.execute(
+        "SELECT particao, coluna, linhas, checksum, bloco FROM camadas_particoes WHERE camada = ? AND versao = ?",
+        [camada, versao],
+    ).fetchall()
+    if linhas:
+        return {particao: tuple(assinatura) for particao, *assinatura in linhas}
+
+    arquivo = _nome_versao(camada, versao)
+    if registrada[0] and tabela_existe(conn, camada):
+        manifesto = _com_bloco(conn, camada, _assinaturas_ativas(conn, camada))
+    elif tabela_existe(conn, arquivo):
+        manifesto = _com_bloco(conn, camada, _assinaturas(conn, arquivo, coluna_particao(conn, arquivo)))
+        conn.execute("DELETE FROM camadas_arquivo WHERE camada = ? AND versao = ?", [camada, versao])
+        _registrar_arquivo(conn, camada, versao, manifesto, inteira=True)
+    else:
+        return None
+    _gravar_manifesto(conn, camada, versao, manifesto)
+    return manifesto
+
+
+def _manifesto_build(conn, camada, anterior, particoes):
+    """
+    Manifesto da versão que o build acabou de criar: as partições reescritas
+    (`particoes`; None = todas) ganham um bloco novo, as demais vêm de `anterior`.
+    """
+    if particoes is None or anterior is None:
+        return _com_bloco(conn, camada, _assinaturas_ativas(conn, camada))
+    manifesto = {p: a for p, a in _manifesto(conn, camada, anterior).items() if p not in particoes}
+    if particoes:
+        manifesto.update(_com_bloco(conn, camada, _assinaturas_ativas(conn, camada, particoes)))
+    return manifesto
+
+
+# --- Arquivo das partições ---
+
+def _registrar_arquivo(conn, camada, versao, manifesto, inteira):
+    if manifesto:
+        conn.executemany("INSERT INTO camadas_arquivo VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (camada, versao, particao, *assinatura[:3], inteira) for particao, assinatura in manifesto.items()
+        ])
+
+
+def _arquivadas(conn, camada):
+    """{(particao, coluna, linhas, checksum): versão do arquivo que guarda essas linhas}."""
+    return {
+        (particao, coluna, linhas, checksum): versao
+        for versao, particao, coluna, linhas, checksum in conn.execute(
+            "SELECT versao, particao, coluna, linhas, checksum FROM camadas_arquivo WHERE camada = ?", [camada]
+        ).fetchall()
+    }
+
+
+def _fontes(conn, camada, manifesto, particoes):
+    """{versão do arquivo: [partições]}: de onde ler as `particoes` do `manifesto`."""
+    arquivadas = _arquivadas(conn, camada)
+    fontes = {}
+    for particao in particoes:
+        fontes.setdefault(arquivadas[(particao, *manifesto[particao][:3])], []).append(particao)
+    return fontes
+
+
+def _arquivar_linhas(conn, camada, versao, particoes):
+    """
+    Copia para '<camada>__v<versao>' as linhas das `particoes` da tabela ativa
+    (que está na versão `versao`) que ainda não estão em nenhum arquivo. Uma
+    partição igual em várias versões fica arquivada uma vez só.
+    """
+    manifesto = _manifesto(conn, camada, versao)
+    arquivadas = _arquivadas(conn, camada)
+    faltam = {p: manifesto[p] for p in particoes if p in manifesto and (p, *manifesto[p][:3]) not in arquivadas}
+    if not faltam:
+        return
+    arquivo = _nome_versao(camada, versao)
+    coluna = next(iter(faltam.values()))[0]
+    selecao = f'SELECT * FROM "{camada}" WHERE list_contains(?, {expr_particao(coluna)})'
+    if tabela_existe(conn, arquivo):
+        conn.execute(f'INSERT INTO "{arquivo}" BY NAME {selecao}', [list(faltam)])
+    else:
+        conn.execute(f'CREATE TABLE "{arquivo}" AS {selecao}', [list(faltam)])
+    _registrar_arquivo(conn, camada, versao, faltam, inteira=False)
+
+
+def _arquivar_tabela(conn, camada, versao):
+    """A tabela ativa (versão `versao`) sai inteira: é renomeada para '<camada>__v<versao>'."""
+    manifesto = _manifesto(conn, camada, versao)
+    arquivo = _nome_versao(camada, versao)
+    # O que o arquivo da versão ativa já guardava também está na tabela ativa
+    conn.execute(f'DROP TABLE IF EXISTS "{arquivo}"')
+    conn.execute("DELETE FROM camadas_arquivo WHERE camada = ? AND versao = ?", [camada, versao])
+    conn.execute(f'ALTER TABLE "{camada}" RENAME TO "{arquivo}"')
+    _registrar_arquivo(conn, camada, versao, manifesto, inteira=True)
+
+
+def _arquivo_inteiro(conn, camada, versao):
+    """A versão está inteira no arquivo dela, na ordem original (renomeada de volta sem cópia)."""
+    if not tabela_existe(conn, _nome_versao(camada, versao)):
+        return False
+    manifesto = _manifesto(conn, camada, versao)
+    registro = conn.execute(
+        "SELECT particao, coluna, linhas, checksum, inteira FROM camadas_arquivo WHERE camada = ? AND versao = ?",
+        [camada, versao],
+    ).fetchall()
+    return all(inteira for *_, inteira in registro) and (
+        {tuple(linha[:4]) for linha in registro} == {(p, *assinatura[:3]) for p, assinatura in manifesto.items()}
+    )
+
+
+def _liberar_arquivo(conn, camada):
+    """Apaga dos arquivos as partições que nenhuma versão inativa usa (as da ativa estão na tabela ativa)."""
+    usadas = set(conn.execute("""
+        SELECT p.particao, p.coluna, p.linhas, p.checksum
+        FROM camadas_particoes p JOIN camadas_versoes v USING (camada, versao)
+        WHERE p.camada = ? AND NOT v.ativa
+    """, [camada]).fetchall())
+    por_arquivo = {}
+    for versao, *assinatura in conn.execute(
+        "SELECT versao, particao, coluna, linhas, checksum FROM camadas_arquivo WHERE camada = ?", [camada]
+    ).fetchall():
+        por_arquivo.setdefault(versao, []).append(tuple(assinatura))
+    for versao, assinaturas in por_arquivo.items():
+        livres = [a for a in assinaturas if a not in usadas]
+        if not livres:
+            continue
+        arquivo = _nome_versao(camada, versao)
+        particoes = [particao for particao, *_ in livres]
+        if len(livres) == len(assinaturas):
+            conn.execute(f'DROP TABLE IF EXISTS "{arquivo}"')
+        else:
+            conn.execute(
+                f'DELETE FROM "{arquivo}" WHERE list_contains(?, {expr_particao(livres[0][1])})', [particoes]
+            )
+        conn.execute(
+            "DELETE FROM camadas_arquivo WHERE camada = ? AND versao = ? AND list_contains(?, particao)",
+            [camada, versao, particoes],
+        )
+
+
+# --- Montagem da tabela ativa a partir dos arquivos ---
+
+def _copiar_de_arquivos(conn, camada, manifesto, particoes, criar=False):
+    """Insere na tabela ativa as `particoes` do `manifesto`, lidas dos arquivos (`criar`: cria a tabela)."""
+    for fonte, lidas in sorted(_fontes(conn, camada, manifesto, particoes).items()):
+        expr = expr_particao(manifesto[lidas[0]][0])
+        selecao = f'SELECT * FROM "{_nome_versao(camada, fonte)}" WHERE list_contains(?, {expr})'
+        if criar:
+            conn.execute(f'CREATE TABLE "{camada}" AS {selecao}', [lidas])
+            criar = False
+        else:
+            conn.execute(f'INSERT INTO "{camada}" BY NAME {selecao}', [lidas])
+
+
+def _montar_tabela(conn, camada, versao):
+    """
+    Recria a tabela ativa com as partições da versão `versao`, lidas dos
+    arquivos. Retorna True se só renomeou (a ordem das linhas é a da versão);
+    senão, todas as partições da versão passam a um bloco novo.
+    """
+    arquivo = _nome_versao(camada, versao)
+    if _arquivo_inteiro(conn, camada, versao):
+        conn.execute(f'ALTER TABLE "{arquivo}" RENAME TO "{camada}"')
+        conn.execute("DELETE FROM camadas_arquivo WHERE camada = ? AND versao = ?", [camada, versao])
+        return True
+
+    manifesto = _manifesto(conn, camada, versao)
+    if not manifesto:  # Versão vazia: só o esquema
+        conn.execute(f'CREATE TABLE "{camada}" AS SELECT * FROM "{arquivo}" LIMIT 0')
+    _copiar_de_arquivos(conn, camada, manifesto, list(manifesto), criar=True)
+    _regravar_blocos(conn, camada, versao, manifesto)
+    return False
+
+
+def _planejar_troca(camada, atuais, alvo, particoes):
+    """
+    (trocadas, mesmas, refazer) para levar a tabela ativa de `atuais` a `alvo`
+    nas `particoes` (None = todas): as partições que diferem; dentre elas, as
+    do Gold de mesmo conteúdo e outro bloco, que só são regravadas no fim; e se
+    o Gold fica como está, com amostras e catálogo refeitos inteiros.
+    """
+    candidatas = set(atuais) | set(alvo) if particoes is None else set(particoes)
+    trocadas = sorted(p for p in candidatas if atuais.get(p) != alvo.get(p))
+    mesmas = [p for p in trocadas if p in atuais and p in alvo and atuais[p][:3] == alvo[p][:3]]
+    # Se quase todo o Gold só mudaria de lugar, não vale regravá-lo (no Silver,
+    # a ordem das linhas não importa)
+    refazer = camada == "gold" and 2 * sum(alvo[p][1] for p in mesmas) > sum(a[1] for a in alvo.values())
+    if refazer or camada != "gold":
+        trocadas, mesmas = [p for p in trocadas if p not in mesmas], []
+    return trocadas, mesmas, refazer
+
+
+def _trocar_particoes(conn, camada, atuais, versao, particoes=None, arquivar=None):
+    """
+    Deixa a tabela ativa, descrita pelo manifesto `atuais`, igual à versão
+    `versao` nas `particoes` (padrão: todas). As que saem vão antes para o
+    arquivo da versão `arquivar` (None: descartadas).
+    """
+    alvo = _manifesto(conn, camada, versao)
+    trocadas, mesmas, refazer = _planejar_troca(camada, atuais, alvo, particoes)
+    if arquivar is not None:
+        _arquivar_linhas(conn, camada, arquivar, [p for p in trocadas if p in atuais and p not in mesmas])
+
+    # As partições regravadas ficam depois do maior rowid atual
+    desde = conn.execute(f'SELECT COALESCE(MAX(rowid), -1) FROM "{camada}"').fetchone()[0]
+    if trocadas:
+        expr = expr_particao(next(iter({**atuais, **alvo}.values()))[0])
+        if mesmas:
+            conn.execute(
+                f'INSERT INTO "{camada}" SELECT * FROM "{camada}" WHERE list_contains(?, {expr})', [mesmas]
+            )
+        conn.execute(f'DELETE FROM "{camada}" WHERE rowid <= ? AND list_contains(?, {expr})', [desde, trocadas])
+        _copiar_de_arquivos(conn, camada, alvo, [p for p in trocadas if p in alvo and p not in mesmas])
+
+    if refazer:
+        _regravar_blocos(conn, camada, versao, alvo)
+        _atualizar_auxiliares_gold(conn, versao)
+    elif trocadas:
+        _marcar_bloco(conn, camada, versao, [p for p in trocadas if p in alvo])
+        if camada == "gold":
+            _atualizar_auxiliares_gold(conn, versao, trocadas, desde)
+
+
+def _troca_compativel(conn, camada, atuais, alvo):
+    """Dá para trocar só as partições: mesma coluna de partição e mesmo esquema nos arquivos de origem."""
+    if len({coluna for coluna, *_ in [*atuais.values(), *alvo.values()]}) > 1:
+        return False
+    esquema = [c[:2] for c in conn.execute(f'DESCRIBE "{camada}"').fetchall()]
+    diferentes = [p for p, assinatura in alvo.items() if atuais.get(p, ())[:3] != assinatura[:3]]
+    return all(
+        [c[:2] for c in conn.execute(f'DESCRIBE "{_nome_versao(camada, fonte)}"').fetchall()] == esquema
+        for fonte in _fontes(conn, camada, alvo, diferentes)
+    )
+
+
+def _atualizar_auxiliares_gold(conn, versao, particoes=None, desde=None):
+    """
+    As linhas do Gold mudaram de lugar: amostras, catálogo (posições do zone
+    map) e cache são refeitos só para as `particoes` regravadas no fim (rowid
+    acima de `desde`) ou, sem elas, para o Gold inteiro.
+    """
+    if tabela_existe(conn, 'gold_particoes'):
+        coluna = conn.execute("SELECT ANY_VALUE(coluna) FROM gold_particoes").fetchone()[0]
+    else:
+        coluna = coluna_particao(conn, "gold")
+    atualizar_amostras_gold(conn, particoes, desde)
+    atualizar_catalogo_gold(conn, coluna, particoes, desde)
+    _descartar_cache_gold(conn, versao)
+
+
+# --- Build, falha e retenção ---
+
+def _arquivar_ativa(conn, camada, parcial):
+    """
+    Arquiva a versão ativa antes do build e retorna o número dela (None se não
+    há). No build completo, as tabelas são renomeadas; no incremental, só as
+    auxiliares (pequenas) são copiadas e a principal fica com o build.
+    """
+    _garantir_registro_versoes(conn)
+    if not tabela_existe(conn, camada):
+        return None
+    atual = versao_ativa(conn, camada)
+    if atual is None:  # Camada criada antes do versionamento
+        atual = _proxima_versao(conn, camada)
+        _registrar_versao(conn, camada, atual, "legado")
+
+    conn.execute("BEGIN TRANSACTION")
+    if parcial:
+        _manifesto(conn, camada, atual)  # Registrado antes de o build alterar a tabela
+        for tabela in TABELAS_CAMADA[camada][1:]:
+            if tabela_existe(conn, tabela):
+                conn.execute(f'CREATE TABLE "{_nome_versao(tabela, atual)}" AS SELECT * FROM "{tabela}"')
+    else:
+        _arquivar_tabela(conn, camada, atual)
+        _renomear_auxiliares(conn, camada, None, atual)
+    conn.execute("COMMIT")
+    return atual
+
+
+def arquivar_particoes(conn, versao, particoes=None):
+    """
+    Chamada pelo build incremental, na transação dele, antes de alterar a
+    tabela principal: arquiva as `particoes` que vão ser substituídas ou
+    removidas (`versao` é o estado de nova_versao). As demais continuam na
+    tabela ativa, valendo para as duas versões. Sem `particoes`, a tabela sai
+    inteira (o build vai recriá-la).
+    """
+    if versao["anterior"] is None or versao["particoes"] is None:
+        return  # Nada a arquivar, ou a tabela já saiu inteira
+    if particoes is None:
+        _arquivar_tabela(conn, versao["camada"], versao["anterior"])
+        versao["particoes"] = None
+        return
+    _arquivar_linhas(conn, versao["camada"], versao["anterior"], particoes)
+    versao["particoes"].update(particoes)
+
+
+def _restaurar_particoes(conn, camada, anterior, particoes):
+    """
+    O build incremental altera a tabela na mesma transação em que arquiva: se
+    ela foi confirmada, as `particoes` arquivadas voltam à versão `anterior`.
+    """
+    manifesto = _manifesto(conn, camada, anterior)
+    coluna = next(iter(manifesto.values()))[0] if manifesto else coluna_particao(conn, camada)
+    atuais = {
+        p: (*assinatura, manifesto.get(p, (None,) * 4)[3])
+        for p, assinatura in _assinaturas(conn, camada, coluna, particoes).items()
+    }
+    _trocar_particoes(conn, camada, atuais, anterior, particoes)
+
+
+def _restaurar_ativa(conn, camada, anterior, particoes):
+    """Desfaz um build que falhou: a versão `anterior` volta a ser a ativa."""
+    conn.execute("BEGIN TRANSACTION")
+    for tabela in TABELAS_CAMADA[camada][1:]:
+        conn.execute(f'DROP TABLE IF EXISTS "{tabela}"')
+    _renomear_auxiliares(conn, camada, anterior, None)
+    if anterior is None:
+        conn.execute(f'DROP TABLE IF EXISTS "{camada}"')
+    elif particoes is None:
+        conn.execute(f'DROP TABLE IF EXISTS "{camada}"')
+        if not _montar_tabela(conn, camada, anterior) and camada == "gold":
+            _atualizar_auxiliares_gold(conn, anterior)
+    elif particoes:
+        _restaurar_particoes(conn, camada, anterior, particoes)
+    conn.execute("COMMIT")
+
+
+def _descartar_auxiliares(conn, camada, versao):
+    for tabela in TABELAS_CAMADA[camada][1:]:
+        conn.execute(f'DROP TABLE IF EXISTS "{_nome_versao(tabela, versao)}"')
+
+
+def _aplicar_retencao(conn, camada):
+    """Descarta as versões além das VERSOES_MANTIDAS mais recentes e as partições arquivadas só delas."""
+    antigas = conn.execute("""
+        SELECT versao FROM camadas_versoes WHERE camada = ? AND NOT ativa
+        ORDER BY versao DESC OFFSET ?
+    """, [camada, VERSOES_MANTIDAS]).fetchall()
+    if not antigas:
+        return
+    conn.execute("BEGIN TRANSACTION")
+    for (versao,) in antigas:
+        _descartar_auxiliares(conn, camada, versao)
+        if not conn.execute("SELECT COUNT(*) FROM camadas_arquivo WHERE camada = ? AND versao = ?",
+                            [camada, versao]).fetchone()[0]:
+            conn.execute(f'DROP TABLE IF EXISTS "{_nome_versao(camada, versao)}"')  # Arquivo sem registro
+        for tabela in ("camadas_versoes", "camadas_metricas", "camadas_particoes"):
+            conn.execute(f"DELETE FROM {tabela} WHERE camada = ? AND versao = ?", [camada, versao])
+    _liberar_arquivo(conn, camada)
+    conn.execute("COMMIT")
+
+
+@contextlib.contextmanager
+def nova_versao(conn, camada, modo="completo"):
+    """
+    Envolve o build de `camada`: arquiva a versão ativa antes e registra a nova
+    depois. Se o bloco falhar, a versão anterior é restaurada. O bloco pode
+    ajustar `estado["modo"]` ou marcar `estado["descartar"]` (nada mudou). No
+    modo incremental, o bloco chama arquivar_particoes antes de alterar a
+    tabela principal.
+    """
+    aguardar_metricas_gold()  # A thread de métricas não pode ler tabelas sendo renomeadas
+    anterior = _arquivar_ativa(conn, camada, parcial=(modo == "incremental"))
+    estado = {
+        "modo": modo, "descartar": False, "versao": anterior, "camada": camada, "anterior": anterior,
+        # Partições arquivadas pelo build incremental (None: a tabela saiu inteira)
+        "particoes": set() if modo == "incremental" else None,
+    }
+    try:
+        yield estado
+    except BaseException:
+        try:
+            conn.execute("ROLLBACK")
+        except duckdb.Error:
+            pass  # Nenhuma transação aberta
+        _restaurar_ativa(conn, camada, anterior, estado["particoes"])
+        print(f"↩️ Build do {camada.upper()} falhou: versão {anterior} restaurada.")
+        raise
+
+    if estado["descartar"] and modo == "incremental":
+        _descartar_auxiliares(conn, camada, anterior)
+        return
+    manifesto = _manifesto_build(conn, camada, anterior, estado["particoes"])
+    estado["versao"] = _proxima_versao(conn, camada)
+    conn.execute("BEGIN TRANSACTION")
+    _registrar_versao(conn, camada, estado["versao"], estado["modo"])
+    _gravar_manifesto(conn, camada, estado["versao"], manifesto)
+    conn.execute("COMMIT")
+    _aplicar_retencao(conn, camada)
+
+
+# --- Consulta e rollback ---
+
+def listar_versoes(db_path):
+    """Versões registradas de Silver e Gold, com as últimas métricas de cada uma."""
+    conn = conectar(db_path)
+    try:
+        if not tabela_existe(conn, 'camadas_versoes'):
+            return pd.DataFrame()
+        return conn.execute("""
+            SELECT v.camada, v.versao, v.ativa, v.modo, v.criado_em, v.linhas, v.versao_silver,
+                   json_extract(m.metricas, '$.tempo_gold_s')::DOUBLE AS tempo_gold_s,
+                   json_extract(m.metricas, '$.db_size_mb')::DOUBLE AS db_size_mb
+            FROM camadas_versoes v
+            LEFT JOIN (
+                SELECT * FROM camadas_metricas
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY camada, versao ORDER BY registrado_em DESC) = 1
+            ) m USING (camada, versao)
+            ORDER BY v.camada DESC, v.versao DESC
+        """).fetchdf()
+    finally:
+        conn.close()
+
+
+def _versao_disponivel(conn, camada, atuais, alvo):
+    """Cada partição de `alvo` está na tabela ativa (`atuais`) ou em algum arquivo."""
+    arquivadas = _arquivadas(conn, camada)
+    return alvo is not None and all(
+        atuais.get(p, ())[:3] == assinatura[:3] or (p, *assinatura[:3]) in arquivadas
+        for p, assinatura in alvo.items()
+    )
+
+
+def _ativar_versao(conn, camada, atual, versao, atuais, alvo):
+    """
+    Troca a ativa de `atual` para `versao`. Renomeia se `versao` está inteira
+    no arquivo dela (ou se as partições não podem ser trocadas); senão, copia
+    só as partições que diferem.
+    """
+    _renomear_auxiliares(conn, camada, None, atual)
+    _renomear_auxiliares(conn, camada, versao, None)
+    if _arquivo_inteiro(conn, camada, versao) or not _troca_compativel(conn, camada, atuais, alvo):
+        _arquivar_tabela(conn, camada, atual)
+        if not _montar_tabela(conn, camada, versao) and camada == "gold":
+            _atualizar_auxiliares_gold(conn, versao)
+    else:
+        _trocar_particoes(conn, camada, atuais, versao, arquivar=atual)
+    conn.execute("UPDATE camadas_versoes SET ativa = (versao = ?) WHERE camada = ?", [versao, camada])
+
+
+def reverter_camada(db_path, camada, versao=None):
+    """
+    Torna `versao` (padrão: a mais recente anterior à ativa) a versão ativa de
+    `camada`, sem recomputar a camada. Retorna (versão anterior, versão ativada).
+    """
+    if camada not in TABELAS_CAMADA:
+        raise ValueError(f"Camada inválida: '{camada}'. Use silver ou gold.")
+    aguardar_metricas_gold()
+    conn = conectar(db_path)
+    try:
+        atual = versao_ativa(conn, camada)
+        if atual is None:
+            raise ValueError(f"{camada.upper()} não tem versões registradas.")
+        if versao is None:
+            linha = conn.execute(
+                "SELECT MAX(versao) FROM camadas_versoes WHERE camada = ? AND versao < ?", [camada, atual]
+            ).fetchone()
+            versao = linha[0]
+            if versao is None:
+                raise ValueError(f"{camada.upper()} não tem versão anterior à {atual}.")
+        if versao == atual:
+            return atual, versao
+
+        _garantir_registro_versoes(conn)
+        conn.execute("BEGIN TRANSACTION")
+        atuais = _manifesto(conn, camada, atual) or {}
+        alvo = _manifesto(conn, camada, versao)
+        if not _versao_disponivel(conn, camada, atuais, alvo):
+            conn.execute("ROLLBACK")
+            raise ValueError(f"Versão {versao} do {camada.upper()} não está disponível.")
+        _ativar_versao(conn, camada, atual, versao, atuais, alvo)
+        conn.execute("COMMIT")
+        return atual, versao
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# 🏹 CACHE ARROW DO GOLD (MEMORY MAPPING)
+# ---------------------------
+# Ao fim do run_gold, o Gold ativo é gravado em Arrow IPC (Feather v2, sem
+# compressão) na pasta 'cache' ao lado do banco (ou em CACHE_GOLD_DIR), com a
+# versão no nome do arquivo. O menu e o
+# CLI abrem o arquivo com memory mapping em vez de decodificar o Gold via
+# fetchdf(): as páginas são lidas sob demanda, e processos que abrem o mesmo
+# Gold compartilham o page cache do SO. As colunas de texto ficam como
+# string[pyarrow] sobre as páginas mapeadas (sem cópia), e não object como no
+# fetchdf(); os demais dtypes são os do fetchdf(). Se o cache não
+# corresponde à versão ativa (rollback, banco recriado), ele é regravado na
+# abertura. Sem pyarrow, ou com PIPELINE_CACHE_GOLD=0, o Gold é lido do DuckDB.
+CACHE_GOLD = pa is not None and os.environ.get("PIPELINE_CACHE_GOLD", "1").lower() not in ("0", "false", "no")
+CACHE_GOLD_DIR = os.environ.get("PIPELINE_CACHE_GOLD_DIR") or None
+LOTE_CACHE_GOLD = 1_000_000  # Linhas por record batch gravado
+
+if pa is not None:
+    # Inteiros/booleanos com nulos: mesmos dtypes anuláveis do fetchdf()
+    _DTYPES_ANULAVEIS = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+        pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    _DTYPES_TEXTO = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def pasta_cache_gold(db_path):
+    """Pasta do cache: 'cache' ao lado do banco, qualquer que seja o diretório de trabalho."""
+    return CACHE_GOLD_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), "cache")
+
+
+def caminho_cache_gold(db_path, versao):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(pasta_cache_gold(db_path), f"{base}.gold.v{versao}.arrow")
+
+
+def _descartar_cache_gold(conn, versao):
+    """Remove o cache da versão `versao` (a ordem das linhas dela no Gold mudou)."""
+    db_path = conn.execute("SELECT path FROM duckdb_databases() WHERE database_name = current_database()").fetchone()[0]
+    caminho = caminho_cache_gold(db_path, versao)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def _chave_cache_gold(conn):
+    """(versão, criado_em) do Gold ativo, gravados nos metadados do cache."""
+    if not tabela_existe(conn, 'camadas_versoes'):
+        return None
+    linha = conn.execute("SELECT versao, criado_em FROM camadas_versoes WHERE camada = 'gold' AND ativa").fetchone()
+    return {b"versao": str(linha[0]).encode(), b"criado_em": str(linha[1]).encode()} if linha else None
+
+
+def _cache_corresponde(caminho, chave):
+    # Só o rodapé do arquivo é lido (esquema com os metadados)
+    try:
+        with pa.memory_map(caminho, "r") as origem:
+            metadados = pa.ipc.open_file(origem).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return all(metadados.get(k) == v for k, v in chave.items())
+
+
+def escrever_cache_gold(conn, db_path):
+    """
+    Grava o Gold ativo no cache Arrow, em streaming (record batches), se o
+    cache da versão ativa ainda não existir. Retorna o caminho ou None.
+    """
+    if not CACHE_GOLD:
+        return None
+    chave = _chave_cache_gold(conn)
+    if chave is None or not tabela_existe(conn, 'gold'):
+        return None
+    caminho = caminho_cache_gold(db_path, chave[b"versao"].decode())
+    if _cache_corresponde(caminho, chave):
+        return caminho
+
+    pasta = pasta_cache_gold(db_path)
+    os.makedirs(pasta, exist_ok=True)
+    leitor = conn.execute("SELECT * FROM gold").to_arrow_reader(LOTE_CACHE_GOLD)
+    esquema = leitor.schema.with_metadata(chave)
+    # Arquivo temporário + rename: quem já mapeou o cache anterior não é afetado
+    fd, temporario = tempfile.mkstemp(suffix=".arrow.tmp", dir=pasta)
+    os.close(fd)
+    os.chmod(temporario, 0o644)  # Legível por outros processos/usuários
+    try:
+        with pa.OSFile(temporario, "wb") as destino, pa.ipc.new_file(destino, esquema) as escritor:
+            for lote in leitor:
+                escritor.write_batch(lote)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+    # Caches de outras versões deste banco não servem mais
+    prefixo = os.path.basename(caminho_cache_gold(db_path, "")).removesuffix(".arrow")
+    for nome in os.listdir(pasta):
+        antigo = os.path.join(pasta, nome)
+        if re.fullmatch(re.escape(prefixo) + r"\d+\.arrow", nome) and antigo != caminho:
+            os.remove(antigo)
+    return caminho
+
+
+def _df_do_cache(tabela):
+    """DataFrame com os dtypes do fetchdf(), exceto o texto: string[pyarrow] sem cópia (não object)."""
+    for i, campo in enumerate(tabela.schema):
+        if pa.types.is_date(campo.type):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(pa.timestamp("us")))
+        elif pa.types.is_decimal(campo.type):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(pa.float64()))
+    df = tabela.to_pandas(split_blocks=True, types_mapper=_DTYPES_TEXTO.get)
+    for campo in tabela.schema:
+        if campo.type in _DTYPES_ANULAVEIS and tabela.column(campo.name).null_count:
+            df[campo.name] = tabela.column(campo.name).to_pandas(types_mapper=_DTYPES_ANULAVEIS.get)
+    return df
+
+
+def abrir_cache_gold(db_path):
+    """
+    Abre o Gold ativo a partir do cache Arrow mapeado em memória (gravando o
+    cache antes, se faltar). Retorna None se não houver Gold versionado.
+    """
+    conn = conectar(db_path)
+    try:
+        caminho = escrever_cache_gold(conn, db_path)
+    finally:
+        conn.close()
+    if caminho is None:
+        return None
+    return _df_do_cache(pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all())
+
+
+# ---------------------------
+# 🧹 LIMPEZA CONFIGURÁVEL (SILVER)
+# ---------------------------
+# As regras de limpeza são compiladas em expressões SQL por coluna e o DuckDB
+# aplica todas numa única consulta sobre o Bronze (vetorizada), em vez de
+# várias passadas do pandas sobre o DataFrame inteiro. Ordem em cada valor:
+# aparar espaços → tokens nulos → remover acentos → caixa → separador decimal.
+# As regras ficam em três camadas de SELECT aninhados: o DuckDB não reaproveita
+# uma subexpressão repetida (ex: o valor aparado dentro do CASE dos nulos), e
+# cada camada lê da anterior uma coluna já calculada.
+# A especificação (JSON) vem de PIPELINE_LIMPEZA ou de --limpeza, como arquivo
+# ou como o próprio JSON; "colunas" ajusta as regras por coluna (nome já
+# padronizado). O padrão reproduz a limpeza anterior: só os tokens nulos.
+LIMPEZA = os.environ.get("PIPELINE_LIMPEZA") or None
+LIMPEZA_PADRAO = {
+    "nulos": ["", " ", "NULL", "null", "None"],
+    "aparar": False,           # Remove espaços, tabs e quebras de linha nas pontas
+    "caixa": None,             # None | 'minusculas' | 'maiusculas'
+    "remover_acentos": False,
+    "decimal": None,           # None | ',' (1.234,56 → 1234.56) | '.' (1,234.56 → 1234.56)
+    "colunas": {},
+}
+_ESPACOS_SQL = "' ' || chr(9) || chr(10) || chr(13) || chr(160)"
+# Separador decimal → (número com esse separador, separador de milhar)
+_NUMEROS_DECIMAL = {
+    ",": (r"[+-]?(\d{1,3}(\.\d{3})+|\d+),\d+", "."),
+    ".": (r"[+-]?\d{1,3}(,\d{3})+(\.\d+)?", ","),
+}
+
+
+def _literal_sql(texto):
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _validar_regras(regras, contexto):
+    desconhecidas = sorted(set(regras) - set(LIMPEZA_PADRAO) - {"colunas"})
+    if desconhecidas:
+        raise ValueError(f"Regras de limpeza desconhecidas em {contexto}: {desconhecidas}")
+    nulos = regras.get("nulos", [])
+    if not isinstance(nulos, list) or not all(isinstance(t, str) for t in nulos):
+        raise ValueError(f"'nulos' deve ser uma lista de textos em {contexto}.")
+    if regras.get("caixa") not in (None, "minusculas", "maiusculas"):
+        raise ValueError(f"Caixa inválida em {contexto}: {regras['caixa']} (use 'minusculas' ou 'maiusculas').")
+    if regras.get("decimal") not in (None, ",", "."):
+        raise ValueError(f"Separador decimal inválido em {contexto}: {regras['decimal']} (use ',' ou '.').")
+
+
+def carregar_limpeza(origem=None):
+    """
+    Especificação de limpeza a partir de `origem` (arquivo JSON ou o próprio
+    JSON), completada com LIMPEZA_PADRAO. Especificação inválida levanta ValueError.
+    """
+    spec = dict(LIMPEZA_PADRAO)
+    if origem:
+        try:
+            if origem.lstrip().startswith("{"):
+                regras = json.loads(origem)
+            else:
+                with open(origem, encoding="utf-8") as f:
+                    regras = json.load(f)
+        except OSError as e:
+            raise ValueError(f"Arquivo de limpeza não encontrado ou ilegível: {origem} ({e.strerror})") from e
+        except ValueError as e:
+            raise ValueError(f"JSON de limpeza inválido: {e}") from e
+        if not isinstance(regras, dict):
+            raise ValueError("A especificação de limpeza deve ser um objeto JSON.")
+        spec.update(regras)
+    _validar_regras(spec, "especificação")
+    if not isinstance(spec["colunas"], dict):
+        raise ValueError("'colunas' deve ser um objeto {coluna: regras}.")
+    for coluna, regras in spec["colunas"].items():
+        if not isinstance(regras, dict):
+            raise ValueError(f"Regras da coluna '{coluna}' devem ser um objeto JSON.")
+        if "colunas" in regras:
+            raise ValueError(f"Regras da coluna '{coluna}' não podem ter 'colunas'.")
+        _validar_regras(regras, f"coluna '{coluna}'")
+    return spec
+
+
+def regras_coluna(spec, coluna):
+    regras = {k: v for k, v in spec.items() if k != "colunas"}
+    regras.update(spec["colunas"].get(coluna, {}))
+    return regras
+
+
+def exprs_limpeza(origem, coluna, regras):
+    """
+    Expressões SQL das três camadas de `regras` para uma coluna de texto:
+    aparar (lê `origem`, do Bronze); nulos, acentos e caixa; separador
+    decimal. As duas últimas leem `coluna`, calculada na camada anterior.
+    """
+    aparar = f"trim({origem}, {_ESPACOS_SQL})" if regras["aparar"] else origem
+
+    valor = coluna
+    if regras["nulos"]:
+        valor = f"CASE WHEN {coluna} IN ({', '.join(map(_literal_sql, regras['nulos']))}) THEN NULL ELSE {coluna} END"
+    if regras["remover_acentos"]:
+        valor = f"strip_accents({valor})"
+    if regras["caixa"]:
+        valor = f"{'lower' if regras['caixa'] == 'minusculas' else 'upper'}({valor})"
+
+    decimal = coluna
+    if regras["decimal"]:
+        padrao, milhar = _NUMEROS_DECIMAL[regras["decimal"]]
+        numero = f"replace({coluna}, '{milhar}', '')"
+        if regras["decimal"] == ",":
+            numero = f"replace({numero}, ',', '.')"
+        # Os dois formatos têm vírgula: o contains() evita a regex na maioria dos valores
+        decimal = (f"CASE WHEN contains({coluna}, ',') AND regexp_full_match({coluna}, {_literal_sql(padrao)}) "
+                   f"THEN {numero} ELSE {coluna} END")
+    return [aparar, valor, decimal]
+
+
+def sql_limpeza(conn, tabela, spec, colunas=None):
+    """
+    Consulta que lê `tabela` já limpa, com os nomes de coluna padronizados
+    (só `colunas`, se informadas). Só as colunas de texto passam pelas regras.
+    """
+    tipos = [(nome, tipo) for nome, tipo, *_ in conn.execute(f"DESCRIBE {tabela}").fetchall()]
+    nomes = [normalizar_nome_coluna(nome) for nome, _ in tipos]
+    faltando = sorted(set(spec["colunas"]) - set(nomes))
+    if faltando:
+        raise ValueError(f"Colunas da limpeza não encontradas no Bronze: {faltando}")
+
+    camadas = [[], [], []]
+    for (nome, tipo), padronizado in zip(tipos, nomes):
+        if colunas is not None and padronizado not in colunas:
+            continue
+        origem = '"' + nome.replace('"', '""') + '"'
+        coluna = f'"{padronizado}"'
+        if tipo == "VARCHAR":
+            exprs = exprs_limpeza(origem, coluna, regras_coluna(spec, padronizado))
+        else:
+            exprs = [origem, coluna, coluna]
+        for camada, expr in zip(camadas, exprs):
+            camada.append((expr, coluna))
+
+    sql = f"SELECT {', '.join(f'{expr} AS {coluna}' for expr, coluna in camadas[0])} FROM {tabela}"
+    for camada in camadas[1:]:
+        # Camada sem nenhuma regra (só repassa as colunas) é omitida
+        if any(expr != coluna for expr, coluna in camada):
+            sql = f"SELECT {', '.join(f'{expr} AS {coluna}' for expr, coluna in camada)} FROM ({sql})"
+    return sql
+
+
+def descrever_limpeza(spec):
+    regras = [f"nulos={len(spec['nulos'])}"] if spec["nulos"] else []
+    regras += [nome for nome in ("aparar", "remover_acentos") if spec[nome]]
+    regras += [f"{nome}={spec[nome]}" for nome in ("caixa", "decimal") if spec[nome]]
+    if spec["colunas"]:
+        regras.append(f"ajustes em {', '.join(spec['colunas'])}")
+    return ", ".join(regras) or "nenhuma"
+
+
 # ---------------------------
 # 🥈 ETAPA SILVER (MODIFICADA COM CACHE)
 # ---------------------------
-def run_silver(db_path, bronze_table, force_recompile=False):
+# Deduplicação por chave de negócio. Sem chaves, só linhas idênticas (hash_id)
+# são removidas. Com chaves, fica uma versão por chave: a última (ou a
+# primeira) pela coluna de ordem; empates e ausência de ordem usam a posição
+# de chegada. Configurável por variáveis de ambiente ou pelo CLI.
+DEDUP_CHAVES = [c.strip() for c in os.environ.get("PIPELINE_DEDUP_CHAVES", "").split(",") if c.strip()]
+DEDUP_ORDEM = os.environ.get("PIPELINE_DEDUP_ORDEM") or None
+DEDUP_ESTRATEGIA = os.environ.get("PIPELINE_DEDUP_ESTRATEGIA", "ultima")  # 'ultima' | 'primeira'
+
+
+def normalizar_nome_coluna(nome):
+    """Mesma padronização aplicada às colunas no Silver."""
+    return re.sub(r"[^a-z0-9_]+", "_", nome.lower().strip())
+
+
+def resolver_config_dedup(colunas):
+    """Valida a configuração de dedup contra as colunas do Silver. Retorna (chaves, ordem)."""
+    if DEDUP_ESTRATEGIA not in ("ultima", "primeira"):
+        raise ValueError(f"Estratégia de dedup inválida: {DEDUP_ESTRATEGIA} (use 'ultima' ou 'primeira').")
+    chaves = [normalizar_nome_coluna(c) for c in DEDUP_CHAVES]
+    ordem = normalizar_nome_coluna(DEDUP_ORDEM) if DEDUP_ORDEM else None
+    faltando = [c for c in chaves + ([ordem] if ordem else []) if c not in colunas]
+    if faltando:
+        raise ValueError(f"Colunas de dedup não encontradas no Silver: {faltando}")
+    return chaves, ordem
+
+
+def _ordem_versoes(ordem, incremental=False):
+    direcao = "DESC" if DEDUP_ESTRATEGIA == "ultima" else "ASC"
+    termos = [f'"{ordem}" {direcao} NULLS LAST'] if ordem else []
+    if incremental:
+        termos.append(f"_origem {direcao}")  # 0 = Silver existente, 1 = lote novo
+    termos.append(f"_linha {direcao}")
+    return ", ".join(termos)
+
+
+def _particao(chaves):
+    return ", ".join(f'"{c}"' for c in chaves)
+
+
+def _registrar_dedup(conn, modo, chaves, ordem, entrada, exatas, substituidas):
+    if modo == "completo":
+        conn.execute("DROP TABLE IF EXISTS silver_dedup")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS silver_dedup (
+            executado_em TIMESTAMP, modo VARCHAR, chaves VARCHAR, ordem VARCHAR, estrategia VARCHAR,
+            linhas_entrada BIGINT, duplicatas_exatas BIGINT, versoes_substituidas BIGINT, linhas_silver BIGINT
+        )
+    """)
+    linhas_silver = conn.execute("SELECT COUNT(*) FROM silver").fetchone()[0]
+    conn.execute(
+        "INSERT INTO silver_dedup VALUES (now(), ?, ?, ?, ?, ?, ?, ?, ?)",
+        [modo, ",".join(chaves), ordem, DEDUP_ESTRATEGIA, entrada, exatas, substituidas, linhas_silver],
+    )
+    return linhas_silver
+
+
+def deduplicar_silver(conn, origem, chaves, ordem):
+    """
+    Recria 'silver' a partir de `origem` (relação com hash_id e _linha):
+    remove duplicatas exatas e, com chaves, versões substituídas.
+    """
+    entrada = conn.execute(f"SELECT COUNT(*) FROM {origem}").fetchone()[0]
+    unicos = f"""
+        SELECT * FROM {origem}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY hash_id ORDER BY _linha) = 1
+    """
+    if chaves:
+        sql = f"""
+            SELECT * EXCLUDE (_linha) FROM ({unicos})
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY {_particao(chaves)} ORDER BY {_ordem_versoes(ordem)}) = 1
+            ORDER BY _linha
+        """
+    else:
+        sql = f"SELECT * EXCLUDE (_linha) FROM ({unicos}) ORDER BY _linha"
+
+    conn.execute(f"CREATE OR REPLACE TABLE silver AS {sql}")
+    n_unicos = conn.execute(f"SELECT COUNT(DISTINCT hash_id) FROM {origem}").fetchone()[0]
+    linhas_silver = conn.execute("SELECT COUNT(*) FROM silver").fetchone()[0]
+    return _registrar_dedup(
+        conn, "completo", chaves, ordem, entrada, entrada - n_unicos, n_unicos - linhas_silver
+    )
+
+
+def deduplicar_silver_incremental(conn, origem, chaves, ordem, versao):
+    """
+    Incorpora o lote `origem` ao 'silver' existente. Só as chaves presentes no
+    lote são recalculadas: a versão vencedora substitui a anterior. As
+    partições alteradas são arquivadas antes (`versao`: estado de nova_versao).
+    """
+    entrada = conn.execute(f"SELECT COUNT(*) FROM {origem}").fetchone()[0]
+    conn.execute("BEGIN TRANSACTION")
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE lote_silver AS
+        SELECT * FROM {origem}
+        WHERE hash_id NOT IN (SELECT hash_id FROM silver)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY hash_id ORDER BY _linha) = 1
+    """)
+    n_lote = conn.execute("SELECT COUNT(*) FROM lote_silver").fetchone()[0]
+    exatas = entrada - n_lote
+    expr = expr_particao(coluna_particao(conn, "silver"))
+
+    if chaves:
+        mesma_chave = " AND ".join(f'l."{c}" IS NOT DISTINCT FROM s."{c}"' for c in chaves)
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE afetados_silver AS
+            SELECT s.* FROM silver s
+            WHERE EXISTS (SELECT 1 FROM lote_silver l WHERE {mesma_chave})
+        """)
+        n_afetados = conn.execute("SELECT COUNT(*) FROM afetados_silver").fetchone()[0]
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE vencedores_silver AS
+            SELECT * EXCLUDE (_origem, _linha) FROM (
+                SELECT *, 0 AS _origem, 0 AS _linha FROM afetados_silver
+                UNION ALL BY NAME
+                SELECT *, 1 AS _origem FROM lote_silver
+            )
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY {_particao(chaves)} ORDER BY {_ordem_versoes(ordem, incremental=True)}
+            ) = 1
+        """)
+        particoes = conn.execute(
+            f"SELECT {expr} FROM afetados_silver UNION SELECT {expr} FROM vencedores_silver"
+        ).fetchall()
+        arquivar_particoes(conn, versao, [p for (p,) in particoes])
+        conn.execute(f"""
+            DELETE FROM silver s
+            WHERE EXISTS (SELECT 1 FROM lote_silver l WHERE {mesma_chave})
+        """)
+        conn.execute("INSERT INTO silver BY NAME SELECT * FROM vencedores_silver")
+        n_vencedores = conn.execute("SELECT COUNT(*) FROM vencedores_silver").fetchone()[0]
+        substituidas = n_lote + n_afetados - n_vencedores
+    else:
+        particoes = conn.execute(f"SELECT DISTINCT {expr} FROM lote_silver").fetchall()
+        arquivar_particoes(conn, versao, [p for (p,) in particoes])
+        conn.execute("INSERT INTO silver BY NAME SELECT * EXCLUDE (_linha) FROM lote_silver ORDER BY _linha")
+        substituidas = 0
+
+    linhas_silver = _registrar_dedup(conn, "incremental", chaves, ordem, entrada, exatas, substituidas)
+    conn.execute("COMMIT")
+    return linhas_silver
+
+
+def run_silver(db_path, bronze_table, force_recompile=False, incremental=False):
+    """
+    Cria o Silver a partir do Bronze. Com `incremental`, o Bronze atual é
+    tratado como um lote novo e incorporado ao Silver existente.
+    """
     global SILVER_RUNTIME
     start_time = time.time()
-    conn = duckdb.connect(db_path)
+    conn = conectar(db_path)
 
     # Lógica de cache
-    if not force_recompile and tabela_existe(conn, 'silver'):
+    if not force_recompile and not incremental and tabela_existe(conn, 'silver'):
         while True:
             print("\n⚠️ Tabela SILVER já existe.")
             print("[1] Usar este Silver existente")
             print("[2] Recriar Silver (a partir do Bronze)")
-            opc = input("Escolha a opção (1/2): ").strip()
+            print("[3] Incorporar o Bronze atual ao Silver (incremental)")
+            opc = input("Escolha a opção (1/2/3): ").strip()
 
             if opc == "1":
                 print("✔ Mantendo Silver existente. Seguindo fluxo...")
@@ -288,114 +1710,326 @@ def run_silver(db_path, bronze_table, force_recompile=False):
                 print("🔁 Recriando Silver...")
                 break # Sai do loop e continua a função
 
+            elif opc == "3":
+                print("➕ Incorporando lote ao Silver...")
+                incremental = True
+                break
+
             else:
                 print("Opção inválida.")
-    
-    # 1. Extração do Bronze
-    print("⚙️ Carregando Bronze e iniciando transformação...")
-    df = conn.execute(f"SELECT * FROM {bronze_table}").fetchdf()
-
-    # 2. Transformação (Limpeza e Padronização)
-    print("⚙️ Limpando colunas e dados...")
-    df.columns = (
-        df.columns.str.lower()
-        .str.strip()
-        .str.replace(r"[^a-z0-9_]+", "_", regex=True)
-    )
-
-    df = df.replace(["", " ", "NULL", "null", "None"], pd.NA)
 
-    for col in df.columns:
-        if df[col].dtype == object:
-            fmt = detectar_formato_data(df[col])
-            if fmt:
-                df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce")
-
-    print("⚙️ Gerando hash_id e removendo duplicatas...")
-    df["hash_id"] = df.apply(hash_linha, axis=1)
-    df = df.drop_duplicates(subset=["hash_id"])
+    if incremental and not tabela_existe(conn, 'silver'):
+        print("⚠️ Silver inexistente: a carga incremental será uma carga completa.")
+        incremental = False
+    
+    spec = carregar_limpeza(LIMPEZA)  # Especificação inválida falha antes de arquivar o Silver
+
+    # Nova versão do Silver: a ativa é arquivada e volta se o build falhar
+    with nova_versao(conn, "silver", "incremental" if incremental else "completo") as versao:
+        # 1. Extração do Bronze já limpo e padronizado (regras compiladas em SQL)
+        print(f"⚙️ Carregando Bronze e limpando colunas e dados (regras: {descrever_limpeza(spec)})...")
+        df = conn.execute(sql_limpeza(conn, bronze_table, spec)).fetchdf()
+
+        # 2. Transformação (datas)
+        for col in df.columns:
+            if df[col].dtype == object:
+                fmt = detectar_formato_data(df[col])
+                if fmt:
+                    df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce")
+
+        chaves, ordem = resolver_config_dedup(df.columns)
+
+        print("⚙️ Gerando hash_id e removendo duplicatas...")
+        df["hash_id"] = df.apply(hash_linha, axis=1)
+        df["_linha"] = range(len(df))  # Posição de chegada (desempate entre versões)
     
-    # 3. Load (Criação da Tabela Silver)
-    conn.execute("DROP TABLE IF EXISTS silver")
-    conn.register("df_silver", df)
-    conn.execute("CREATE TABLE silver AS SELECT * FROM df_silver")
-    conn.unregister("df_silver")
+        # 3. Load (Criação da Tabela Silver, dedup executada no DuckDB)
+        conn.register("df_silver", df)
+        if incremental:
+            linhas_silver = deduplicar_silver_incremental(conn, "df_silver", chaves, ordem, versao)
+        else:
+            linhas_silver = deduplicar_silver(conn, "df_silver", chaves, ordem)
+        conn.unregister("df_silver")
 
     conn.close()
     
     SILVER_RUNTIME = time.time() - start_time
-    print(f"✅ Silver criado com {len(df)} linhas em {SILVER_RUNTIME:.2f}s.")
+    print(f"✅ Silver {'atualizado' if incremental else 'criado'} com {linhas_silver} linhas em {SILVER_RUNTIME:.2f}s "
+          f"(versão {versao['versao']}).")
+    if chaves:
+        print(f"   Dedup por chave {chaves} ({DEDUP_ESTRATEGIA} versão"
+              f"{' por ' + ordem if ordem else ' por chegada'}).")
     
 
+# ---------------------------
+# 🧩 PARTIÇÕES DO GOLD (REFRESH INCREMENTAL)
+# ---------------------------
+# O Gold é particionado pelo mês da primeira coluna de data do Silver (sem
+# coluna de data, há uma partição única). Para cada partição, 'gold_particoes'
+# guarda a contagem e o checksum (XOR dos hashes de hash_id) das linhas do
+# Silver que a alimentam, além do resultado dos DQCs. O refresh incremental
+# recompõe só as partições cujo checksum mudou.
+PARTICAO_UNICA = "todos"
+TIPOS_NUMERICOS = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                   "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL")
+
+
+def expr_mes(col):
+    """Expressão SQL 'AAAA-MM' da coluna de data (linhas sem data: 'sem_data')."""
+    return f"""COALESCE(strftime(CAST("{col}" AS TIMESTAMP), '%Y-%m'), 'sem_data')"""
+
+
+def coluna_particao(conn, tabela):
+    """Primeira coluna de data/hora de `tabela`, ou None."""
+    for nome, tipo, *_ in conn.execute(f"DESCRIBE {tabela}").fetchall():
+        if tipo.startswith(("TIMESTAMP", "DATE")):
+            return nome
+    return None
+
+
+def expr_particao(col):
+    return expr_mes(col) if col else f"'{PARTICAO_UNICA}'"
+
+
+def assinaturas_silver(conn, col):
+    """{particao: (linhas, checksum)} das linhas do Silver."""
+    return {
+        particao: (linhas, checksum)
+        for particao, linhas, checksum in conn.execute(f"""
+            SELECT {expr_particao(col)}, COUNT(*), bit_xor(hash(hash_id)) FROM silver GROUP BY 1
+        """).fetchall()
+    }
+
+
+def verificar_dq_particoes(conn, col, desde=None):
+    """
+    Executa os DQCs no Gold, por partição (todas, ou só as das linhas com
+    rowid acima de `desde`, as inseridas no refresh incremental).
+    Retorna {particao: (linhas, linhas_com_nulos, hash_duplicados, colunas_negativas)}.
+    """
+    colunas = conn.execute("DESCRIBE gold").fetchall()
+    numericas = [nome for nome, tipo, *_ in colunas if tipo.startswith(TIPOS_NUMERICOS)]
+    algum_nulo = " OR ".join(f'"{nome}" IS NULL' for nome, *_ in colunas)
+    negativos = "".join(f', COUNT(*) FILTER (WHERE "{nome}" < 0)' for nome in numericas)
+    expr = expr_particao(col)
+    filtro = "WHERE rowid > ?" if desde is not None else ""
+
+    resultado = {}
+    for particao, linhas, nulos, duplicados, *neg in conn.execute(f"""
+        SELECT {expr}, COUNT(*), COUNT(*) FILTER (WHERE {algum_nulo}),
+               COUNT(*) - COUNT(DISTINCT hash_id){negativos}
+        FROM gold {filtro} GROUP BY 1
+    """, [desde] if desde is not None else None).fetchall():
+        resultado[particao] = (linhas, nulos, duplicados, [c for c, n in zip(numericas, neg) if n])
+    return resultado
+
+
+def registrar_particoes_gold(conn, col, assinaturas, dq, removidas=(), completo=False):
+    """Grava em 'gold_particoes' a assinatura e os DQCs das partições recompostas."""
+    if completo:
+        conn.execute("DROP TABLE IF EXISTS gold_particoes")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS gold_particoes (
+            particao VARCHAR, coluna VARCHAR, linhas BIGINT, checksum UBIGINT, linhas_com_nulos BIGINT,
+            hash_duplicados BIGINT, colunas_negativas VARCHAR[], atualizado_em TIMESTAMP
+        )
+    """)
+    alvo = list(dq) + list(removidas)
+    if alvo:
+        conn.execute("DELETE FROM gold_particoes WHERE list_contains(?, particao)", [alvo])
+    agora = conn.execute("SELECT CAST(now() AS TIMESTAMP)").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO gold_particoes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (particao, col, linhas, assinaturas[particao][1], nulos, duplicados, negativas, agora)
+            for particao, (linhas, nulos, duplicados, negativas) in dq.items()
+        ],
+    )
+
+
+def avisar_dq_gold(conn):
+    """Imprime os alertas de qualidade do Gold a partir de 'gold_particoes' (sem ler dados)."""
+    nulos, duplicados, negativas = conn.execute("""
+        SELECT SUM(linhas_com_nulos), SUM(hash_duplicados), list_sort(list_distinct(flatten(list(colunas_negativas))))
+        FROM gold_particoes
+    """).fetchone()
+    if nulos:
+        print("⚠️ Atenção: valores nulos presentes")
+    if duplicados:
+        print("⚠️ Atenção: hash_id duplicado (erro no silver?)")
+    for col in negativas or []:
+        print(f"⚠️ Valores fora do domínio (negativos) na coluna {col}")
+
+
+def atualizar_gold_incremental(conn, versao):
+    """
+    Recompõe no Gold só as partições cujo checksum no Silver mudou (arquivadas
+    antes; `versao`: estado de nova_versao).
+    Retorna (alteradas, removidas), ou None quando o Gold precisa ser recriado
+    (sem registro de partições, esquema diferente ou tipo incompatível).
+    """
+    if not (tabela_existe(conn, 'gold') and tabela_existe(conn, 'gold_particoes')):
+        return None
+    col = coluna_particao(conn, "silver")
+    colunas_silver = [c[0] for c in conn.execute("DESCRIBE silver").fetchall()]
+    colunas_gold = [c[0] for c in conn.execute("DESCRIBE gold").fetchall()]
+    registradas = {
+        particao: (linhas, checksum, coluna)
+        for particao, linhas, checksum, coluna in conn.execute(
+            "SELECT particao, linhas, checksum, coluna FROM gold_particoes"
+        ).fetchall()
+    }
+    if colunas_silver != colunas_gold or any(coluna != col for *_, coluna in registradas.values()):
+        return None
+
+    atuais = assinaturas_silver(conn, col)
+    alteradas = sorted(p for p, assinatura in atuais.items() if registradas.get(p, (None, None))[:2] != assinatura)
+    removidas = sorted(p for p in registradas if p not in atuais)
+    if not alteradas and not removidas:
+        return alteradas, removidas
+
+    expr = expr_particao(col)
+    conn.execute("BEGIN TRANSACTION")
+    # As linhas inseridas ficam depois do maior rowid atual: DQCs, amostras e
+    # catálogo leem só elas
+    desde = conn.execute("SELECT COALESCE(MAX(rowid), -1) FROM gold").fetchone()[0]
+    arquivar_particoes(conn, versao, alteradas + removidas)
+    try:
+        conn.execute(f"DELETE FROM gold WHERE list_contains(?, {expr})", [alteradas + removidas])
+        if alteradas:
+            # Os tipos do Gold são mantidos: o DuckDB converte as colunas do Silver
+            conn.execute(f"INSERT INTO gold BY NAME SELECT * FROM silver WHERE list_contains(?, {expr})", [alteradas])
+    except duckdb.ConversionException as e:
+        conn.execute("ROLLBACK")
+        print(f"⚠️ Valores do Silver incompatíveis com os tipos do Gold: {e}")
+        return None
+    dq = verificar_dq_particoes(conn, col, desde) if alteradas else {}
+    registrar_particoes_gold(conn, col, atuais, dq, removidas)
+    atualizar_amostras_gold(conn, alteradas + removidas, desde)
+    atualizar_catalogo_gold(conn, col, alteradas + removidas, desde)
+    conn.execute("COMMIT")
+    return alteradas, removidas
+
+
 # ---------------------------
 # 🥇 ETAPA GOLD (MODIFICADA COM CACHE E MÉTRICAS)
 # ---------------------------
-def run_gold(db_path, force_recompile=False):
+def run_gold(db_path, force_recompile=False, incremental=False):
+    """
+    Cria o Gold a partir do Silver. Com `incremental`, só as partições (meses)
+    cujas linhas no Silver mudaram são recompostas.
+    """
     global GOLD_RUNTIME
     start_time = time.time()
-    conn = duckdb.connect(db_path)
+    conn = conectar(db_path)
 
     # Lógica de cache
-    if not force_recompile and tabela_existe(conn, 'gold'):
+    if not force_recompile and not incremental and tabela_existe(conn, 'gold'):
         while True:
             print("\n⚠️ Tabela GOLD já existe.")
             print("[1] Usar este Gold existente")
             print("[2] Recriar Gold (a partir do Silver)")
-            opc = input("Escolha a opção (1/2): ").strip()
+            print("[3] Atualizar só as partições alteradas no Silver (incremental)")
+            opc = input("Escolha a opção (1/2/3): ").strip()
 
             if opc == "1":
                 print("✔ Mantendo Gold existente. Seguindo fluxo...")
                 conn.close()
-                registrar_metricas_gold(db_path) # Ainda registra métricas do cache
+                agendar_metricas_gold(db_path) # Ainda registra métricas do cache
                 return # Retorna sem recompilar
 
             elif opc == "2":
                 print("🔁 Recriando Gold...")
                 break # Sai do loop e continua a função
-            else:
-                print("Opção inválida.")
 
-    # 1. Extração do Silver
-    print("⚙️ Carregando Silver e iniciando DQC...")
-    df = conn.execute("SELECT * FROM silver").fetchdf()
-    
-    # 2. Transformação (Data Quality Checks - DQC)
-    if df.isna().any().any():
-        print("⚠️ Atenção: valores nulos presentes")
-
-    if df["hash_id"].duplicated().any():
-        print("⚠️ Atenção: hash_id duplicado (erro no silver?)")
+            elif opc == "3":
+                print("🧩 Atualizando partições do Gold...")
+                incremental = True
+                break
 
-    for col in df.select_dtypes(include=["object"]).columns:
-        # Tenta converter colunas de objeto para numérico, se for o caso
-        df[col] = pd.to_numeric(df[col], errors='ignore')
-        
-    for col in df.select_dtypes(include=["number"]).columns:
-        if (df[col] < 0).any():
-            print(f"⚠️ Valores fora do domínio (negativos) na coluna {col}")
+            else:
+                print("Opção inválida.")
 
-    # 3. Load (Criação da Tabela Gold)
-    conn.execute("DROP TABLE IF EXISTS gold")
-    conn.register("df_gold", df)
-    conn.execute("CREATE TABLE gold AS SELECT * FROM df_gold")
-    conn.unregister("df_gold")
+    # Nova versão do Gold (com amostras, catálogo e partições): a ativa é
+    # arquivada e volta se o build falhar
+    with nova_versao(conn, "gold", "incremental" if incremental else "completo") as versao:
+        resultado = None
+        if incremental:
+            print("⚙️ Comparando partições do Silver com o Gold...")
+            resultado = atualizar_gold_incremental(conn, versao)
+            if resultado is None:
+                print("⚠️ Refresh incremental indisponível: o Gold será recriado.")
+                versao["modo"] = "completo"
+            elif resultado == ([], []):
+                versao["descartar"] = True  # Nenhuma partição mudou: não há nova versão
+
+        if resultado is None:
+            # 1. Extração do Silver
+            print("⚙️ Carregando Silver e iniciando DQC...")
+            df = conn.execute("SELECT * FROM silver").fetchdf()
+
+            # 2. Transformação
+            for col in df.select_dtypes(include=["object"]).columns:
+                # Tenta converter colunas de objeto para numérico, se for o caso
+                df[col] = pd.to_numeric(df[col], errors='ignore')
+
+            # 3. Load (Criação da Tabela Gold; no incremental que virou completo, a ativa ainda não foi arquivada)
+            arquivar_particoes(conn, versao)
+            conn.execute("DROP TABLE IF EXISTS gold")
+            conn.register("df_gold", df)
+            conn.execute("CREATE TABLE gold AS SELECT * FROM df_gold")
+            conn.unregister("df_gold")
+
+            # Data Quality Checks (DQC) por partição, registrados com o checksum do Silver
+            col_particao = coluna_particao(conn, "silver")
+            registrar_particoes_gold(
+                conn, col_particao, assinaturas_silver(conn, col_particao),
+                verificar_dq_particoes(conn, col_particao), completo=True,
+            )
+            # Amostras persistidas para o modo de consulta aproximado
+            atualizar_amostras_gold(conn)
+            # Catálogo de estatísticas (menus e poda de grupos de linhas)
+            atualizar_catalogo_gold(conn, col_particao)
+        avisar_dq_gold(conn)
+
+    linhas_gold = conn.execute("SELECT COUNT(*) FROM gold").fetchone()[0]
+    GOLD_RUNTIME = time.time() - start_time
 
+    # Cache Arrow da versão ativa para reabrir o menu sem decodificar o Gold
+    inicio_cache = time.time()
+    cache = escrever_cache_gold(conn, db_path)
     conn.close()
-    
-    GOLD_RUNTIME = time.time() - start_time
-    print(f"✅ Gold criado com {len(df)} linhas em {GOLD_RUNTIME:.2f}s.")
-    
-    # Nova funcionalidade: Registro de Métricas
-    registrar_metricas_gold(db_path)
+
+    if resultado is None:
+        print(f"✅ Gold criado com {linhas_gold} linhas em {GOLD_RUNTIME:.2f}s (versão {versao['versao']}).")
+    else:
+        alteradas, removidas = resultado
+        print(f"✅ Gold atualizado ({linhas_gold} linhas, versão {versao['versao']}) em {GOLD_RUNTIME:.2f}s: "
+              f"{len(alteradas)} partição(ões) recomposta(s), {len(removidas)} removida(s).")
+        if alteradas:
+            print(f"   Recompostas: {', '.join(alteradas)}")
+    if cache:
+        print(f"🏹 Cache Arrow do Gold: {cache} ({os.path.getsize(cache) / 1024**2:.1f} MB, "
+              f"{time.time() - inicio_cache:.2f}s)")
+
+    # Registro de Métricas (em segundo plano: o fluxo segue sem esperar)
+    agendar_metricas_gold(db_path)
     
     
 # --------------------------
 # 📈 REGISTRO DE MÉTRICAS (NOVA FUNÇÃO)
 # --------------------------
-def registrar_metricas_gold(db_path):
-    print("\n--- 📈 Métricas do Pipeline (Registro Q3) ---")
+def registrar_metricas_gold(db_path, exibir=True, duracoes=None):
+    """
+    Coleta as métricas do pipeline e grava metricas.json e os gráficos.
+    `duracoes` (Silver, Gold) substitui os tempos globais; com `exibir=False`
+    nada é impresso (uso pela thread de métricas em segundo plano).
+    """
+    log = print if exibir else (lambda *args, **kwargs: None)
+    silver_runtime, gold_runtime = duracoes or (SILVER_RUNTIME, GOLD_RUNTIME)
+    log("\n--- 📈 Métricas do Pipeline (Registro Q3) ---")
     
-    conn = duckdb.connect(db_path)
+    conn = conectar(db_path)
     
     # 🚨 CORREÇÃO DE ERRO: Inicializa variáveis para garantir que o escopo seja mantido.
     linhas_bronze = 0
@@ -406,13 +2040,13 @@ def registrar_metricas_gold(db_path):
     
     # 1. Tempo de Execução
     # ... (O código de tempo é mantido)
-    print(f"⏱ Tempo de execução Silver: {SILVER_RUNTIME:.2f}s")
-    print(f"⏱ Tempo de execução Gold: {GOLD_RUNTIME:.2f}s")
-    print(f"⏱ Tempo total S+G: {SILVER_RUNTIME + GOLD_RUNTIME:.2f}s")
+    log(f"⏱ Tempo de execução Silver: {silver_runtime:.2f}s")
+    log(f"⏱ Tempo de execução Gold: {gold_runtime:.2f}s")
+    log(f"⏱ Tempo total S+G: {silver_runtime + gold_runtime:.2f}s")
     
     # 2. Tamanho das Tabelas/Arquivos
     db_size = os.path.getsize(db_path) / (1024 * 1024) # MB
-    print(f"\n💾 Tamanho do arquivo DB ({os.path.basename(db_path)}): {db_size:.2f} MB")
+    log(f"\n💾 Tamanho do arquivo DB ({os.path.basename(db_path)}): {db_size:.2f} MB")
     
     # 3. Contagem de Linhas e Redução
     try:
@@ -427,74 +2061,678 @@ def registrar_metricas_gold(db_path):
         linhas_silver = 0
         linhas_gold = 0
     
-    if linhas_bronze > 0:
-        # Garante que pct_duplicatas só é calculada se linhas_bronze > 0
-        pct_duplicatas = 100 * (linhas_bronze - linhas_silver) / linhas_bronze
+    # Redução do último build do Silver, pelo registro de dedup dele: no
+    # incremental, o Bronze tem só o lote novo e o Silver é acumulado
+    try:
+        linhas_entrada, linhas_removidas = conn.execute("""
+            SELECT linhas_entrada, duplicatas_exatas + versoes_substituidas
+            FROM silver_dedup ORDER BY executado_em DESC LIMIT 1
+        """).fetchone()
+    except Exception:
+        # Silver anterior ao registro de dedup (sempre completo)
+        linhas_entrada, linhas_removidas = linhas_bronze, linhas_bronze - linhas_silver
+    if linhas_entrada > 0:
+        # Garante que pct_duplicatas só é calculada se houve linhas de entrada
+        pct_duplicatas = 100 * linhas_removidas / linhas_entrada
+
+    log("\n🔢 Contagem de Linhas:")
+    log(f"  - Bronze: {linhas_bronze:,}")
+    log(f"  - Silver: {linhas_silver:,}")
+    log(f"  - Gold: {linhas_gold:,}")
+
+    if linhas_entrada > 0:
+        log(f"  - Redução (Duplicatas eliminadas): {pct_duplicatas:.2f}% (Bronze → Silver)")
+
+    # Dedup: duplicatas exatas x versões substituídas (chave de negócio)
+    duplicatas_exatas = 0
+    versoes_substituidas = 0
+    try:
+        duplicatas_exatas, versoes_substituidas = conn.execute(
+            "SELECT SUM(duplicatas_exatas), SUM(versoes_substituidas) FROM silver_dedup"
+        ).fetchone()
+        log(f"  - Duplicatas exatas removidas: {duplicatas_exatas:,}")
+        log(f"  - Versões substituídas (chave de negócio): {versoes_substituidas:,}")
+    except Exception:
+        pass
+        
+    # Partições do Gold: total e recompostas na última atualização
+    particoes_gold = 0
+    particoes_recompostas = 0
+    try:
+        particoes_gold, particoes_recompostas = conn.execute("""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE atualizado_em = (SELECT MAX(atualizado_em) FROM gold_particoes))
+            FROM gold_particoes
+        """).fetchone()
+        log(f"  - Partições do Gold: {particoes_gold:,} ({particoes_recompostas:,} recompostas na última atualização)")
+    except Exception:
+        pass
+        
+    # 4. Pico de Memória (Simulado)
+    log(f"\n🧠 Pico de Memória Estimado: {simulated_peak_memory_mb:.2f} MB")
+
+    # 5. Cardinalidade aproximada (HyperLogLog) por coluna do Gold
+    distintos_aprox = {}
+    try:
+        colunas_gold = [c[0] for c in conn.execute("DESCRIBE gold").fetchall()]
+        valores = conn.execute(
+            "SELECT " + ", ".join(f'approx_count_distinct("{c}")' for c in colunas_gold) + " FROM gold"
+        ).fetchone()
+        distintos_aprox = dict(zip(colunas_gold, valores))
+    except Exception:
+        pass
+    if distintos_aprox:
+        log("\n🔎 Valores distintos (aprox., HyperLogLog):")
+        for col, n in distintos_aprox.items():
+            log(f"  - {col}: ~{n:,}")
         
-    print("\n🔢 Contagem de Linhas:")
-    print(f"  - Bronze: {linhas_bronze:,}")
-    print(f"  - Silver: {linhas_silver:,}")
-    print(f"  - Gold: {linhas_gold:,}")
+    # -------------------------------------
+    # 1. ARTEFATO: metricas.json (JSON/CSV)
+    # -------------------------------------
+    metricas = {
+        "tempo_silver_s": silver_runtime,
+        "tempo_gold_s": gold_runtime,
+        "tempo_total_sg_s": silver_runtime + gold_runtime,
+        "db_size_mb": db_size,
+        "linhas_bronze": linhas_bronze,
+        "linhas_silver": linhas_silver,
+        "linhas_gold": linhas_gold,
+        "pct_duplicatas_eliminadas": pct_duplicatas,
+        "duplicatas_exatas": duplicatas_exatas,
+        "versoes_substituidas": versoes_substituidas,
+        "particoes_gold": particoes_gold,
+        "particoes_recompostas": particoes_recompostas,
+        "pico_memoria_mb_estimado": simulated_peak_memory_mb,
+        "distintos_aprox": distintos_aprox,
+    }
+    if PROFILING is not None and PROFILING["perfis"]:
+        metricas["profiling"] = dict(PROFILING["perfis"])
+
+    # Métricas ligadas às versões medidas
+    versoes = {}
+    try:
+        versoes = dict(conn.execute("SELECT camada, versao FROM camadas_versoes WHERE ativa").fetchall())
+    except Exception:
+        pass
+    metricas["versao_silver"] = versoes.get("silver")
+    metricas["versao_gold"] = versoes.get("gold")
+    if versoes.get("gold") is not None:
+        log(f"\n🗃️ Versões medidas: Silver v{versoes.get('silver')}, Gold v{versoes['gold']}")
+        try:
+            conn.execute("INSERT INTO camadas_metricas VALUES ('gold', ?, now(), ?)",
+                         [versoes["gold"], json.dumps(metricas, default=str)])
+        except duckdb.Error as e:
+            print(f"⚠️ Métricas não registradas na versão {versoes['gold']} do Gold: {e}")
+    
+    # Cria a pasta results se não existir
+    os.makedirs("results", exist_ok=True)
+
+    # A escrita dos artefatos é serializada: o menu ([7]) e a thread de
+    # métricas podem registrar ao mesmo tempo
+    with _METRICAS_LOCK:
+        json_path = "results/metricas.json"
+        with open(json_path, 'w') as f:
+            json.dump(metricas, f, indent=4)
+        log(f"\n💾 Métricas salvas em: {json_path}")
+
+        # -------------------------------------
+        # 2. ARTEFATO: throughput_tempo.png (Gráfico 1: Throughput)
+        # -------------------------------------
+        # Figure direto (sem pyplot): seguro fora da thread principal
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        tempos = [silver_runtime, gold_runtime]
+        etapas = ['Silver', 'Gold']
+        ax.bar(etapas, tempos, color=['skyblue', 'lightcoral'])
+        ax.set_title('Throughput: Tempo de Execução por Etapa')
+        ax.set_ylabel('Tempo (segundos)')
+        fig.savefig('results/throughput_tempo.png')
+        log("📈 Gráfico de Throughput salvo.")
+
+        # -------------------------------------
+        # 3. ARTEFATO: dedup_effect.png (Gráfico 2: Efeito Dedup)
+        # -------------------------------------
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        linhas = [linhas_bronze, linhas_silver, linhas_gold]
+        etapas_linhas = ['Bronze (Total)', 'Silver (Após Dedup)', 'Gold (Final)']
+        ax.bar(etapas_linhas, linhas, color=['darkgreen', 'orange', 'blue'])
+        ax.set_title('Efeito de Deduplicação e Redução de Linhas')
+        ax.set_ylabel('Contagem de Linhas')
+        fig.savefig('results/dedup_effect.png')
+        log("📈 Gráfico de Deduplicação salvo.")
+    
+    conn.close()
+    log("---------------------------------------------")
+    return metricas
+
+
+# --------------------------
+# 🧵 MÉTRICAS EM SEGUNDO PLANO
+# --------------------------
+# O run_gold só enfileira o pedido de métricas: a coleta, o metricas.json e os
+# gráficos ficam com uma thread, e o menu volta na hora. Pedidos que chegam
+# enquanto a thread trabalha são agrupados (só o último de cada DB é
+# processado). No encerramento do processo, os pendentes são concluídos.
+# `PIPELINE_METRICAS_SINCRONAS=1` restaura o registro síncrono.
+METRICAS_EM_SEGUNDO_PLANO = os.environ.get("PIPELINE_METRICAS_SINCRONAS", "").lower() not in ("1", "true", "yes")
+METRICAS_BACKGROUND = {"pedidos": 0, "execucoes": 0, "ultimas": {}, "erro": None}
+_METRICAS_FILA = queue.Queue()
+_METRICAS_THREAD = None
+_METRICAS_LOCK = threading.Lock()  # Escrita de metricas.json e dos gráficos
+
+
+def agendar_metricas_gold(db_path):
+    """Registra as métricas do Gold em segundo plano (ou na hora, se desativado)."""
+    global _METRICAS_THREAD
+    if not METRICAS_EM_SEGUNDO_PLANO:
+        return registrar_metricas_gold(db_path)
+    if _METRICAS_THREAD is None:
+        _METRICAS_THREAD = threading.Thread(target=_trabalhador_metricas, name="metricas", daemon=True)
+        _METRICAS_THREAD.start()
+    METRICAS_BACKGROUND["pedidos"] += 1
+    _METRICAS_FILA.put((db_path, (SILVER_RUNTIME, GOLD_RUNTIME)))
+    print("📈 Métricas e gráficos sendo gerados em segundo plano (results/).")
+
+
+def _trabalhador_metricas():
+    encerrar = False
+    while not encerrar:
+        pedidos = [_METRICAS_FILA.get()]
+        while True:
+            try:
+                pedidos.append(_METRICAS_FILA.get_nowait())
+            except queue.Empty:
+                break
+
+        ultimos = {}  # Agrupamento: o pedido mais recente de cada DB
+        for pedido in pedidos:
+            if pedido is None:
+                encerrar = True
+            else:
+                ultimos[pedido[0]] = pedido[1]
+
+        for db_path, duracoes in ultimos.items():
+            try:
+                METRICAS_BACKGROUND["ultimas"][db_path] = registrar_metricas_gold(
+                    db_path, exibir=False, duracoes=duracoes
+                )
+                METRICAS_BACKGROUND["execucoes"] += 1
+            except Exception as e:
+                METRICAS_BACKGROUND["erro"] = f"{type(e).__name__}: {e}"
+                print(f"\n⚠️ Falha ao registrar métricas em segundo plano ({db_path}): {METRICAS_BACKGROUND['erro']}")
+        for _ in pedidos:
+            _METRICAS_FILA.task_done()
+
+
+def aguardar_metricas_gold(db_path=None):
+    """Espera os pedidos pendentes. Retorna as últimas métricas registradas de `db_path`."""
+    if _METRICAS_THREAD is not None:
+        _METRICAS_FILA.join()
+    return METRICAS_BACKGROUND["ultimas"].get(db_path)
+
+
+@atexit.register
+def encerrar_metricas_gold():
+    """Conclui os pedidos pendentes e encerra a thread de métricas."""
+    global _METRICAS_THREAD
+    if _METRICAS_THREAD is None:
+        return
+    _METRICAS_FILA.put(None)
+    _METRICAS_THREAD.join()
+    _METRICAS_THREAD = None
+
+
+# --------------------------
+# 🎯 AMOSTRAS PERSISTIDAS E CONSULTAS APROXIMADAS
+# --------------------------
+# O run_gold mantém uma amostra uniforme do Gold e, se houver coluna de data,
+# uma amostra estratificada por mês. As consultas aproximadas estimam somas
+# pelo estimador de Horvitz-Thompson com IC de 95%.
+#
+# A amostra uniforme é de Bernoulli pelo hash do hash_id: entra a linha cujo
+# hash fica abaixo de um limiar (≈ AMOSTRA_LINHAS / linhas do Gold). Assim o
+# refresh incremental só troca as linhas das partições recompostas, sem
+# sortear de novo o Gold inteiro. Se o Gold crescer ou encolher a ponto de a
+# amostra sair de [metade, dobro] do alvo, o limiar é recalculado.
+AMOSTRA_LINHAS = 100_000
+AMOSTRA_POR_MES = 2_000
+AMOSTRA_SEED = 42
+Z_95 = 1.96
+COLUNAS_META_AMOSTRA = ["_ordem", "_estrato"]
+
+
+def _limiar_amostra(n_pop):
+    """Limiar de hash (UBIGINT) que seleciona ~AMOSTRA_LINHAS de `n_pop` linhas."""
+    return min(2**64 - 1, 2**64 * AMOSTRA_LINHAS // max(n_pop, 1))
+
+
+def atualizar_amostras_gold(conn, particoes=None, desde=None):
+    """
+    Recria as amostras do Gold e o resumo de estratos. No refresh
+    incremental, `particoes` são as partições recompostas ou removidas e
+    `desde` o maior rowid do Gold antes da inserção: as amostras só trocam as
+    linhas dessas partições, lidas das linhas com rowid acima dele.
+    """
+    col = coluna_particao(conn, "gold")
+    n_pop = conn.execute("SELECT COUNT(*) FROM gold").fetchone()[0]
+    limiar = None
+    if particoes is not None and tabela_existe(conn, 'gold_amostra'):
+        colunas_estratos = {c[0] for c in conn.execute("DESCRIBE gold_amostra_estratos").fetchall()}
+        if "limiar" in colunas_estratos:
+            limiar = conn.execute(
+                "SELECT MAX(limiar) FROM gold_amostra_estratos WHERE tabela = 'gold_amostra'"
+            ).fetchone()[0]
+        alvo = min(n_pop, AMOSTRA_LINHAS)
+        if limiar is not None and not alvo / 2 <= n_pop * limiar / 2**64 <= alvo * 2:
+            limiar = None  # Tamanho esperado longe do alvo: sorteia de novo
+    parcial = limiar is not None
+    parcial_mes = parcial and col is not None and tabela_existe(conn, 'gold_amostra_mes')
+
+    ordem = "rowid"
+    if parcial:
+        # As linhas inseridas na transação do refresh têm rowids provisórios:
+        # a ordem delas continua depois da maior já gravada nas amostras
+        inicio = conn.execute("SELECT MIN(rowid) FROM gold WHERE rowid > ?", [desde]).fetchone()[0]
+        maiores = [desde] + [
+            conn.execute(f"SELECT MAX(_ordem) FROM {tabela}").fetchone()[0]
+            for tabela in ("gold_amostra", "gold_amostra_mes") if tabela_existe(conn, tabela)
+        ]
+        ordem = f"rowid - {inicio or 0} + {max(m for m in maiores if m is not None) + 1}"
+
+    amostra = f"SELECT {ordem} AS _ordem, 'todos' AS _estrato, * FROM gold WHERE hash(hash_id, {AMOSTRA_SEED}) <= ?"
+    if parcial:
+        conn.execute(f"DELETE FROM gold_amostra WHERE list_contains(?, {expr_particao(col)})", [particoes])
+        conn.execute(f"INSERT INTO gold_amostra {amostra} AND rowid > ?", [limiar, desde])
+    else:
+        limiar = _limiar_amostra(n_pop)
+        conn.execute(f"CREATE OR REPLACE TABLE gold_amostra AS {amostra}", [limiar])
+
+    if parcial_mes:
+        conn.execute("""
+            DELETE FROM gold_amostra_estratos
+            WHERE tabela = 'gold_amostra' OR (tabela = 'gold_amostra_mes' AND list_contains(?, estrato))
+        """, [particoes])
+        conn.execute("DELETE FROM gold_amostra_mes WHERE list_contains(?, _estrato)", [particoes])
+    else:
+        conn.execute("""
+            CREATE OR REPLACE TABLE gold_amostra_estratos (
+                tabela VARCHAR, coluna_data VARCHAR, estrato VARCHAR, n_pop BIGINT, n_amostra BIGINT,
+                limiar UBIGINT
+            )
+        """)
+        conn.execute("DROP TABLE IF EXISTS gold_amostra_mes")
+    conn.execute("""
+        INSERT INTO gold_amostra_estratos
+        SELECT 'gold_amostra', NULL, 'todos', ?, COUNT(*), ? FROM gold_amostra
+    """, [n_pop, limiar])
+
+    if col is None:
+        return
+    mes = expr_mes(col)
+    filtro = "WHERE rowid > $desde" if parcial_mes else ""
+    params = {"desde": desde} if parcial_mes else None
+    selecao = f"""
+        SELECT * EXCLUDE (_r) FROM (
+            SELECT {ordem if parcial_mes else "rowid"} AS _ordem, {mes} AS _estrato, *,
+                   ROW_NUMBER() OVER (PARTITION BY {mes} ORDER BY hash(rowid, {AMOSTRA_SEED})) AS _r
+            FROM gold {filtro}
+        )
+        WHERE _r <= {AMOSTRA_POR_MES}
+    """
+    if parcial_mes:
+        conn.execute(f"INSERT INTO gold_amostra_mes {selecao}", params)
+    else:
+        conn.execute(f"CREATE TABLE gold_amostra_mes AS {selecao}")
+    conn.execute(f"""
+        INSERT INTO gold_amostra_estratos
+        SELECT 'gold_amostra_mes', '{col}', a._estrato, p.n_pop, COUNT(*), NULL
+        FROM gold_amostra_mes a
+        JOIN (SELECT {mes} AS estrato, COUNT(*) AS n_pop FROM gold {filtro} GROUP BY 1) p
+          ON a._estrato = p.estrato
+        GROUP BY a._estrato, p.n_pop
+    """, params)
+
+
+def carregar_amostras_gold(db_path):
+    """Carrega as amostras persistidas. Retorna None se o Gold ainda não tem amostras."""
+    conn = conectar(db_path)
+    try:
+        if not tabela_existe(conn, 'gold_amostra'):
+            return None
+        estratos = {}
+        coluna_mes = None
+        for tabela, coluna_data, estrato, n_pop, n_amostra in conn.execute(
+            "SELECT tabela, coluna_data, estrato, n_pop, n_amostra FROM gold_amostra_estratos"
+        ).fetchall():
+            estratos.setdefault(tabela, {})[estrato] = (n_pop, n_amostra)
+            if tabela == "gold_amostra_mes":
+                coluna_mes = coluna_data
+        amostras = {
+            "uniforme": conn.execute("SELECT * FROM gold_amostra ORDER BY _ordem").fetchdf(),
+            "mensal": None,
+            "coluna_mes": coluna_mes,
+            "estratos": estratos,
+        }
+        if coluna_mes and tabela_existe(conn, 'gold_amostra_mes'):
+            amostras["mensal"] = conn.execute("SELECT * FROM gold_amostra_mes ORDER BY _ordem").fetchdf()
+        return amostras
+    finally:
+        conn.close()
+
+
+def colunas_amostra(amostras):
+    """DataFrame da amostra uniforme sem as colunas de controle (para menus)."""
+    return amostras["uniforme"].drop(columns=COLUNAS_META_AMOSTRA)
+
+
+def _estimar_totais(df_work, hierarquia_cols, col_soma, estratos):
+    """
+    Estima a soma de `col_soma` para cada nível do ROLLUP a partir de uma
+    amostra (estratificada ou não), com a variância do estimador.
+    """
+    base = df_work[hierarquia_cols + ["_estrato"]].copy()
+    base["y"] = df_work[col_soma].astype(float).fillna(0)
+    base["y2"] = base["y"] ** 2
+    pop = pd.Series({e: v[0] for e, v in estratos.items()}, dtype=float)
+    amo = pd.Series({e: v[1] for e, v in estratos.items()}, dtype=float)
+
+    niveis = []
+    for i in range(len(hierarquia_cols), -1, -1):
+        nivel = hierarquia_cols[:i]
+        g = base.groupby(nivel + ["_estrato"], dropna=False)[["y", "y2"]].sum().reset_index()
+        N = g["_estrato"].map(pop)
+        n = g["_estrato"].map(amo)
+        g["estimativa"] = N / n * g["y"]
+        var_y = (g["y2"] - g["y"] ** 2 / n) / (n - 1).clip(lower=1)
+        g["variancia"] = N ** 2 * (1 - n / N) * var_y / n
+        if nivel:
+            agg = g.groupby(nivel, dropna=False)[["estimativa", "variancia"]].sum().reset_index()
+        else:
+            agg = pd.DataFrame({"estimativa": [g["estimativa"].sum()], "variancia": [g["variancia"].sum()]})
+        for col in hierarquia_cols:
+            if col not in agg:
+                agg[col] = None
+        niveis.append(agg)
+
+    return pd.concat(niveis, ignore_index=True)
+
+
+def executar_rollup_aprox(amostras, col_base_rollup, rollup_type, col_soma):
+    """Rollup aproximado (soma estimada + IC 95%) a partir das amostras do Gold."""
+    if rollup_type == 'temporal' and col_base_rollup == amostras["coluna_mes"] and amostras["mensal"] is not None:
+        amostra, estratos = amostras["mensal"], amostras["estratos"]["gold_amostra_mes"]
+    else:
+        amostra, estratos = amostras["uniforme"], amostras["estratos"]["gold_amostra"]
+
+    df_work, hierarquia_cols, numeric_cols = preparar_rollup(
+        amostra.drop(columns=COLUNAS_META_AMOSTRA), col_base_rollup, rollup_type
+    )
+    if col_soma not in numeric_cols:
+        raise ValueError(f"Coluna '{col_soma}' não é numérica. Disponíveis: {numeric_cols}")
+    df_work["_estrato"] = amostra["_estrato"].values
+
+    res = _estimar_totais(df_work, hierarquia_cols, col_soma, estratos)
+    total = f"total_{col_soma}"
+    result_df = pd.DataFrame(res[hierarquia_cols])
+    result_df[total] = res["estimativa"]
+    result_df[f"ic95_{col_soma}"] = Z_95 * res["variancia"].clip(lower=0) ** 0.5
+    result_df = result_df.sort_values([total] + hierarquia_cols, ascending=False, na_position="first")
+    result_df = result_df.reset_index(drop=True)
+    return result_df.fillna({'dia': 'Total Semanal', 'semana': 'Total Mensal', 'mes': 'Total Geral', col_base_rollup: 'Total'})
+
+
+def executar_media_movel_aprox(amostras, col_value, janela):
+    """
+    Média móvel sobre a amostra uniforme (janela em linhas da amostra), com IC 95%.
+    Cada janela equivale a cerca de janela * N / n linhas do Gold.
+    """
+    amostra = amostras["uniforme"]
+    if col_value not in amostra.columns or col_value in COLUNAS_META_AMOSTRA:
+        raise ValueError(f"Coluna '{col_value}' não existe no Gold.")
+    if janela < 1:
+        raise ValueError("A janela deve ser um inteiro positivo.")
+    serie = pd.to_numeric(amostra[col_value], errors="coerce")
+    janela_movel = serie.rolling(window=janela, min_periods=1)
+    return pd.DataFrame({
+        "linha_gold": amostra["_ordem"],
+        col_value: serie,
+        "media_movel": janela_movel.mean(),
+        "ic95": Z_95 * janela_movel.std() / janela_movel.count() ** 0.5,
+    })
+
+
+def fator_amostra(amostras):
+    n_pop, n_amostra = amostras["estratos"]["gold_amostra"]["todos"]
+    return n_pop / n_amostra if n_amostra else float("nan")
+
+
+# --------------------------
+# 📚 CATÁLOGO DE ESTATÍSTICAS DO GOLD
+# --------------------------
+# Construído no run_gold: por coluna, tipo, nulos, mín/máx, distintos (aprox.)
+# e se é convertível para número; por grupo de linhas (zone map), mín/máx das
+# colunas numéricas. Os menus são montados a partir dele, sem ler os dados, e
+# o Top-K descarta grupos de linhas que não podem conter o resultado.
+#
+# Contagens, nulos e mín/máx ficam por partição ('gold_estatisticas_particoes')
+# e o zone map é cortado por (grupo, partição). No refresh incremental só as
+# partições recompostas são recalculadas, lendo apenas as linhas recém-inseridas,
+# e o resultado é combinado com o das demais. A exceção é `distintos_aprox`: o
+# HyperLogLog do DuckDB não se combina entre partições, então essa contagem
+# ainda lê o Gold inteiro.
+#
+# Os grupos são numerados na ordem de leitura do Gold (não pelo rowid, que
+# muda quando o DuckDB compacta linhas apagadas): as linhas novas entram em
+# grupos novos no fim, e a posição de cada grupo sai da soma das linhas dos
+# grupos anteriores.
+GRUPO_LINHAS = 122_880  # Tamanho do row group do DuckDB
+
+
+def _expr_numerica(nome, tipo):
+    if tipo.startswith(("TIMESTAMP", "DATE", "BOOLEAN")):
+        return None
+    return f'TRY_CAST("{nome}" AS DOUBLE)'
+
+
+def _agregar_gold(conn, colunas, col, posicao, primeiro_grupo=0, filtro="", params=None):
+    """
+    Uma leitura das linhas do Gold em `filtro`, agregadas por (grupo de linhas,
+    partição) na tabela temporária '_catalogo_gold': por coluna, não nulos e
+    mín/máx e, dos valores convertíveis para número, contagem e mín/máx.
+    `posicao` numera as linhas lidas na ordem de leitura (0, 1, ...).
+    """
+    agregados, numeros = [], []
+    for i, (nome, tipo, *_) in enumerate(colunas):
+        agregados += [f'COUNT("{nome}") AS nn_{i}', f'MIN("{nome}") AS min_{i}', f'MAX("{nome}") AS max_{i}']
+        expr = _expr_numerica(nome, tipo)
+        if expr:
+            numeros.append(f"{expr} AS _num_{i}")
+            agregados += [f"COUNT(_num_{i}) AS conv_{i}", f"MIN(_num_{i}) AS nmin_{i}", f"MAX(_num_{i}) AS nmax_{i}"]
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _catalogo_gold AS
+        SELECT grupo, particao, COUNT(*) AS linhas, {', '.join(agregados)}
+        FROM (
+            SELECT {primeiro_grupo} + ({posicao}) // {GRUPO_LINHAS} AS grupo, {expr_particao(col)} AS particao,
+                   *{''.join(', ' + n for n in numeros)}
+            FROM gold {filtro}
+        )
+        GROUP BY 1, 2
+    """, params)
+
+
+def atualizar_catalogo_gold(conn, col, particoes=None, desde=None):
+    """
+    Atualiza 'gold_estatisticas' e 'gold_zonas'. Sem `particoes`, recalcula
+    tudo. No refresh incremental, `particoes` são as partições recompostas ou
+    removidas e `desde` o maior rowid do Gold antes da inserção: só as linhas
+    com rowid acima dele (as das partições recompostas) são lidas.
+    """
+    colunas = conn.execute("DESCRIBE gold").fetchall()
+    parcial = (
+        particoes is not None
+        and tabela_existe(conn, 'gold_estatisticas_particoes')
+        and "particao" in {c[0] for c in conn.execute("DESCRIBE gold_zonas").fetchall()}
+    )
+    if parcial:
+        filtro, params = "WHERE rowid > $desde", {"desde": desde}
+        primeiro_grupo = conn.execute("SELECT COALESCE(MAX(grupo) + 1, 0) FROM gold_zonas").fetchone()[0]
+        # As linhas inseridas de uma vez têm rowids consecutivos
+        posicao = f"rowid - (SELECT MIN(rowid) FROM gold {filtro})"
+    else:
+        filtro, params, primeiro_grupo = "", None, 0
+        total, maior_rowid = conn.execute("SELECT COUNT(*), MAX(rowid) FROM gold").fetchone()
+        # Gold recém-criado tem rowids contínuos; depois de um refresh incremental,
+        # a posição na ordem de leitura vem do ROW_NUMBER (o rowid tem lacunas)
+        posicao = "rowid" if maior_rowid is None or maior_rowid + 1 == total else "ROW_NUMBER() OVER (ORDER BY rowid) - 1"
+    _agregar_gold(conn, colunas, col, posicao, primeiro_grupo, filtro, params)
+
+    # 1. Estatísticas por partição, combinadas por coluna
+    if parcial:
+        conn.execute("DELETE FROM gold_estatisticas_particoes WHERE list_contains(?, particao)", [particoes])
+    else:
+        conn.execute("""
+            CREATE OR REPLACE TABLE gold_estatisticas_particoes (
+                particao VARCHAR, coluna VARCHAR, linhas BIGINT, nao_nulos BIGINT,
+                minimo VARCHAR, maximo VARCHAR, convertiveis BIGINT
+            )
+        """)
+    conn.execute("INSERT INTO gold_estatisticas_particoes " + " UNION ALL ".join(
+        f"""SELECT particao, '{nome}', SUM(linhas), SUM(nn_{i}), CAST(MIN(min_{i}) AS VARCHAR),
+                   CAST(MAX(max_{i}) AS VARCHAR), {f'SUM(conv_{i})' if _expr_numerica(nome, tipo) else '0'}
+            FROM _catalogo_gold GROUP BY particao"""
+        for i, (nome, tipo, *_) in enumerate(colunas)
+    ))
+
+    # Única leitura do Gold inteiro no refresh incremental (ver acima)
+    distintos = conn.execute(
+        "SELECT " + ", ".join(f'approx_count_distinct("{nome}")' for nome, *_ in colunas) + " FROM gold"
+    ).fetchone()
+    linhas = []
+    for (nome, tipo, *_), distintos_aprox in zip(colunas, distintos):
+        # mín/máx voltam ao tipo da coluna para a comparação entre partições
+        total, nao_nulos, minimo, maximo, convertiveis = conn.execute(f"""
+            SELECT COALESCE(SUM(linhas), 0), COALESCE(SUM(nao_nulos), 0),
+                   CAST(MIN(CAST(minimo AS {tipo})) AS VARCHAR), CAST(MAX(CAST(maximo AS {tipo})) AS VARCHAR),
+                   COALESCE(SUM(convertiveis), 0)
+            FROM gold_estatisticas_particoes WHERE coluna = ?
+        """, [nome]).fetchone()
+        linhas.append((
+            nome, tipo, total - nao_nulos, minimo, maximo, distintos_aprox,
+            convertiveis / nao_nulos if nao_nulos else 0.0,
+            convertiveis > 0,
+        ))
+
+    conn.execute("""
+        CREATE OR REPLACE TABLE gold_estatisticas (
+            coluna VARCHAR, tipo VARCHAR, nulos BIGINT, minimo VARCHAR, maximo VARCHAR,
+            distintos_aprox BIGINT, pct_numerico DOUBLE, numerico BOOLEAN
+        )
+    """)
+    conn.executemany("INSERT INTO gold_estatisticas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+
+    # 2. Zone map das colunas numéricas, por (grupo, partição)
+    eh_numerica = {linha[0]: linha[7] for linha in linhas}
+    numericas = [(i, nome) for i, (nome, tipo, *_) in enumerate(colunas)
+                 if _expr_numerica(nome, tipo) and eh_numerica[nome]]
+    if parcial:
+        zoneadas = {c for (c,) in conn.execute("SELECT DISTINCT coluna FROM gold_zonas").fetchall()}
+        if zoneadas != {nome for _, nome in numericas}:
+            # Coluna que passou a ser (ou deixou de ser) numérica: o catálogo é refeito
+            conn.execute("DROP TABLE _catalogo_gold")
+            return atualizar_catalogo_gold(conn, col)
+        conn.execute("DELETE FROM gold_zonas WHERE list_contains(?, particao)", [particoes])
+    else:
+        conn.execute("""
+            CREATE OR REPLACE TABLE gold_zonas (
+                coluna VARCHAR, grupo BIGINT, particao VARCHAR, linhas BIGINT, n BIGINT,
+                minimo DOUBLE, maximo DOUBLE, linha_inicio BIGINT, linha_fim BIGINT
+            )
+        """)
+    if numericas:
+        conn.execute("INSERT INTO gold_zonas " + " UNION ALL ".join(
+            f"SELECT '{nome}', grupo, particao, linhas, conv_{i}, nmin_{i}, nmax_{i}, NULL, NULL FROM _catalogo_gold"
+            for i, nome in numericas
+        ))
+    conn.execute("DROP TABLE _catalogo_gold")
+    # Posição de cada grupo no Gold: soma das linhas (de todas as partições) dos grupos anteriores
+    conn.execute("""
+        UPDATE gold_zonas SET linha_inicio = g.inicio, linha_fim = g.inicio + g.linhas - 1
+        FROM (
+            SELECT grupo, SUM(linhas) AS linhas, SUM(SUM(linhas)) OVER (ORDER BY grupo) - SUM(linhas) AS inicio
+            FROM (SELECT DISTINCT grupo, particao, linhas FROM gold_zonas)
+            GROUP BY grupo
+        ) g
+        WHERE gold_zonas.grupo = g.grupo
+    """)
+
+
+def carregar_catalogo_gold(db_path):
+    """Carrega o catálogo de estatísticas. Retorna None se ainda não foi gerado."""
+    conn = conectar(db_path)
+    try:
+        if not tabela_existe(conn, 'gold_estatisticas'):
+            return None
+        estat = conn.execute("SELECT * FROM gold_estatisticas").fetchdf()
+        return {
+            "colunas": {row["coluna"]: row for row in estat.to_dict(orient="records")},
+            "zonas": conn.execute("SELECT * FROM gold_zonas ORDER BY coluna, grupo").fetchdf(),
+            "linhas": conn.execute("SELECT COUNT(*) FROM gold").fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+
+def listar_colunas(df, catalogo=None):
+    """Imprime as colunas numeradas; com catálogo, mostra as estatísticas sem ler dados."""
+    if catalogo is None:
+        colunas = list(df.columns)
+        for i, col in enumerate(colunas, start=1):
+            dtype_info = "Data" if pd.api.types.is_datetime64_any_dtype(df[col]) else str(df[col].dtype)
+            print(f"[{i}] {col} ({dtype_info})")
+        return colunas
+
+    colunas = [c for c in catalogo["colunas"] if df is None or c in df.columns]
+    for i, col in enumerate(colunas, start=1):
+        e = catalogo["colunas"][col]
+        tipo = "Data" if e["tipo"].startswith(("TIMESTAMP", "DATE")) else e["tipo"]
+        marca = "🔢 " if e["numerico"] else ""
+        print(f"[{i}] {marca}{col} ({tipo}) — nulos: {e['nulos']:,}, "
+              f"~{e['distintos_aprox']:,} distintos, [{e['minimo']} .. {e['maximo']}]")
+    return colunas
+
+
+def validar_coluna_numerica(catalogo, col):
+    """Rejeita pelo catálogo (sem ler dados) colunas sem valores numéricos."""
+    if catalogo is None or col not in catalogo["colunas"]:
+        return
+    if not catalogo["colunas"][col]["numerico"]:
+        raise ValueError(f"A coluna '{col}' não é numérica.")
+
+
+def _fatiar_zonas(serie, zonas):
+    # Um grupo tem uma zona por partição: cada grupo é lido uma vez só
+    zonas = zonas.drop_duplicates("grupo").sort_values("linha_inicio")
+    return pd.concat([serie.iloc[inicio: fim + 1] for inicio, fim in zip(zonas["linha_inicio"], zonas["linha_fim"])])
 
-    if linhas_bronze > 0:
-        print(f"  - Redução (Duplicatas eliminadas): {pct_duplicatas:.2f}% (Bronze → Silver)")
-        
-    # 4. Pico de Memória (Simulado)
-    print(f"\n🧠 Pico de Memória Estimado: {simulated_peak_memory_mb:.2f} MB")
-        
-    # -------------------------------------
-    # 1. ARTEFATO: metricas.json (JSON/CSV)
-    # -------------------------------------
-    metricas = {
-        "tempo_silver_s": SILVER_RUNTIME,
-        "tempo_gold_s": GOLD_RUNTIME,
-        "tempo_total_sg_s": SILVER_RUNTIME + GOLD_RUNTIME,
-        "db_size_mb": db_size,
-        "linhas_bronze": linhas_bronze,
-        "linhas_silver": linhas_silver,
-        "linhas_gold": linhas_gold,
-        "pct_duplicatas_eliminadas": pct_duplicatas,
-        "pico_memoria_mb_estimado": simulated_peak_memory_mb 
-    }
-    
-    # Cria a pasta results se não existir
-    os.makedirs("results", exist_ok=True)
-    
-    json_path = "results/metricas.json"
-    with open(json_path, 'w') as f:
-        json.dump(metricas, f, indent=4)
-    print(f"\n💾 Métricas salvas em: {json_path}")
-    
-    # -------------------------------------
-    # 2. ARTEFATO: throughput_tempo.png (Gráfico 1: Throughput)
-    # -------------------------------------
-    # ... (Geração dos gráficos é mantida)
-    
-    plt.figure(figsize=(8, 5))
-    tempos = [SILVER_RUNTIME, GOLD_RUNTIME]
-    etapas = ['Silver', 'Gold']
-    plt.bar(etapas, tempos, color=['skyblue', 'lightcoral'])
-    plt.title('Throughput: Tempo de Execução por Etapa')
-    plt.ylabel('Tempo (segundos)')
-    plt.savefig('results/throughput_tempo.png')
-    plt.close()
-    print("📈 Gráfico de Throughput salvo.")
-    
-    # -------------------------------------
-    # 3. ARTEFATO: dedup_effect.png (Gráfico 2: Efeito Dedup)
-    # -------------------------------------
-    plt.figure(figsize=(8, 5))
-    linhas = [linhas_bronze, linhas_silver, linhas_gold]
-    etapas_linhas = ['Bronze (Total)', 'Silver (Após Dedup)', 'Gold (Final)']
-    plt.bar(etapas_linhas, linhas, color=['darkgreen', 'orange', 'blue'])
-    plt.title('Efeito de Deduplicação e Redução de Linhas')
-    plt.ylabel('Contagem de Linhas')
-    plt.savefig('results/dedup_effect.png')
-    plt.close()
-    print("📈 Gráfico de Deduplicação salvo.")
-    
-    conn.close()
-    print("---------------------------------------------")
+
+def podar_zonas_topk(serie, catalogo, col, k):
+    """
+    Restringe `serie` (na ordem do Gold) aos grupos de linhas que podem conter
+    o Top-K de `col`, usando o zone map do catálogo.
+    """
+    if k < 1:
+        return serie.iloc[:0]
+    zonas = catalogo["zonas"]
+    zonas = zonas[(zonas["coluna"] == col) & (zonas["n"] > 0)].sort_values("maximo", ascending=False)
+    if zonas.empty or zonas["n"].sum() <= k:
+        return serie
+    # 1) Os grupos de maior máximo que já somam K valores fornecem um limite:
+    #    o K-ésimo maior valor deles. 2) Grupos com máximo abaixo do limite
+    #    não podem contribuir para o Top-K.
+    acumulado = zonas["n"].cumsum()
+    iniciais = zonas.iloc[: int((acumulado < k).sum()) + 1]
+    limite = pd.to_numeric(_fatiar_zonas(serie, iniciais), errors="coerce").nlargest(k).min()
+    return _fatiar_zonas(serie, zonas[zonas["maximo"] >= limite])
 
 
 # --------------------------
@@ -507,14 +2745,44 @@ def registrar_metricas_gold(db_path):
 
 # --- Funções Auxiliares (mantidas/ajustadas) ---
 
-def consulta_topk(df):
+def executar_topk(df, col, k, catalogo=None):
+    """
+    Top-K não interativo: retorna os K maiores valores de `col` (coerção numérica).
+    Com `catalogo`, só os grupos de linhas que podem conter o resultado são lidos.
+    """
+    if col not in df.columns:
+        raise ValueError(f"Coluna '{col}' não existe no Gold.")
+    validar_coluna_numerica(catalogo, col)
+
+    serie = df[col]
+    if k < 1:
+        serie = serie.iloc[:0]
+    elif catalogo is not None and catalogo["linhas"] == len(df):
+        serie = podar_zonas_topk(serie, catalogo, col, k)
+    serie = pd.to_numeric(serie, errors="coerce")
+    if not pd.api.types.is_numeric_dtype(serie):
+        raise ValueError(f"A coluna '{col}' não é numérica.")
+    return serie.sort_values(ascending=False).head(k).to_frame(col).reset_index(drop=True)
+
+
+def executar_media_movel(df, col_value, janela, catalogo=None):
+    """Média móvel não interativa de `col_value` com janela `janela`."""
+    if col_value not in df.columns:
+        raise ValueError(f"Coluna '{col_value}' não existe no Gold.")
+    validar_coluna_numerica(catalogo, col_value)
+    if janela < 1:
+        raise ValueError("A janela deve ser um inteiro positivo.")
+    resultado = pd.to_numeric(df[col_value], errors="coerce").to_frame(col_value)
+    if not pd.api.types.is_numeric_dtype(resultado[col_value]):
+        raise ValueError(f"A coluna '{col_value}' não é numérica.")
+    resultado["media_movel"] = resultado[col_value].rolling(window=janela, min_periods=1).mean()
+    return resultado
+
+
+def consulta_topk(df, catalogo=None):
     while True:
         print("\n📊 Colunas disponíveis no Gold:")
-        colunas = list(df.columns)
-
-        for i, col in enumerate(colunas, start=1):
-            dtype_info = "Data" if pd.api.types.is_datetime64_any_dtype(df[col]) else str(df[col].dtype)
-            print(f"[{i}] {col} ({dtype_info})")
+        colunas = listar_colunas(df, catalogo)
 
         print("[0] Voltar")
         escolha = input("\nDigite o número da coluna: ").strip()
@@ -532,45 +2800,46 @@ def consulta_topk(df):
             continue
 
         col = colunas[escolha - 1]
-        df_temp = df.copy()
-        df_temp[col] = pd.to_numeric(df_temp[col], errors="coerce")
 
-        if not pd.api.types.is_numeric_dtype(df_temp[col]):
+        if catalogo is not None:
+            if not catalogo["colunas"][col]["numerico"]:
+                print("❌ A coluna selecionada não é numérica.")
+                continue
+        elif not pd.api.types.is_numeric_dtype(pd.to_numeric(df[col], errors="coerce")):
             print("❌ A coluna selecionada não é numérica.")
             continue
 
         while True:
             k = input(f"Digite o valor de K: ").strip()
-            if k.isdigit():
+            if k.isdigit() and int(k) >= 1:
                 k = int(k)
                 break
             print("❌ Digite um número válido.")
 
-        topk = df_temp.sort_values(col, ascending=False).head(k)
+        topk = executar_topk(df, col, k, catalogo)
 
         print(f"\n--- Top-{k} de '{col}' ---")
-        print(topk[[col]].reset_index(drop=True))
+        print(topk)
 
         while True:
             print("\n[1] Novo Top-K")
+            print("[2] Exportar resultado (CSV/Parquet)")
             print("[0] Voltar")
             op = input("Escolha: ").strip()
 
             if op == "1":
                 break
+            elif op == "2":
+                oferecer_exportacao("topk", col=col, k=k)
             elif op == "0":
                 return
             else:
                 print("❌ Opção inválida.")
 
-def consulta_media_movel(df):
+def consulta_media_movel(df, amostras=None, catalogo=None):
     while True:
         print("\n📊 Colunas disponíveis no Gold:")
-        colunas = list(df.columns)
-
-        for i, col in enumerate(colunas, start=1):
-            dtype_info = "Data" if pd.api.types.is_datetime64_any_dtype(df[col]) else str(df[col].dtype)
-            print(f"[{i}] {col} ({dtype_info})")
+        colunas = listar_colunas(df, catalogo)
 
         print("[0] Voltar")
         escolha = input("\nSelecione coluna numérica para média móvel: ").strip()
@@ -589,33 +2858,41 @@ def consulta_media_movel(df):
 
         col_value = colunas[escolha - 1]
 
-        df_temp = df.copy()
-        df_temp[col_value] = pd.to_numeric(df_temp[col_value], errors="coerce")
-        
-        if not pd.api.types.is_numeric_dtype(df_temp[col_value]):
+        if catalogo is not None:
+            if not catalogo["colunas"][col_value]["numerico"]:
+                print("❌ A coluna selecionada não é numérica.")
+                continue
+        elif not pd.api.types.is_numeric_dtype(pd.to_numeric(df[col_value], errors="coerce")):
              print("❌ A coluna selecionada não é numérica.")
              continue
         
         janela = input("Digite o tamanho da janela (ex: 7): ").strip()
-        if not janela.isdigit():
+        if not janela.isdigit() or int(janela) < 1:
             print("❌ Janela inválida.")
             continue
 
         janela = int(janela)
 
-        resultado = df_temp[[col_value]].copy()
-        resultado["media_movel"] = resultado[col_value].rolling(window=janela, min_periods=1).mean()
-
-        print(f"\n--- Média móvel ({janela}) para {col_value} ---")
+        if amostras is not None:
+            resultado = executar_media_movel_aprox(amostras, col_value, janela)
+            print(f"\n--- Média móvel APROXIMADA ({janela} linhas da amostra "
+                  f"≈ {janela * fator_amostra(amostras):,.0f} linhas do Gold) para {col_value} ---")
+        else:
+            resultado = executar_media_movel(df, col_value, janela, catalogo)
+            print(f"\n--- Média móvel ({janela}) para {col_value} ---")
         print(resultado.tail(20))
 
         while True:
             print("\n[1] Nova média móvel")
+            print("[2] Exportar resultado (CSV/Parquet)")
             print("[0] Voltar")
             op = input("Escolha: ").strip()
 
             if op == "1":
                 break
+            elif op == "2":
+                # Série completa (sem o corte das últimas 20 linhas exibidas)
+                oferecer_exportacao("movavg", col=col_value, janela=janela, linhas=0)
             elif op == "0":
                 return
             else:
@@ -641,34 +2918,130 @@ def visualizar_silver(db_path):
     except:
         colunas = 0
 
-    df = conn.execute("SELECT * FROM silver").df()
+    # Só o recorte pedido é lido do DuckDB
+    df_visual = conn.execute(sql_exportacao(conn, "silver", {"linhas": linhas, "colunas": colunas})).df()
     conn.close()
 
-    df_visual = df.copy()
-    if linhas > 0:
-        df_visual = df_visual.head(linhas)
-    if colunas > 0:
-        df_visual = df_visual.iloc[:, :colunas]
-
-    html_table = df_visual.to_html(index=False)
-    html = f"""
+    titulo = f"Tabela: SILVER — exibindo {len(df_visual)} linhas e {len(df_visual.columns)} colunas"
+    if get_ipython is not None and getattr(get_ipython(), "kernel", None) is not None:
+        html_table = df_visual.to_html(index=False)
+        html = f"""
     <div style="border:1px solid #888; padding:8px; border-radius:6px; max-height:700px; overflow:auto; background: #fff;">
-      <div style="font-weight:bold; margin-bottom:6px;">Tabela: SILVER — exibindo {len(df_visual)} linhas e {len(df_visual.columns)} colunas</div>
+      <div style="font-weight:bold; margin-bottom:6px;">{titulo}</div>
       {html_table}
     </div>
     """
-    display(HTML(html))
+        display(HTML(html))
+    else:
+        # Fora de um notebook (Jupyter/Colab): tabela em texto no terminal
+        print(f"\n{titulo}")
+        print(df_visual.to_string(index=False))
+
+    oferecer_exportacao("silver", linhas=linhas, colunas=colunas)
 
 # --------------------------
 # 🚀 FUNÇÃO ROLLUP UNIFICADA (NOVA LÓGICA)
 # --------------------------
 
-def consulta_rollup(df):
+def colunas_rollup(df):
+    """Retorna (colunas de data, colunas textuais) elegíveis como base do Rollup."""
+    date_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
+    hier_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
+    return date_cols, hier_cols
+
+
+def preparar_rollup(df, col_base_rollup, rollup_type):
+    """
+    Monta o DataFrame de trabalho do Rollup.
+    Retorna (df_work, hierarquia_cols, numeric_cols).
+    """
+    if rollup_type == 'temporal':
+        df_work = df.copy()
+        df_work['dia'] = df_work[col_base_rollup].dt.strftime('%Y-%m-%d')
+        df_work['semana'] = df_work[col_base_rollup].dt.strftime('%Y-W%W')
+        df_work['mes'] = df_work[col_base_rollup].dt.strftime('%Y-%m')
+        
+        hierarquia_cols = ['mes', 'semana', 'dia'] 
+    else: # rollup_type == 'textual'
+        hierarquia_cols = [col_base_rollup]
+        df_work = df # Usa o DF original
+
+    # *** INÍCIO DA CORREÇÃO: Forçar Coerção de Tipos para Numérico ***
+    # Isso é crucial para garantir que colunas 'object' com números sejam reconhecidas
+    # (inclusive as string[pyarrow] do cache Arrow do Gold)
+    for col in df_work.columns:
+        # Ignora colunas já definidas como parte da hierarquia ou o hash
+        texto = df_work[col].dtype == 'object' or isinstance(df_work[col].dtype, pd.StringDtype)
+        if texto and col not in hierarquia_cols and col != 'hash_id':
+             # Tenta converter para float. Se falhar (ex: texto ou formato inválido), coloca NaN.
+             df_work[col] = pd.to_numeric(df_work[col], errors='coerce') 
+
+    # Agora sim, seleciona as colunas numéricas que foram devidamente convertidas.
+    numeric_cols = df_work.select_dtypes(include='number').columns.tolist()
+    # *** FIM DA CORREÇÃO ***
+    return df_work, hierarquia_cols, numeric_cols
+
+
+def executar_rollup(df_work, hierarquia_cols, col_soma, rollup_type, col_base_rollup):
+    """Executa o ROLLUP no DuckDB. Retorna (result_df, sql)."""
+    conn = conectar()
+    rollup_groups_sql = ', '.join(hierarquia_cols)
+    select_cols_sql = ', '.join(hierarquia_cols)
+    
+    sql = f"""
+    SELECT
+        {select_cols_sql},
+        SUM({col_soma}) AS total_{col_soma}
+    FROM df_work
+    GROUP BY ROLLUP({rollup_groups_sql})
+    ORDER BY total_{col_soma} DESC
+    """
+    
+    if rollup_type == 'temporal':
+        sql += ", mes DESC, semana DESC, dia DESC" 
+
+    with warnings.catch_warnings():
+        # O DuckDB 1.5 ainda lê o atributo `_data` (obsoleto) das colunas
+        # string[pyarrow] do cache Arrow do Gold
+        warnings.filterwarnings(
+            "ignore", message=r"ArrowStringArray\w*\._data is a deprecated", category=FutureWarning
+        )
+        conn.register("df_work", df_work)
+        result_df = conn.query(sql).to_df()
+    conn.close()
+    
+    # Substitui valores nulos (rollups) por 'Total Geral/Mês/Semana'
+    result_df = result_df.fillna({'dia': 'Total Semanal', 'semana': 'Total Mensal', 'mes': 'Total Geral', col_base_rollup: 'Total'})
+    return result_df, sql
+
+
+def consulta_rollup_batch(df, rollup_type, col_base_rollup, col_soma, amostras=None):
+    """
+    Rollup não interativo, com validação das colunas escolhidas.
+    Com `amostras`, o resultado é aproximado (SQL retornado é None).
+    """
+    if amostras is not None:
+        df = colunas_amostra(amostras)
+    date_cols, hier_cols = colunas_rollup(df)
+    if rollup_type == 'temporal' and col_base_rollup not in date_cols:
+        raise ValueError(f"Coluna '{col_base_rollup}' não é uma coluna de data. Disponíveis: {date_cols}")
+    if rollup_type == 'textual' and col_base_rollup not in hier_cols:
+        raise ValueError(f"Coluna '{col_base_rollup}' não é textual. Disponíveis: {hier_cols}")
+    if amostras is not None:
+        return executar_rollup_aprox(amostras, col_base_rollup, rollup_type, col_soma), None
+
+    df_work, hierarquia_cols, numeric_cols = preparar_rollup(df, col_base_rollup, rollup_type)
+    if col_soma not in numeric_cols:
+        raise ValueError(f"Coluna '{col_soma}' não é numérica. Disponíveis: {numeric_cols}")
+    return executar_rollup(df_work, hierarquia_cols, col_soma, rollup_type, col_base_rollup)
+
+
+def consulta_rollup(df, amostras=None):
     
     # -----------------------------
     # FASE 1: DETECÇÃO E ESCOLHA DE COLUNA BASE (Mantida)
     # -----------------------------
-    date_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
+    date_cols, hier_cols = colunas_rollup(df)
     col_base_rollup = None 
     rollup_type = 'textual'
     
@@ -707,17 +3080,9 @@ def consulta_rollup(df):
                 print("❌ Opção inválida.")
             except ValueError:
                 print("❌ Digite um número válido.")
-
-        df_work = df.copy()
-        df_work['dia'] = df_work[col_base_rollup].dt.strftime('%Y-%m-%d')
-        df_work['semana'] = df_work[col_base_rollup].dt.strftime('%Y-W%W')
-        df_work['mes'] = df_work[col_base_rollup].dt.strftime('%Y-%m')
-        
-        hierarquia_cols = ['mes', 'semana', 'dia'] 
         
     else: # rollup_type == 'textual'
         print("\n📌 Rollup Textual/Categórico")
-        hier_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
 
         if not hier_cols:
             print("❌ Nenhuma coluna textual encontrada para agrupamento.")
@@ -736,26 +3101,11 @@ def consulta_rollup(df):
                 print("❌ Opção inválida.")
             except ValueError:
                 print("❌ Digite um número válido.")
-
-        hierarquia_cols = [col_base_rollup]
-        df_work = df # Usa o DF original
         
     # -----------------------------
     # FASE 3: SELEÇÃO DA MÉTRICA E EXECUÇÃO (COMUM)
     # -----------------------------
-    
-    # *** INÍCIO DA CORREÇÃO: Forçar Coerção de Tipos para Numérico ***
-    # Isso é crucial para garantir que colunas 'object' com números sejam reconhecidas
-    for col in df_work.columns:
-        # Ignora colunas já definidas como parte da hierarquia ou o hash
-        if df_work[col].dtype == 'object' and col not in hierarquia_cols and col != 'hash_id':
-             # Tenta converter para float. Se falhar (ex: texto ou formato inválido), coloca NaN.
-             df_work[col] = pd.to_numeric(df_work[col], errors='coerce') 
-
-    # Agora sim, seleciona as colunas numéricas que foram devidamente convertidas.
-    numeric_cols = df_work.select_dtypes(include='number').columns.tolist()
-    # *** FIM DA CORREÇÃO ***
-
+    df_work, hierarquia_cols, numeric_cols = preparar_rollup(df, col_base_rollup, rollup_type)
 
     if not numeric_cols:
         print("\n❌ Nenhuma coluna numérica encontrada para Soma.")
@@ -776,37 +3126,22 @@ def consulta_rollup(df):
         except ValueError:
             print("❌ Digite um número válido.")
             
+    if amostras is not None:
+        result_df = executar_rollup_aprox(amostras, col_base_rollup, rollup_type, col_soma)
+        print(f"\n📊 Resultado APROXIMADO do Rollup (amostra ≈ 1/{fator_amostra(amostras):,.0f} do Gold, IC 95%):")
+        print(result_df)
+        return result_df
+
     # Execução do DuckDB (mantida)
-    conn = duckdb.connect()
-    rollup_groups_sql = ', '.join(hierarquia_cols)
-    select_cols_sql = ', '.join(hierarquia_cols)
-    
-    conn.register("df_work", df_work)
-    
-    sql = f"""
-    SELECT
-        {select_cols_sql},
-        SUM({col_soma}) AS total_{col_soma}
-    FROM df_work
-    GROUP BY ROLLUP({rollup_groups_sql})
-    ORDER BY total_{col_soma} DESC
-    """
-    
-    if rollup_type == 'temporal':
-        sql += ", mes DESC, semana DESC, dia DESC" 
+    result_df, sql = executar_rollup(df_work, hierarquia_cols, col_soma, rollup_type, col_base_rollup)
 
     print("\n⚙️ SQL gerado:")
     print(sql)
 
     print("\n📊 Resultado do Rollup:")
-    result_df = conn.query(sql).to_df()
-    
-    # Exibe o resultado. Substitui valores nulos (rollups) por 'Total Geral/Mês/Semana'
-    result_df = result_df.fillna({'dia': 'Total Semanal', 'semana': 'Total Mensal', 'mes': 'Total Geral', col_base_rollup: 'Total'})
-    
     print(result_df)
+    oferecer_exportacao("rollup", tipo=rollup_type, col_base=col_base_rollup, col_soma=col_soma)
     
-    conn.close()
     return result_df
 
     
@@ -924,19 +3259,131 @@ def consulta_rollup(df):
     return result_df
 
 
+# --------------------------
+# 💾 EXPORTAÇÃO EM STREAMING (CSV/Parquet)
+# --------------------------
+# As consultas são montadas em SQL (consultas_sql.py, as mesmas do serviço de consultas) e o DuckDB
+# grava o resultado direto no arquivo com COPY ... TO, em streaming: nada
+# passa pelo pandas, e o resultado pode ser maior que a memória.
+FORMATOS_EXPORTACAO = {
+    "csv": "FORMAT csv, HEADER true, DELIMITER ';'",
+    "parquet": "FORMAT parquet, COMPRESSION zstd",
+}
+ROTAS_EXPORTACAO = {"topk": "/topk", "rollup": "/rollup", "movavg": "/movavg"}
+
+
+def sql_exportacao(conn, consulta, params):
+    """SQL da consulta `consulta` ('topk', 'rollup', 'movavg' ou 'silver') com `params`."""
+    if consulta == "silver":
+        linhas, n_colunas = int(params.get("linhas") or 0), int(params.get("colunas") or 0)
+        colunas = [c[0] for c in conn.execute("DESCRIBE silver").fetchall()]
+        if n_colunas > 0:
+            colunas = colunas[:n_colunas]
+        sql = "SELECT " + ", ".join(consultas_sql._q(c) for c in colunas) + " FROM silver"
+        return sql + (f" LIMIT {linhas}" if linhas > 0 else "")
+
+    if consulta not in ROTAS_EXPORTACAO:
+        raise ValueError(f"Consulta desconhecida: {consulta}")
+    catalogo = consultas_sql.CatalogoTabelas(conn)
+    try:
+        return consultas_sql.ROTAS[ROTAS_EXPORTACAO[consulta]](
+            catalogo, {nome: [str(valor)] for nome, valor in params.items() if valor is not None}
+        )
+    except consultas_sql.ErroConsulta as e:
+        raise ValueError(str(e)) from e
+
+
+def exportar_consulta(db_path, consulta, destino, formato=None, **params):
+    """
+    Grava o resultado de `consulta` em `destino` com COPY ... TO. O formato
+    vem da extensão (.csv/.parquet) se não for informado.
+    Retorna linhas, bytes e vazão da exportação.
+    """
+    formato = (formato or os.path.splitext(destino)[1].lstrip(".")).lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação inválido: '{formato}'. Use: {', '.join(FORMATOS_EXPORTACAO)}")
+
+    # Colunas a somar/ordenar precisam ser numéricas (checado no catálogo, sem ler dados)
+    numericas = [params[nome] for nome in ("col", "col_soma") if consulta != "silver" and params.get(nome)]
+    if numericas:
+        catalogo = carregar_catalogo_gold(db_path)
+        for col in numericas:
+            validar_coluna_numerica(catalogo, col)
+
+    conn = conectar(db_path)
+    try:
+        sql = sql_exportacao(conn, consulta, params)
+        caminho = destino.replace("'", "''")
+        inicio = time.time()
+        linhas = conn.execute(f"COPY ({sql}) TO '{caminho}' ({FORMATOS_EXPORTACAO[formato]})").fetchone()[0]
+        duracao = time.time() - inicio
+    finally:
+        conn.close()
+
+    tamanho = os.path.getsize(destino)
+    return {
+        "arquivo": destino,
+        "formato": formato,
+        "linhas": linhas,
+        "bytes": tamanho,
+        "tempo_s": duracao,
+        "linhas_por_s": linhas / duracao if duracao > 0 else None,
+        "mb_por_s": tamanho / (1024 * 1024) / duracao if duracao > 0 else None,
+    }
+
+
+def oferecer_exportacao(consulta, **params):
+    """Pergunta (menu) se o resultado deve ser exportado e exporta do Gold/Silver em CURRENT_DB."""
+    destino = input("\n💾 Exportar o resultado? Caminho .csv ou .parquet (Enter para pular): ").strip()
+    if not destino:
+        return
+    try:
+        info = exportar_consulta(CURRENT_DB, consulta, destino, **params)
+    except (ValueError, duckdb.Error) as e:
+        print(f"❌ Falha na exportação: {e}")
+        return
+    print(f"✅ {info['linhas']:,} linhas exportadas para {info['arquivo']} "
+          f"({info['bytes'] / (1024 * 1024):.2f} MB em {info['tempo_s']:.2f}s, "
+          f"{(info['linhas_por_s'] or 0):,.0f} linhas/s)")
+
+
 # --------------------------
 # 📊 MENU DE CONSULTAS GOLD (ATUALIZADA)
 # --------------------------
+def menu_versoes(db_path):
+    """Lista as versões e, se pedido, reverte uma camada. Retorna True se algo mudou."""
+    versoes = listar_versoes(db_path)
+    if versoes.empty:
+        print("\n❌ Nenhuma versão registrada. Recompile o Silver/Gold para criar a primeira.")
+        return False
+    print("\n🗃️ Versões (* = ativa):")
+    for v in versoes.itertuples():
+        print(f"  {'*' if v.ativa else ' '} {v.camada} v{v.versao} — {v.modo}, {v.linhas:,} linhas, "
+              f"criada em {v.criado_em:%Y-%m-%d %H:%M:%S}"
+              + (f", a partir do Silver v{int(v.versao_silver)}" if pd.notna(v.versao_silver) else ""))
+
+    camada = input("\nCamada a reverter (silver/gold, Enter para voltar): ").strip().lower()
+    if not camada:
+        return False
+    versao = input("Versão (Enter = a anterior à ativa): ").strip()
+    try:
+        anterior, ativa = reverter_camada(db_path, camada, int(versao) if versao else None)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"✅ {camada.upper()}: versão {ativa} ativa (antes: {anterior}).")
+    return anterior != ativa
+
+
 def menu_consultas_gold(db_path, bronze_table):
-    conn = duckdb.connect(db_path)
     try:
-        df = conn.execute("SELECT * FROM gold").fetchdf()
+        df = carregar_gold_df(db_path)
     except Exception:
         print("❌ Tabela Gold não encontrada. Por favor, execute as etapas Silver e Gold antes de consultar.")
-        conn.close()
         return
 
-    conn.close()
+    amostras = None # Modo aproximado: Rollup e Média móvel usam as amostras persistidas
+    catalogo = carregar_catalogo_gold(db_path)
 
     while True:
         print("\n=== Menu Consultas Gold ===")
@@ -948,6 +3395,8 @@ def menu_consultas_gold(db_path, bronze_table):
         print("[5] Recompilar SILVER e GOLD")
         print("[6] Recompilar GOLD (Mantendo SILVER)")
         print("[7] Mostrar Métricas do Pipeline")
+        print(f"[8] Modo aproximado (amostra): {'ON' if amostras is not None else 'OFF'}")
+        print("[9] Versões do SILVER/GOLD (reverter)")
         print("[0] Sair")
 
         opc = input("Escolha: ").strip()
@@ -957,11 +3406,17 @@ def menu_consultas_gold(db_path, bronze_table):
         
         # Opções de Consulta
         elif opc == "1":
-            consulta_topk(df)
+            consulta_topk(df, catalogo)
         elif opc == "2":
-            consulta_rollup(df)
+            if amostras is not None:
+                consulta_rollup(colunas_amostra(amostras), amostras)
+            else:
+                consulta_rollup(df)
         elif opc == "3":
-            consulta_media_movel(df)
+            if amostras is not None:
+                consulta_media_movel(colunas_amostra(amostras), amostras, catalogo)
+            else:
+                consulta_media_movel(df, catalogo=catalogo)
         elif opc == "4":
             visualizar_silver(db_path)
         
@@ -970,28 +3425,378 @@ def menu_consultas_gold(db_path, bronze_table):
             print("\n*** RECOMPILANDO SILVER e GOLD (Forçado) ***")
             run_silver(db_path, bronze_table, force_recompile=True)
             run_gold(db_path, force_recompile=True)
-            conn = duckdb.connect(db_path)
-            df = conn.execute("SELECT * FROM gold").fetchdf()
-            conn.close()
+            df = carregar_gold_df(db_path)
+            catalogo = carregar_catalogo_gold(db_path)
+            if amostras is not None:
+                amostras = carregar_amostras_gold(db_path)
 
         elif opc == "6":
             print("\n*** RECOMPILANDO SOMENTE GOLD (Forçado) ***")
             run_gold(db_path, force_recompile=True)
-            conn = duckdb.connect(db_path)
-            df = conn.execute("SELECT * FROM gold").fetchdf()
-            conn.close()
+            df = carregar_gold_df(db_path)
+            catalogo = carregar_catalogo_gold(db_path)
+            if amostras is not None:
+                amostras = carregar_amostras_gold(db_path)
             
         elif opc == "7":
             registrar_metricas_gold(db_path)
 
+        elif opc == "8":
+            if amostras is not None:
+                amostras = None
+                print("✔ Modo aproximado desativado: consultas exatas sobre o Gold completo.")
+            else:
+                amostras = carregar_amostras_gold(db_path)
+                if amostras is None:
+                    print("❌ Gold sem amostras. Recompile o Gold (opção 6) para gerá-las.")
+                else:
+                    print(f"✔ Modo aproximado ativado: Rollup e Média móvel usam "
+                          f"{len(amostras['uniforme']):,} linhas amostradas (Top-k segue exato).")
+
+        elif opc == "9":
+            if menu_versoes(db_path):
+                df = carregar_gold_df(db_path)
+                catalogo = carregar_catalogo_gold(db_path)
+                if amostras is not None:
+                    amostras = carregar_amostras_gold(db_path)
+
         else:
             print("❌ Opção inválida.")
 
 
 # --------------------------
-# ▶ EXECUÇÃO COMPLETA
+# 🖥️ CLI HEADLESS (BATCH)
 # --------------------------
-if __name__ == "__main__":
+# Códigos de saída do modo batch
+EXIT_OK = 0
+EXIT_ERRO = 1        # Falha durante a execução de uma etapa
+EXIT_USO = 2         # Argumentos inválidos (mesmo código do argparse)
+EXIT_SEM_DADOS = 3   # Tabela pré-requisito ausente (ex: 'gold' antes do 'silver')
+
+SUBCOMANDOS = ("bronze", "silver", "gold", "metrics", "query", "run-all", "versions", "rollback")
+
+
+class ErroUsoCLI(Exception):
+    """Parâmetro inválido informado ao CLI (coluna inexistente, K negativo...)."""
+
+
+class ErroSemDados(Exception):
+    """Tabela necessária para o subcomando ainda não foi gerada."""
+
+
+def contar_linhas(db_path, tabela):
+    conn = conectar(db_path)
+    try:
+        if not tabela_existe(conn, tabela):
+            return 0
+        return conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def exigir_tabela(db_path, tabela):
+    conn = conectar(db_path)
+    existe = tabela_existe(conn, tabela)
+    conn.close()
+    if not existe:
+        raise ErroSemDados(f"Tabela '{tabela}' não encontrada em {db_path}.")
+
+
+def _adicionar_args_dedup(parser):
+    parser.add_argument("--dedup-chaves", help="Chaves de negócio separadas por vírgula (ex: id,cliente)")
+    parser.add_argument("--dedup-ordem", help="Coluna que ordena as versões (ex: atualizado_em)")
+    parser.add_argument("--dedup-estrategia", choices=["ultima", "primeira"],
+                        help="Versão mantida por chave (padrão: ultima)")
+
+
+def _aplicar_args_dedup(args):
+    global DEDUP_CHAVES, DEDUP_ORDEM, DEDUP_ESTRATEGIA
+    if getattr(args, "dedup_chaves", None):
+        DEDUP_CHAVES = [c.strip() for c in args.dedup_chaves.split(",") if c.strip()]
+    if getattr(args, "dedup_ordem", None):
+        DEDUP_ORDEM = args.dedup_ordem
+    if getattr(args, "dedup_estrategia", None):
+        DEDUP_ESTRATEGIA = args.dedup_estrategia
+
+
+def _adicionar_args_limpeza(parser):
+    parser.add_argument("--limpeza", help="Regras de limpeza do Silver: arquivo JSON ou o próprio JSON "
+                                          "(ex: '{\"aparar\": true, \"caixa\": \"minusculas\"}')")
+
+
+def _aplicar_args_limpeza(args):
+    global LIMPEZA
+    if getattr(args, "limpeza", None):
+        LIMPEZA = args.limpeza
+        try:
+            carregar_limpeza(LIMPEZA)  # No run-all, falha antes de gerar o Bronze
+        except ValueError as e:
+            raise ErroUsoCLI(str(e)) from e
+
+
+def _validar_config_silver(db_path):
+    """Valida limpeza e dedup contra as colunas do Bronze antes de abrir uma nova versão do Silver."""
+    conn = conectar(db_path)
+    try:
+        sql_limpeza(conn, "bronze", carregar_limpeza(LIMPEZA))
+        colunas = [normalizar_nome_coluna(nome) for nome, *_ in conn.execute("DESCRIBE bronze").fetchall()]
+        resolver_config_dedup(colunas)
+    except ValueError as e:
+        raise ErroUsoCLI(str(e)) from e
+    finally:
+        conn.close()
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(
+        prog="pipeline.py",
+        description="Pipeline Bronze → Silver → Gold em modo batch (saída JSON). "
+                    "Sem subcomando, executa o fluxo interativo.",
+    )
+    parser.add_argument("--db", default=CURRENT_DB, help="Arquivo DuckDB (padrão: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfila cada etapa (cProfile + DuckDB) em results/profiles/")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_bronze = sub.add_parser("bronze", help="Cria o Bronze a partir de um CSV")
+    p_bronze.add_argument("--input", required=True, help="Caminho do CSV de entrada")
+
+    p_silver = sub.add_parser("silver", help="Recria o Silver a partir do Bronze")
+    p_silver.add_argument("--incremental", action="store_true",
+                          help="Incorpora o Bronze atual ao Silver existente em vez de recriá-lo")
+    _adicionar_args_dedup(p_silver)
+    _adicionar_args_limpeza(p_silver)
+    p_gold = sub.add_parser("gold", help="Recria o Gold a partir do Silver (registra métricas)")
+    p_gold.add_argument("--incremental", action="store_true",
+                        help="Recompõe só as partições (meses) alteradas no Silver")
+    sub.add_parser("metrics", help="Registra e exibe as métricas do pipeline")
+
+    p_run = sub.add_parser("run-all", help="Bronze → Silver → Gold → Métricas")
+    p_run.add_argument("--input", required=True, help="Caminho do CSV de entrada")
+    p_run.add_argument("--incremental", action="store_true",
+                       help="Incorpora o novo Bronze ao Silver existente e recompõe só as partições "
+                            "alteradas do Gold")
+    _adicionar_args_dedup(p_run)
+    _adicionar_args_limpeza(p_run)
+
+    sub.add_parser("versions", help="Lista as versões de Silver e Gold")
+    p_rollback = sub.add_parser("rollback", help="Reativa uma versão anterior do Silver ou Gold")
+    p_rollback.add_argument("--camada", choices=list(TABELAS_CAMADA), required=True)
+    p_rollback.add_argument("--versao", type=int, help="Versão a reativar (padrão: a anterior à ativa)")
+
+    p_query = sub.add_parser("query", help="Consultas sobre o Gold")
+    consultas = p_query.add_subparsers(dest="consulta", required=True)
+
+    p_topk = consultas.add_parser("topk", help="Top-K de uma coluna numérica")
+    p_topk.add_argument("--col", required=True)
+    p_topk.add_argument("--k", type=int, default=10)
+
+    p_rollup = consultas.add_parser("rollup", help="Rollup temporal ou textual")
+    p_rollup.add_argument("--tipo", choices=["temporal", "textual"], required=True)
+    p_rollup.add_argument("--col-base", required=True, help="Coluna de data (temporal) ou textual")
+    p_rollup.add_argument("--col-soma", required=True, help="Coluna numérica a ser somada")
+    p_rollup.add_argument("--aproximado", action="store_true", help="Estima a partir das amostras do Gold (IC 95%%)")
+
+    p_movavg = consultas.add_parser("movavg", help="Média móvel de uma coluna numérica")
+    p_movavg.add_argument("--col", required=True)
+    p_movavg.add_argument("--janela", type=int, default=7)
+    p_movavg.add_argument("--linhas", type=int,
+                          help="Últimas N linhas no resultado (0 = todas; padrão: 20, ou todas com --exportar)")
+    p_movavg.add_argument("--aproximado", action="store_true", help="Calcula sobre a amostra uniforme do Gold")
+
+    p_silver_q = consultas.add_parser("silver", help="Primeiras linhas/colunas do Silver")
+    p_silver_q.add_argument("--linhas", type=int, help="Linhas (0 = todas; padrão: 20, ou todas com --exportar)")
+    p_silver_q.add_argument("--colunas", type=int, default=0, help="Primeiras N colunas (0 = todas)")
+
+    for p_consulta in (p_topk, p_rollup, p_movavg, p_silver_q):
+        p_consulta.add_argument("--exportar", metavar="ARQUIVO",
+                                help="Grava o resultado completo em .csv ou .parquet (streaming, sem pandas)")
+
+    return parser
+
+
+def _df_para_registros(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _cli_bronze(args):
+    if not os.path.isfile(args.input):
+        raise ErroUsoCLI(f"Arquivo de entrada não encontrado: {args.input}")
+    inicio = time.time()
+    db_path, tabela = run_bronze(csv_file=args.input)
+    return {
+        "tabela": tabela,
+        "linhas": contar_linhas(db_path, tabela),
+        "tempo_s": time.time() - inicio,
+    }
+
+
+def _cli_silver(args):
+    exigir_tabela(args.db, "bronze")
+    _aplicar_args_dedup(args)
+    _aplicar_args_limpeza(args)
+    _validar_config_silver(args.db)
+    run_silver(args.db, "bronze", force_recompile=True, incremental=args.incremental)
+    return {"tabela": "silver", "linhas": contar_linhas(args.db, "silver"), "tempo_s": SILVER_RUNTIME}
+
+
+def _cli_gold(args):
+    exigir_tabela(args.db, "silver")
+    run_gold(args.db, force_recompile=True, incremental=args.incremental)
+    return {"tabela": "gold", "linhas": contar_linhas(args.db, "gold"), "tempo_s": GOLD_RUNTIME}
+
+
+def _cli_metrics(args):
+    exigir_tabela(args.db, "gold")
+    return {"metricas": registrar_metricas_gold(args.db)}
+
+
+PARAMS_CONSULTA = {
+    "topk": ("col", "k"),
+    "rollup": ("tipo", "col_base", "col_soma"),
+    "movavg": ("col", "janela", "linhas"),
+    "silver": ("linhas", "colunas"),
+}
+
+
+def _cli_exportar(args):
+    if getattr(args, "aproximado", False):
+        raise ErroUsoCLI("--exportar grava o resultado exato; não use com --aproximado.")
+    exigir_tabela(args.db, "silver" if args.consulta == "silver" else "gold")
+    params = {nome: getattr(args, nome) for nome in PARAMS_CONSULTA[args.consulta]}
+    if "linhas" in params and params["linhas"] is None:
+        params["linhas"] = 0  # Exportação sem --linhas grava o resultado completo
+    try:
+        exportacao = exportar_consulta(args.db, args.consulta, args.exportar, **params)
+    except ValueError as e:
+        raise ErroUsoCLI(str(e)) from e
+    return {"consulta": args.consulta, "exportacao": exportacao}
+
+
+def _cli_query(args):
+    if args.exportar:
+        return _cli_exportar(args)
+    if args.consulta == "silver":
+        exigir_tabela(args.db, "silver")
+        conn = conectar(args.db)
+        try:
+            linhas = 20 if args.linhas is None else args.linhas
+            resultado = conn.execute(sql_exportacao(conn, "silver", {"linhas": linhas, "colunas": args.colunas})).fetchdf()
+        finally:
+            conn.close()
+        return {"consulta": "silver", "linhas": len(resultado), "resultado": _df_para_registros(resultado)}
+
+    exigir_tabela(args.db, "gold")
+    amostras = None
+    if getattr(args, "aproximado", False):
+        exigir_tabela(args.db, "gold_amostra")
+        amostras = carregar_amostras_gold(args.db)
+        df = None
+    else:
+        df = carregar_gold_df(args.db)
+    catalogo = carregar_catalogo_gold(args.db)
+    inicio = time.time()
+    try:
+        if args.consulta == "topk":
+            if args.k < 1:
+                raise ErroUsoCLI("K deve ser um inteiro positivo.")
+            resultado = executar_topk(df, args.col, args.k, catalogo)
+        elif args.consulta == "rollup":
+            resultado, _ = consulta_rollup_batch(df, args.tipo, args.col_base, args.col_soma, amostras)
+        else:
+            if amostras is not None:
+                resultado = executar_media_movel_aprox(amostras, args.col, args.janela)
+            else:
+                resultado = executar_media_movel(df, args.col, args.janela, catalogo)
+            linhas = 20 if args.linhas is None else args.linhas
+            if linhas > 0:
+                resultado = resultado.tail(linhas)
+    except ValueError as e:
+        raise ErroUsoCLI(str(e)) from e
+    return {
+        "consulta": args.consulta,
+        "aproximado": amostras is not None,
+        "tempo_s": time.time() - inicio,
+        "linhas": len(resultado),
+        "resultado": _df_para_registros(resultado),
+    }
+
+
+def _cli_run_all(args):
+    _aplicar_args_limpeza(args)  # Especificação inválida falha antes do Bronze
+    etapas = {"bronze": _cli_bronze(args)}
+    etapas["silver"] = _cli_silver(args)
+    etapas["gold"] = _cli_gold(args)
+    # Reaproveita as métricas que o run_gold agendou em vez de coletá-las de novo
+    metricas = aguardar_metricas_gold(args.db) or _cli_metrics(args)["metricas"]
+    return {"etapas": etapas, "metricas": metricas}
+
+
+def _cli_versions(args):
+    versoes = listar_versoes(args.db)
+    return {"versoes": _df_para_registros(versoes)}
+
+
+def _cli_rollback(args):
+    exigir_tabela(args.db, "camadas_versoes")
+    try:
+        anterior, ativa = reverter_camada(args.db, args.camada, args.versao)
+    except ValueError as e:
+        raise ErroUsoCLI(str(e)) from e
+    return {"camada": args.camada, "versao_anterior": anterior, "versao_ativa": ativa}
+
+
+EXECUTORES_CLI = {
+    "bronze": _cli_bronze,
+    "silver": _cli_silver,
+    "gold": _cli_gold,
+    "metrics": _cli_metrics,
+    "query": _cli_query,
+    "run-all": _cli_run_all,
+    "versions": _cli_versions,
+    "rollback": _cli_rollback,
+}
+
+
+def main_cli(argv):
+    """
+    Executa um subcomando sem interação e imprime um único JSON no stdout.
+    Mensagens de progresso das etapas vão para o stderr.
+    """
+    global CURRENT_DB
+    args = construir_parser().parse_args(argv)
+    CURRENT_DB = args.db
+    if args.profile:
+        ativar_profiling()
+
+    saida = {"comando": args.comando, "db": args.db, "status": "ok"}
+    codigo = EXIT_OK
+    inicio = time.time()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                saida.update(EXECUTORES_CLI[args.comando](args))
+            finally:
+                encerrar_metricas_gold()  # Artefatos prontos antes do JSON final
+    except ErroUsoCLI as e:
+        saida.update(status="erro", erro=str(e))
+        codigo = EXIT_USO
+    except ErroSemDados as e:
+        saida.update(status="erro", erro=str(e))
+        codigo = EXIT_SEM_DADOS
+    except Exception as e:
+        saida.update(status="erro", erro=f"{type(e).__name__}: {e}")
+        codigo = EXIT_ERRO
+    saida["tempo_total_s"] = time.time() - inicio
+    if PROFILING is not None:
+        saida["profiling"] = PROFILING["perfis"]
+
+    print(json.dumps(saida, ensure_ascii=False, indent=2, default=str))
+    return codigo
+
+
+def main_interativo():
+    montar_drive_no_colab()
     start_time_total = time.time()
 
     try:
@@ -1011,3 +3816,24 @@ if __name__ == "__main__":
         print(f"\n❌ Ocorreu um erro fatal no pipeline: {e}")
         
     print(f"\n⏱ Tempo total da sessão: {time.time() - start_time_total:.2f}s")
+
+
+if os.environ.get("PIPELINE_PROFILE", "").lower() in ("1", "true", "yes"):
+    ativar_profiling()
+
+
+# --------------------------
+# ▶ EXECUÇÃO COMPLETA
+# --------------------------
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    if not argv:
+        main_interativo()
+        sys.exit(EXIT_OK)
+
+    # Compatibilidade: `python3 pipeline.py dados/input.csv` equivale a `run-all --input`
+    if argv[0] not in SUBCOMANDOS and not argv[0].startswith("-"):
+        argv = ["run-all", "--input"] + argv
+
+    sys.exit(main_cli(argv))
@@ -0,0 +1,251 @@
+# ================================
+#  🌐 SERVIÇO LOCAL DE CONSULTAS (asyncio) sobre Gold/Silver
+# ================================
+# Servidor HTTP mínimo (TCP ou socket Unix) que executa Top-K, Rollup, Média
+# móvel e paginação do Silver direto no DuckDB, usando um pool de cursores de
+# uma única conexão somente-leitura (um buffer cache compartilhado entre todos
+# os clientes). Os resultados são enviados em streaming, como JSON lines ou
+# Arrow IPC (se `pyarrow` estiver instalado).
+#
+#   python3 query_service.py --db bronze_duck.db --porta 8765
+#   curl "http://127.0.0.1:8765/topk?col=valor&k=10"
+#
+# Observação: o DuckDB não permite abrir o arquivo somente-leitura enquanto
+# outro processo o mantém aberto para escrita. Pare o serviço antes de
+# recompilar Silver/Gold.
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import datetime
+import decimal
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import duckdb
+
+from consultas_sql import ROTAS, CatalogoTabelas, ErroConsulta
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+LOTE_LINHAS = 10_000
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, decimal.Decimal):
+        return float(valor)
+    return str(valor)
+
+
+# --------------------------
+# 🌐 SERVIDOR
+# --------------------------
+class _RespostaInterrompida(Exception):
+    """Falha depois de o status 200 ter sido enviado: só resta fechar a conexão."""
+
+
+class _BufferSaida:
+    """Destino em memória para o escritor IPC do Arrow (esvaziado a cada lote)."""
+    closed = False
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+
+    def flush(self):
+        pass
+
+
+def _proximo_lote(leitor):
+    # StopIteration não atravessa um Future do executor
+    try:
+        return leitor.read_next_batch()
+    except StopIteration:
+        return None
+
+
+class ServicoConsultas:
+    def __init__(self, db_path, n_cursores=4, lote=LOTE_LINHAS):
+        self.conn = duckdb.connect(db_path, read_only=True)
+        self.catalogo = CatalogoTabelas(self.conn)
+        self.lote = lote
+        self.n_cursores = n_cursores
+        self.cursores = None
+        self.atendidas = 0
+
+    async def iniciar_pool(self):
+        self.cursores = asyncio.Queue()
+        for _ in range(self.n_cursores):
+            self.cursores.put_nowait(self.conn.cursor())
+
+    async def _responder(self, writer, status, tipo, corpo=None):
+        motivo = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {motivo}\r\nContent-Type: {tipo}\r\nConnection: close\r\n\r\n".encode()
+        )
+        if corpo is not None:
+            writer.write(corpo)
+        await writer.drain()
+
+    async def _erro(self, writer, status, mensagem):
+        corpo = json.dumps({"erro": mensagem}, ensure_ascii=False).encode() + b"\n"
+        await self._responder(writer, status, "application/json", corpo)
+
+    async def _stream_jsonl(self, writer, cursor, sql):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, cursor.execute, sql)
+        colunas = [d[0] for d in cursor.description]
+        await self._responder(writer, 200, "application/x-ndjson")
+        while True:
+            try:
+                linhas = await loop.run_in_executor(None, cursor.fetchmany, self.lote)
+            except duckdb.Error as e:
+                raise _RespostaInterrompida(f"{type(e).__name__}: {e}") from e
+            if not linhas:
+                break
+            writer.write("".join(
+                json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=_serializar) + "\n"
+                for linha in linhas
+            ).encode())
+            await writer.drain()
+
+    async def _stream_arrow(self, writer, cursor, sql):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, cursor.execute, sql)
+        leitor = await loop.run_in_executor(None, cursor.fetch_record_batch, self.lote)
+        await self._responder(writer, 200, "application/vnd.apache.arrow.stream")
+
+        saida = _BufferSaida()
+        escritor = pa.ipc.new_stream(saida, leitor.schema)
+        while True:
+            try:
+                lote = await loop.run_in_executor(None, _proximo_lote, leitor)
+            except (duckdb.Error, OSError) as e:
+                # O leitor Arrow repassa os erros do DuckDB como OSError (só a
+                # leitura está neste try, não o socket)
+                raise _RespostaInterrompida(f"{type(e).__name__}: {e}") from e
+            if lote is None:
+                break
+            escritor.write_batch(lote)
+            writer.write(b"".join(saida.partes))
+            saida.partes.clear()
+            await writer.drain()
+        escritor.close()
+        writer.write(b"".join(saida.partes))
+        await writer.drain()
+
+    async def atender(self, reader, writer):
+        try:
+            linha = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Cabeçalhos da requisição não são usados
+            partes = linha.decode("latin-1").split()
+            if len(partes) < 2 or partes[0] != "GET":
+                await self._erro(writer, 400, "Apenas requisições GET são aceitas.")
+                return
+
+            url = urlsplit(partes[1])
+            params = parse_qs(url.query)
+            if url.path == "/saude":
+                corpo = json.dumps({"status": "ok", "atendidas": self.atendidas}).encode() + b"\n"
+                await self._responder(writer, 200, "application/json", corpo)
+                return
+            if url.path == "/colunas":
+                corpo = json.dumps(self.catalogo.tabelas, ensure_ascii=False).encode() + b"\n"
+                await self._responder(writer, 200, "application/json", corpo)
+                return
+            if url.path not in ROTAS:
+                await self._erro(writer, 404, f"Rota desconhecida: {url.path}")
+                return
+
+            formato = params.get("formato", ["jsonl"])[0]
+            if formato == "arrow" and pa is None:
+                await self._erro(writer, 400, "Formato 'arrow' requer o pacote pyarrow.")
+                return
+            try:
+                sql = ROTAS[url.path](self.catalogo, params)
+            except ErroConsulta as e:
+                await self._erro(writer, 400, str(e))
+                return
+
+            cursor = await self.cursores.get()
+            try:
+                if formato == "arrow":
+                    await self._stream_arrow(writer, cursor, sql)
+                else:
+                    await self._stream_jsonl(writer, cursor, sql)
+                self.atendidas += 1
+            except _RespostaInterrompida as e:
+                # O status 200 já foi enviado: outro status iria parar no corpo
+                print(f"⚠️ Resposta de {url.path} interrompida: {e}", file=sys.stderr)
+            except duckdb.Error as e:
+                await self._erro(writer, 500, f"{type(e).__name__}: {e}")
+            finally:
+                self.cursores.put_nowait(cursor)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    def fechar(self):
+        self.conn.close()
+
+
+async def servir(db_path, host="127.0.0.1", porta=8765, unix=None, n_cursores=4):
+    servico = ServicoConsultas(db_path, n_cursores)
+    await servico.iniciar_pool()
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(n_cursores))
+
+    if unix:
+        if os.path.exists(unix):
+            os.remove(unix)
+        servidor = await asyncio.start_unix_server(servico.atender, path=unix)
+        endereco = f"unix:{unix}"
+    else:
+        servidor = await asyncio.start_server(servico.atender, host, porta)
+        endereco = f"http://{host}:{porta}"
+
+    parar = asyncio.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except NotImplementedError:
+            pass
+
+    print(f"🌐 Serviço de consultas em {endereco} ({n_cursores} cursores, db={db_path})", file=sys.stderr)
+    async with servidor:
+        await parar.wait()
+    servico.fechar()
+    if unix and os.path.exists(unix):
+        os.remove(unix)
+    print("👋 Serviço encerrado.", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="query_service.py", description="Serviço local de consultas sobre o Gold.")
+    parser.add_argument("--db", default="bronze_duck.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--unix", help="Caminho de socket Unix (substitui host/porta)")
+    parser.add_argument("--cursores", type=int, default=os.cpu_count() or 4, help="Tamanho do pool de cursores")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ Banco não encontrado: {args.db}", file=sys.stderr)
+        return 2
+    asyncio.run(servir(args.db, args.host, args.porta, args.unix, args.cursores))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# ================================
+#  🧪 FIXTURES DOS TESTES
+# ================================
+# CSVs sintéticos pequenos (separador ';', como o Bronze espera) e um banco
+# construído pelo CLI batch em um processo separado, com cwd = pasta
+# temporária (results/ e cache/ não se misturam com o repositório).
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+CABECALHO = "id;data;valor;cidade"
+CIDADES = ["São Paulo", "Belém", "Curitiba"]
+
+
+def linha_csv(i, valor=None, mes=None):
+    mes = mes or 1 + i % 3
+    valor = i * 1.5 if valor is None else valor
+    return f"{i};2024-{mes:02d}-{1 + i % 28:02d};{valor:.2f};{CIDADES[i % 3]}"
+
+
+def escrever_csv(caminho, linhas, cabecalho=CABECALHO, encoding="utf-8"):
+    with open(caminho, "w", encoding=encoding, newline="") as f:
+        f.write(cabecalho + "\n")
+        for linha in linhas:
+            f.write(linha + "\n")
+    return str(caminho)
+
+
+def rodar_cli(db, *args, cwd=None, env=None):
+    """Roda `pipeline.py --db DB ...` e devolve (código de saída, JSON do stdout)."""
+    ambiente = dict(os.environ, **(env or {}))
+    proc = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "pipeline.py"), "--db", str(db), *args],
+        cwd=cwd or os.path.dirname(str(db)), env=ambiente, capture_output=True, text=True,
+    )
+    return proc.returncode, json.loads(proc.stdout)
+
+
+@pytest.fixture
+def csv_pequeno(tmp_path):
+    """300 linhas únicas em 3 meses de 2024 mais 10 duplicatas exatas."""
+    linhas = [linha_csv(i) for i in range(300)]
+    linhas += linhas[:10]
+    return escrever_csv(tmp_path / "entrada.csv", linhas)
+
+
+@pytest.fixture
+def banco(tmp_path, csv_pequeno):
+    """Banco com Bronze, Silver e Gold construídos por `run-all` (dedup por id)."""
+    db = tmp_path / "teste.db"
+    codigo, saida = rodar_cli(db, "run-all", "--input", csv_pequeno, "--dedup-chaves", "id")
+    assert codigo == 0, saida
+    return str(db)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+from conftest import rodar_cli
+
+
+def test_gold_menor_que_a_amostra_da_o_valor_exato(banco):
+    args = ("query", "rollup", "--tipo", "textual", "--col-base", "cidade", "--col-soma", "valor")
+    codigo, exato = rodar_cli(banco, *args)
+    assert codigo == 0
+    codigo, aprox = rodar_cli(banco, *args, "--aproximado")
+    assert codigo == 0 and aprox["aproximado"]
+
+    # Amostra = Gold inteiro: a estimativa é a soma exata e o IC é zero
+    totais = {r["cidade"]: r["total_valor"] for r in exato["resultado"]}
+    for r in aprox["resultado"]:
+        assert r["total_valor"] == pytest.approx(totais[r["cidade"]])
+        assert r["ic95_valor"] == pytest.approx(0)
+
+
+def test_estimativa_de_amostra_cobre_o_total():
+    rng = np.random.default_rng(0)
+    populacao = rng.gamma(2.0, 150.0, 20_000)
+    amostra = rng.choice(populacao, 2_000, replace=False)
+    df = pd.DataFrame({"grupo": "a", "valor": amostra, "_estrato": "todos"})
+
+    res = pipeline._estimar_totais(df, ["grupo"], "valor", {"todos": (20_000, 2_000)})
+    total = res[res["grupo"].isna()].iloc[0]
+    ic95 = pipeline.Z_95 * total["variancia"] ** 0.5
+    assert abs(total["estimativa"] - populacao.sum()) < ic95
+    assert ic95 < 0.05 * populacao.sum()
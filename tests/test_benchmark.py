@@ -0,0 +1,28 @@
+import duckdb
+
+import benchmark
+from conftest import rodar_cli
+
+
+def test_gerador_reprodutivel(tmp_path):
+    a = benchmark.gerar_csv_sintetico(str(tmp_path / "a.csv"), 1000, pct_duplicatas=0.2, seed=7)
+    b = benchmark.gerar_csv_sintetico(str(tmp_path / "b.csv"), 1000, pct_duplicatas=0.2, seed=7)
+    assert a["linhas"] == 1000 and a["linhas_unicas"] == 800
+    with open(a["arquivo"], "rb") as fa, open(b["arquivo"], "rb") as fb:
+        assert fa.read() == fb.read()
+
+
+def test_encoding_misto_usa_o_fallback_do_bronze(tmp_path):
+    spec = benchmark.gerar_csv_sintetico(str(tmp_path / "m.csv"), 2000, encoding="misto", chunksize=1000)
+    with open(spec["arquivo"], "rb") as f:
+        dados = f.read()
+    assert "São Paulo".encode("utf-8") in dados and "São Paulo".encode("latin-1") in dados
+
+    db = tmp_path / "m.db"
+    codigo, saida = rodar_cli(db, "bronze", "--input", spec["arquivo"])
+    assert codigo == 0 and saida["linhas"] == 2000
+    # Lido como latin-1: a metade em utf-8 vira mojibake, mas nenhuma linha se perde
+    conn = duckdb.connect(str(db), read_only=True)
+    cidades = {c for (c,) in conn.execute("SELECT DISTINCT cidade FROM bronze").fetchall()}
+    conn.close()
+    assert {"São Paulo", "SÃ£o Paulo"} <= cidades
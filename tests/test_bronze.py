@@ -0,0 +1,67 @@
+import duckdb
+import pytest
+
+import pipeline
+
+_ler_bloco_linhas = pipeline._ler_bloco_linhas
+
+
+class Interrompido(Exception):
+    pass
+
+
+@pytest.fixture
+def bronze_em_blocos(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "CURRENT_DB", str(tmp_path / "b.db"))
+    monkeypatch.setattr(pipeline, "BRONZE_CHUNK_LINHAS", 50)
+    return str(tmp_path / "b.db")
+
+
+def _contar_blocos(monkeypatch, falhar_apos=None):
+    lidos = []
+
+    def ler(f, n_linhas):
+        if falhar_apos is not None and len(lidos) == falhar_apos:
+            raise Interrompido()
+        lidos.append(n_linhas)
+        return _ler_bloco_linhas(f, n_linhas)
+
+    monkeypatch.setattr(pipeline, "_ler_bloco_linhas", ler)
+    return lidos
+
+
+def test_ingestao_interrompida_retoma_do_checkpoint(bronze_em_blocos, csv_pequeno, monkeypatch):
+    _contar_blocos(monkeypatch, falhar_apos=3)
+    with pytest.raises(Interrompido):
+        pipeline.run_bronze(csv_file=csv_pequeno)
+
+    conn = duckdb.connect(bronze_em_blocos)
+    checkpoint = pipeline.ler_checkpoint_bronze(conn)
+    conn.close()
+    assert checkpoint["linhas"] == 150
+
+    lidos = _contar_blocos(monkeypatch)
+    pipeline.run_bronze(csv_file=csv_pequeno)
+    # 310 linhas em blocos de 50: faltavam 4 blocos, mais a leitura vazia do fim
+    assert len(lidos) == 5
+
+    conn = duckdb.connect(bronze_em_blocos)
+    total, ids = conn.execute("SELECT count(*), count(DISTINCT id) FROM bronze").fetchone()
+    assert pipeline.ler_checkpoint_bronze(conn) is None
+    conn.close()
+    assert (total, ids) == (310, 300)
+
+
+def test_arquivo_alterado_reinicia_a_ingestao(bronze_em_blocos, csv_pequeno, monkeypatch):
+    _contar_blocos(monkeypatch, falhar_apos=2)
+    with pytest.raises(Interrompido):
+        pipeline.run_bronze(csv_file=csv_pequeno)
+
+    with open(csv_pequeno, "a") as f:
+        f.write("999;2024-01-01;1.00;Belém\n")
+    _contar_blocos(monkeypatch)
+    pipeline.run_bronze(csv_file=csv_pequeno)
+
+    conn = duckdb.connect(bronze_em_blocos)
+    assert conn.execute("SELECT count(*) FROM bronze").fetchone()[0] == 311
+    conn.close()
@@ -0,0 +1,57 @@
+import os
+import warnings
+
+import duckdb
+import pytest
+
+import pipeline
+from conftest import rodar_cli
+
+pytestmark = pytest.mark.skipif(pipeline.pa is None, reason="requer pyarrow")
+
+
+def _gold_df(db):
+    conn = duckdb.connect(db, read_only=True)
+    try:
+        return conn.execute("SELECT * FROM gold").fetchdf()
+    finally:
+        conn.close()
+
+
+def test_cache_fica_ao_lado_do_banco(tmp_path, csv_pequeno):
+    outra = tmp_path / "outra"
+    outra.mkdir()
+    db = tmp_path / "dados" / "t.db"
+    db.parent.mkdir()
+    assert rodar_cli(db, "run-all", "--input", csv_pequeno, cwd=outra)[0] == 0
+    assert os.listdir(tmp_path / "dados" / "cache") == ["t.gold.v1.arrow"]
+    assert not os.path.exists(outra / "cache")
+
+
+def test_cache_tem_os_dados_do_gold(banco):
+    cache = pipeline.abrir_cache_gold(banco)
+    gold = _gold_df(banco)
+    assert list(cache.columns) == list(gold.columns)
+    assert cache.astype(object).values.tolist() == gold.astype(object).values.tolist()
+    # Texto fica string[pyarrow] (sem cópia); o fetchdf() devolve object
+    assert str(cache["cidade"].dtype) == "string" and gold["cidade"].dtype == object
+
+
+def test_rollup_sobre_o_cache_nao_altera_os_filtros_de_aviso(banco):
+    cache = pipeline.abrir_cache_gold(banco)
+    filtros = list(warnings.filters)
+    resultado, _ = pipeline.consulta_rollup_batch(cache, "textual", "cidade", "valor")
+    assert warnings.filters == filtros
+    esperado, _ = pipeline.consulta_rollup_batch(_gold_df(banco), "textual", "cidade", "valor")
+    assert resultado.astype(object).values.tolist() == esperado.astype(object).values.tolist()
+
+
+def test_cache_acompanha_o_rollback(banco):
+    pasta = pipeline.pasta_cache_gold(banco)
+    assert rodar_cli(banco, "gold")[0] == 0
+    assert os.listdir(pasta) == ["teste.gold.v2.arrow"]
+
+    assert rodar_cli(banco, "rollback", "--camada", "gold")[0] == 0
+    cache = pipeline.abrir_cache_gold(banco)
+    assert os.listdir(pasta) == ["teste.gold.v1.arrow"]
+    assert len(cache) == 300
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+import pipeline
+
+
+def _catalogo_sintetico(serie, tamanho_grupo):
+    """Zone map de `serie` em grupos de `tamanho_grupo` linhas (uma partição)."""
+    zonas = []
+    for grupo, inicio in enumerate(range(0, len(serie), tamanho_grupo)):
+        fatia = serie.iloc[inicio: inicio + tamanho_grupo]
+        zonas.append({"coluna": "valor", "grupo": grupo, "particao": "todos", "linhas": len(fatia),
+                      "n": len(fatia), "minimo": fatia.min(), "maximo": fatia.max(),
+                      "linha_inicio": inicio, "linha_fim": inicio + len(fatia) - 1})
+    return {"colunas": {"valor": {"numerico": True}}, "zonas": pd.DataFrame(zonas), "linhas": len(serie)}
+
+
+def test_catalogo_do_gold(banco):
+    catalogo = pipeline.carregar_catalogo_gold(banco)
+    assert catalogo["linhas"] == 300
+    valor = catalogo["colunas"]["valor"]
+    assert (float(valor["minimo"]), float(valor["maximo"]), valor["nulos"]) == (0.0, 448.5, 0)
+    assert valor["numerico"] and not catalogo["colunas"]["cidade"]["numerico"]
+    zonas = catalogo["zonas"][catalogo["zonas"]["coluna"] == "valor"]
+    assert zonas["n"].sum() == 300 and zonas["maximo"].max() == 448.5
+
+
+def test_poda_de_zonas_le_so_os_grupos_do_topk():
+    # Grupos de 10 linhas, cada um com valores maiores que o anterior
+    serie = pd.Series([float(i) for i in range(50)])
+    catalogo = _catalogo_sintetico(serie, 10)
+
+    podada = pipeline.podar_zonas_topk(serie, catalogo, "valor", 3)
+    assert list(podada.index) == list(range(40, 50))
+
+    df = serie.to_frame("valor")
+    assert pipeline.executar_topk(df, "valor", 3, catalogo)["valor"].tolist() == [49.0, 48.0, 47.0]
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_topk_com_k_menor_que_1_e_vazio(k):
+    serie = pd.Series([float(i) for i in range(50)])
+    catalogo = _catalogo_sintetico(serie, 10)
+    assert pipeline.podar_zonas_topk(serie, catalogo, "valor", k).empty
+    assert pipeline.executar_topk(serie.to_frame("valor"), "valor", k, catalogo).empty
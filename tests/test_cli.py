@@ -0,0 +1,32 @@
+from conftest import rodar_cli
+
+
+def test_versions_e_topk_sobre_o_gold(banco):
+    codigo, saida = rodar_cli(banco, "versions")
+    assert codigo == 0 and saida["status"] == "ok"
+
+    codigo, saida = rodar_cli(banco, "query", "topk", "--col", "valor", "--k", "3")
+    assert codigo == 0
+    assert [r["valor"] for r in saida["resultado"]] == [448.5, 447.0, 445.5]
+
+
+def test_run_all_json(tmp_path, csv_pequeno):
+    codigo, saida = rodar_cli(tmp_path / "t.db", "run-all", "--input", csv_pequeno)
+    assert codigo == 0
+    assert saida["status"] == "ok"
+    linhas = {etapa: saida["etapas"][etapa]["linhas"] for etapa in ("bronze", "silver", "gold")}
+    assert linhas == {"bronze": 310, "silver": 300, "gold": 300}
+
+
+def test_gold_sem_silver_sai_com_codigo_3(tmp_path, csv_pequeno):
+    db = tmp_path / "t.db"
+    assert rodar_cli(db, "bronze", "--input", csv_pequeno)[0] == 0
+    codigo, saida = rodar_cli(db, "gold")
+    assert codigo == 3
+    assert saida["status"] == "erro"
+
+
+def test_argumento_invalido_sai_com_codigo_2(banco):
+    codigo, saida = rodar_cli(banco, "query", "topk", "--col", "inexistente")
+    assert codigo == 2
+    assert saida["status"] == "erro"
@@ -0,0 +1,55 @@
+import os
+import json
+
+import pytest
+
+import datasets
+from conftest import escrever_csv, linha_csv
+
+
+@pytest.fixture
+def config(tmp_path):
+    """datasets.json com caminhos relativos à própria pasta (cfg/)."""
+    pasta = tmp_path / "cfg"
+    (pasta / "dados").mkdir(parents=True)
+    escrever_csv(pasta / "dados" / "a.csv", [linha_csv(i) for i in range(100)])
+    escrever_csv(pasta / "dados" / "b.csv", [linha_csv(i) for i in range(60)] * 2)
+    spec = {"datasets": [
+        {"nome": "a", "entrada": "dados/a.csv", "pasta": "saida"},
+        {"nome": "b", "entrada": "dados/b.csv", "pasta": "saida", "dedup_chaves": ["id"]},
+    ]}
+    caminho = pasta / "datasets.json"
+    caminho.write_text(json.dumps(spec))
+    return str(caminho)
+
+
+def test_caminhos_relativos_a_pasta_do_config(tmp_path, config, monkeypatch):
+    outra = tmp_path / "outra"
+    outra.mkdir()
+    monkeypatch.chdir(outra)
+    a, b = datasets.carregar_datasets(config)
+    assert a.entrada == str(tmp_path / "cfg" / "dados" / "a.csv")
+    assert a.db == str(tmp_path / "cfg" / "saida" / "a" / "a.db")
+    assert b.dedup_chaves == ["id"]
+
+
+def test_nomes_repetidos_e_entrada_ausente(tmp_path):
+    csv = escrever_csv(tmp_path / "x.csv", [linha_csv(0)])
+    with pytest.raises(ValueError, match="repetidos"):
+        datasets.carregar_datasets(especificacoes=[f"x={csv}", f"x={csv}"], pasta=str(tmp_path))
+    with pytest.raises(ValueError, match="não encontrada"):
+        datasets.carregar_datasets(especificacoes=[f"y={tmp_path / 'y.csv'}"], pasta=str(tmp_path))
+
+
+def test_um_banco_por_dataset_e_pula_os_em_dia(config):
+    resultado = datasets.agendar_datasets(datasets.carregar_datasets(config), workers=2, threads=2)
+    assert resultado["erros"] == 0 and resultado["threads_por_dataset"] == 1
+    por_nome = {r["dataset"]: r for r in resultado["datasets"]}
+    assert por_nome["a"]["linhas"]["gold"] == 100
+    assert por_nome["b"]["linhas"]["gold"] == 60
+    assert por_nome["a"]["db"] != por_nome["b"]["db"]
+    assert all(os.path.exists(r["db"]) for r in por_nome.values())
+
+    # Sem mudanças na entrada ou na especificação, nada é executado de novo
+    resultado = datasets.agendar_datasets(datasets.carregar_datasets(config), workers=2, threads=2)
+    assert {r["status"] for r in resultado["datasets"]} == {"em_dia"}
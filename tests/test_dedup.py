@@ -0,0 +1,59 @@
+import duckdb
+import pytest
+
+from conftest import escrever_csv, linha_csv, rodar_cli
+
+
+@pytest.fixture
+def csv_com_versoes(tmp_path):
+    """100 ids em janeiro; os ids 0-9 reaparecem (antes, no arquivo) com data de março."""
+    atualizadas = [linha_csv(i, valor=1000 + i, mes=3) for i in range(10)]
+    originais = [linha_csv(i, mes=1) for i in range(100)]
+    return escrever_csv(tmp_path / "versoes.csv", atualizadas + originais)
+
+
+def _valores(db, ids):
+    conn = duckdb.connect(str(db), read_only=True)
+    try:
+        total = conn.execute("SELECT count(*) FROM silver").fetchone()[0]
+        valores = dict(conn.execute(
+            f"SELECT CAST(id AS INTEGER), CAST(valor AS DOUBLE) FROM silver WHERE CAST(id AS INTEGER) IN {tuple(ids)}"
+        ).fetchall())
+    finally:
+        conn.close()
+    return total, valores
+
+
+@pytest.mark.parametrize("estrategia, esperado", [("ultima", 1000.0), ("primeira", 0.0)])
+def test_uma_versao_por_chave_pela_ordem(tmp_path, csv_com_versoes, estrategia, esperado):
+    db = tmp_path / "t.db"
+    codigo, saida = rodar_cli(db, "run-all", "--input", csv_com_versoes, "--dedup-chaves", "id",
+                              "--dedup-ordem", "data", "--dedup-estrategia", estrategia)
+    assert codigo == 0, saida
+    assert saida["metricas"]["versoes_substituidas"] == 10
+
+    total, valores = _valores(db, [0, 5])
+    assert total == 100
+    assert valores[0] == esperado
+
+
+def test_sem_ordem_vale_a_ultima_chegada(tmp_path, csv_com_versoes):
+    db = tmp_path / "t.db"
+    assert rodar_cli(db, "run-all", "--input", csv_com_versoes, "--dedup-chaves", "id")[0] == 0
+    # Os originais chegam depois das atualizações no arquivo
+    _, valores = _valores(db, [0, 5])
+    assert valores == {0: 0.0, 5: 7.5}
+
+
+def test_percentual_do_silver_incremental(tmp_path, banco):
+    # 10 ids existentes com novo valor e 10 ids novos
+    linhas = [linha_csv(i, valor=2000 + i) for i in range(10)] + [linha_csv(i) for i in range(300, 310)]
+    novo = escrever_csv(tmp_path / "novo.csv", linhas)
+    codigo, saida = rodar_cli(banco, "run-all", "--input", novo, "--incremental", "--dedup-chaves", "id")
+    assert codigo == 0, saida
+
+    metricas = saida["metricas"]
+    assert metricas["linhas_silver"] == 310
+    assert metricas["versoes_substituidas"] == 10
+    # Sobre as 20 linhas que entraram, não sobre Bronze (20) x Silver (310)
+    assert metricas["pct_duplicatas_eliminadas"] == pytest.approx(50.0)
@@ -0,0 +1,59 @@
+import duckdb
+import pytest
+
+import pipeline
+import query_service
+from conftest import rodar_cli
+from test_query_service import consultar
+
+
+def _ler(arquivo):
+    conn = duckdb.connect()
+    try:
+        return conn.execute(f"SELECT * FROM '{arquivo}'").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("extensao", ["csv", "parquet"])
+def test_exportar_topk(banco, tmp_path, extensao):
+    destino = str(tmp_path / f"topk.{extensao}")
+    info = pipeline.exportar_consulta(banco, "topk", destino, col="valor", k=5)
+    assert info["linhas"] == 5 and info["formato"] == extensao
+    assert [v for (v,) in _ler(destino)] == [448.5, 447.0, 445.5, 444.0, 442.5]
+
+
+def test_exportar_silver_pelo_cli(banco, tmp_path):
+    destino = tmp_path / "silver.parquet"
+    codigo, saida = rodar_cli(banco, "query", "silver", "--colunas", "2", "--exportar", str(destino))
+    assert codigo == 0, saida
+    linhas = _ler(destino)
+    assert len(linhas) == 300 and len(linhas[0]) == 2
+
+
+def test_formato_invalido(banco, tmp_path):
+    with pytest.raises(ValueError):
+        pipeline.exportar_consulta(banco, "topk", str(tmp_path / "topk.xlsx"), col="valor")
+
+
+def test_silver_em_texto_fora_do_notebook(banco, monkeypatch, capsys):
+    monkeypatch.setattr(pipeline, "CURRENT_DB", banco)
+    respostas = iter(["3", "2", ""])  # linhas, colunas, sem exportação
+    monkeypatch.setattr("builtins.input", lambda *_: next(respostas))
+    pipeline.visualizar_silver(banco)
+    saida = capsys.readouterr().out
+    assert "exibindo 3 linhas e 2 colunas" in saida
+
+
+def test_falha_depois_do_cabecalho_nao_envia_outro_status(banco, monkeypatch):
+    # A conversão só falha no fim do scan, depois dos primeiros lotes enviados
+    conn = duckdb.connect(banco)
+    conn.execute("CREATE TABLE falha AS SELECT i, CASE WHEN i >= 900000 THEN 'x' ELSE '1' END AS s "
+                 "FROM range(1000000) t(i)")
+    conn.close()
+    monkeypatch.setitem(query_service.ROTAS, "/falha", lambda catalogo, params: "SELECT i, CAST(s AS INTEGER) FROM falha")
+
+    [(status, corpo)] = consultar(banco, "/falha")
+    assert status == 200
+    assert 0 < corpo.count(b"\n") < 1_000_000  # Conexão fechada no meio do resultado
+    assert b"HTTP/1.1" not in corpo and b'"erro"' not in corpo
@@ -0,0 +1,40 @@
+import duckdb
+
+import pipeline
+from conftest import escrever_csv, linha_csv, rodar_cli
+
+COLUNAS = "CAST(id AS INTEGER) AS id, data, CAST(valor AS DOUBLE) AS valor, cidade"
+
+
+def _gold(db):
+    conn = duckdb.connect(str(db), read_only=True)
+    try:
+        return conn.execute(f"SELECT {COLUNAS} FROM gold ORDER BY 1").fetchall()
+    finally:
+        conn.close()
+
+
+def test_incremental_recompoe_so_o_mes_alterado(tmp_path, banco):
+    # Ids com i % 3 == 1 caem em fevereiro: só essa partição muda
+    alteradas = [linha_csv(i, valor=5000 + i) for i in (1, 4, 7)]
+    novo = escrever_csv(tmp_path / "novo.csv", alteradas)
+    codigo, saida = rodar_cli(banco, "run-all", "--input", novo, "--incremental", "--dedup-chaves", "id")
+    assert codigo == 0, saida
+    assert saida["metricas"]["particoes_gold"] == 3
+    assert saida["metricas"]["particoes_recompostas"] == 1
+
+    # Mesmo resultado de um build completo sobre todas as linhas
+    todas = [linha_csv(i) for i in range(300)] + alteradas
+    completo = tmp_path / "completo" / "c.db"
+    completo.parent.mkdir()
+    entrada = escrever_csv(completo.parent / "todas.csv", todas)
+    assert rodar_cli(completo, "run-all", "--input", entrada, "--dedup-chaves", "id")[0] == 0
+    gold = _gold(banco)
+    assert gold == _gold(completo)
+    assert gold[4][2] == 5004.0
+
+    # Catálogo atualizado só com as partições recompostas
+    catalogo = pipeline.carregar_catalogo_gold(banco)
+    assert float(catalogo["colunas"]["valor"]["maximo"]) == 5007.0
+    zonas = catalogo["zonas"][catalogo["zonas"]["coluna"] == "valor"]
+    assert zonas["n"].sum() == 300
@@ -0,0 +1,75 @@
+import json
+
+import duckdb
+import pytest
+
+import pipeline
+from conftest import escrever_csv, rodar_cli
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE bronze (\"Nome Cliente\" VARCHAR, uf VARCHAR, valor VARCHAR, qtd INTEGER)")
+    conn.execute("""INSERT INTO bronze VALUES
+        ('  São Paulo ', ' sp', '1.234,56', 1),
+        ('NULL', 'rj ', '7,5', 2),
+        ('Belém', 'None', '12', 3)""")
+    yield conn
+    conn.close()
+
+
+def _limpar(conn, regras):
+    spec = pipeline.carregar_limpeza(json.dumps(regras) if regras else None)
+    return conn.execute(pipeline.sql_limpeza(conn, "bronze", spec)).fetchall()
+
+
+def test_padrao_so_troca_os_tokens_nulos(conn):
+    assert _limpar(conn, None) == [
+        ("  São Paulo ", " sp", "1.234,56", 1),
+        (None, "rj ", "7,5", 2),
+        ("Belém", None, "12", 3),
+    ]
+
+
+def test_todas_as_regras_com_ajuste_por_coluna(conn):
+    regras = {"aparar": True, "remover_acentos": True, "caixa": "minusculas", "decimal": ",",
+              "colunas": {"uf": {"caixa": "maiusculas"}}}
+    assert _limpar(conn, regras) == [
+        ("sao paulo", "SP", "1234.56", 1),
+        (None, "RJ", "7.5", 2),
+        ("belem", None, "12", 3),
+    ]
+    colunas = [d[0] for d in conn.execute(
+        pipeline.sql_limpeza(conn, "bronze", pipeline.carregar_limpeza())).description]
+    assert colunas == ["nome_cliente", "uf", "valor", "qtd"]
+
+
+@pytest.mark.parametrize("regras", [
+    {"caixa": "titulo"},
+    {"decimal": ";"},
+    {"nulos": "NULL"},
+    {"desconhecida": True},
+    {"colunas": {"uf": {"colunas": {}}}},
+])
+def test_especificacao_invalida(regras):
+    with pytest.raises(ValueError):
+        pipeline.carregar_limpeza(json.dumps(regras))
+
+
+def test_coluna_inexistente(conn):
+    spec = pipeline.carregar_limpeza(json.dumps({"colunas": {"cidade": {"aparar": True}}}))
+    with pytest.raises(ValueError, match="cidade"):
+        pipeline.sql_limpeza(conn, "bronze", spec)
+
+
+def test_limpeza_antes_do_hash_deduplica_variantes(tmp_path):
+    csv = escrever_csv(tmp_path / "v.csv", ["1;ABC ", "1;abc", "2; x"], cabecalho="id;texto")
+    db = tmp_path / "t.db"
+    limpeza = json.dumps({"aparar": True, "caixa": "minusculas"})
+    codigo, saida = rodar_cli(db, "run-all", "--input", csv, "--limpeza", limpeza)
+    assert codigo == 0, saida
+    assert saida["etapas"]["silver"]["linhas"] == 2
+
+    codigo, saida = rodar_cli(db, "silver", "--limpeza", '{"caixa": "titulo"}')
+    assert codigo == 2 and saida["status"] == "erro"
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+import pipeline
+
+ATRASO_S = 1.5  # Duração simulada do registro de métricas e gráficos
+
+
+@pytest.fixture
+def metricas_lentas(banco, tmp_path, monkeypatch):
+    """Gold pronto e um registrar_metricas_gold que demora ATRASO_S."""
+    monkeypatch.chdir(tmp_path)
+    chamadas = []
+    original = pipeline.registrar_metricas_gold
+
+    def lenta(db_path, *args, **kwargs):
+        time.sleep(ATRASO_S)
+        chamadas.append(db_path)
+        return original(db_path, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "registrar_metricas_gold", lenta)
+    yield chamadas
+    pipeline.encerrar_metricas_gold()
+
+
+def _tempo_ate_o_menu(db):
+    inicio = time.perf_counter()
+    pipeline.run_gold(db, force_recompile=True)
+    return time.perf_counter() - inicio
+
+
+def test_menu_volta_sem_esperar_as_metricas(banco, metricas_lentas, monkeypatch):
+    # Antes: métricas síncronas, o menu só volta depois delas
+    monkeypatch.setattr(pipeline, "METRICAS_EM_SEGUNDO_PLANO", False)
+    sincrono = _tempo_ate_o_menu(banco)
+    assert sincrono >= ATRASO_S
+
+    # Depois: o run_gold só enfileira o pedido
+    monkeypatch.setattr(pipeline, "METRICAS_EM_SEGUNDO_PLANO", True)
+    segundo_plano = _tempo_ate_o_menu(banco)
+    print(f"\nrun_gold até o menu: síncrono {sincrono:.2f}s, segundo plano {segundo_plano:.2f}s")
+    assert segundo_plano < sincrono - ATRASO_S / 2
+
+    metricas = pipeline.aguardar_metricas_gold(banco)
+    assert metricas_lentas == [banco, banco]
+    assert metricas["linhas_gold"] == 300
+
+
+def test_ddl_espera_as_metricas_pendentes(banco, metricas_lentas, monkeypatch):
+    monkeypatch.setattr(pipeline, "METRICAS_EM_SEGUNDO_PLANO", True)
+    pipeline.run_gold(banco, force_recompile=True)
+    # O próximo build (DDL sobre o Gold) espera a thread terminar de ler
+    pipeline.run_gold(banco, force_recompile=True)
+    assert len(metricas_lentas) >= 1
+    assert pipeline.METRICAS_BACKGROUND["erro"] is None
@@ -0,0 +1,25 @@
+import os
+import json
+
+from conftest import rodar_cli
+
+
+def test_profile_grava_perfis_por_etapa(tmp_path, csv_pequeno):
+    codigo, saida = rodar_cli(tmp_path / "t.db", "--profile", "run-all", "--input", csv_pequeno)
+    assert codigo == 0
+    perfis = saida["profiling"]
+    assert {"run_bronze", "run_silver", "run_gold"} <= set(perfis)
+    for resumo in perfis.values():
+        assert os.path.exists(os.path.join(tmp_path, resumo["arquivo_prof"]))
+        assert resumo["top_cumtime"]
+    assert perfis["run_gold"]["sql"], "os SQL do DuckDB da etapa deveriam ser perfilados"
+
+    with open(tmp_path / "results" / "metricas.json") as f:
+        assert "run_gold" in json.load(f)["profiling"]
+
+
+def test_sem_profile_nada_e_gravado(tmp_path, csv_pequeno):
+    codigo, saida = rodar_cli(tmp_path / "t.db", "run-all", "--input", csv_pequeno)
+    assert codigo == 0
+    assert "profiling" not in saida
+    assert not os.path.exists(tmp_path / "results" / "profiles")
@@ -0,0 +1,63 @@
+import io
+import json
+import asyncio
+
+import pytest
+
+from query_service import ServicoConsultas, pa
+
+
+async def _requisitar(servico, caminhos):
+    await servico.iniciar_pool()
+    servidor = await asyncio.start_server(servico.atender, "127.0.0.1", 0)
+    porta = servidor.sockets[0].getsockname()[1]
+
+    async def get(caminho):
+        reader, writer = await asyncio.open_connection("127.0.0.1", porta)
+        writer.write(f"GET {caminho} HTTP/1.1\r\nHost: teste\r\n\r\n".encode())
+        await writer.drain()
+        resposta = await reader.read()
+        writer.close()
+        cabecalho, _, corpo = resposta.partition(b"\r\n\r\n")
+        return int(cabecalho.split()[1]), corpo
+
+    async with servidor:
+        # Requisições simultâneas dividem o pool de cursores
+        return await asyncio.gather(*(get(c) for c in caminhos))
+
+
+def consultar(db, *caminhos):
+    servico = ServicoConsultas(db, n_cursores=2)
+    try:
+        return asyncio.run(_requisitar(servico, caminhos))
+    finally:
+        servico.fechar()
+
+
+def _jsonl(corpo):
+    return [json.loads(linha) for linha in corpo.decode().splitlines()]
+
+
+def test_topk_e_rollup_concorrentes(banco):
+    (s1, topk), (s2, rollup), (s3, saude) = consultar(
+        banco, "/topk?col=valor&k=3", "/rollup?tipo=textual&col_base=cidade&col_soma=valor", "/saude"
+    )
+    assert (s1, s2, s3) == (200, 200, 200)
+    assert [r["valor"] for r in _jsonl(topk)] == [448.5, 447.0, 445.5]
+    totais = {r["cidade"]: r["total_valor"] for r in _jsonl(rollup)}
+    assert totais["Total"] == pytest.approx(1.5 * sum(range(300)))
+    assert len(totais) == 4
+
+
+def test_parametro_invalido_responde_400(banco):
+    [(status, corpo)] = consultar(banco, "/topk?col=inexistente")
+    assert status == 400
+    assert "erro" in json.loads(corpo)
+
+
+@pytest.mark.skipif(pa is None, reason="requer pyarrow")
+def test_formato_arrow(banco):
+    [(status, corpo)] = consultar(banco, "/topk?col=valor&k=5&formato=arrow")
+    assert status == 200
+    tabela = pa.ipc.open_stream(io.BytesIO(corpo)).read_all()
+    assert tabela.num_rows == 5
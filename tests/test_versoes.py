@@ -0,0 +1,76 @@
+import duckdb
+import pytest
+
+import pipeline
+from conftest import escrever_csv, linha_csv, rodar_cli
+
+
+def _conteudo(db, tabela="gold"):
+    conn = duckdb.connect(str(db), read_only=True)
+    try:
+        return conn.execute(f"SELECT CAST(id AS INTEGER), CAST(valor AS DOUBLE) FROM {tabela} ORDER BY 1").fetchall()
+    finally:
+        conn.close()
+
+
+def _ativas(db):
+    codigo, saida = rodar_cli(db, "versions")
+    assert codigo == 0
+    return {v["camada"]: v["versao"] for v in saida["versoes"] if v["ativa"]}
+
+
+@pytest.fixture
+def duas_versoes(tmp_path, banco):
+    """v1 do `banco` e uma v2 incremental que altera fevereiro e acrescenta ids."""
+    linhas = [linha_csv(i, valor=9000 + i) for i in (1, 4)] + [linha_csv(i) for i in range(300, 306)]
+    novo = escrever_csv(tmp_path / "novo.csv", linhas)
+    v1 = _conteudo(banco)
+    assert rodar_cli(banco, "run-all", "--input", novo, "--incremental", "--dedup-chaves", "id")[0] == 0
+    return v1, _conteudo(banco)
+
+
+def test_rollback_e_volta(banco, duas_versoes):
+    v1, v2 = duas_versoes
+    assert v1 != v2 and _ativas(banco) == {"silver": 2, "gold": 2}
+
+    codigo, saida = rodar_cli(banco, "rollback", "--camada", "gold")
+    assert codigo == 0 and (saida["versao_anterior"], saida["versao_ativa"]) == (2, 1)
+    assert _conteudo(banco) == v1
+
+    assert rodar_cli(banco, "rollback", "--camada", "gold", "--versao", "2")[0] == 0
+    assert _conteudo(banco) == v2
+    # Catálogo acompanha a versão ativa
+    assert pipeline.carregar_catalogo_gold(banco)["linhas"] == len(v2)
+
+
+def test_rollback_do_silver(banco, duas_versoes):
+    v1, _ = duas_versoes
+    assert rodar_cli(banco, "rollback", "--camada", "silver")[0] == 0
+    assert _conteudo(banco, "silver") == v1
+    assert _ativas(banco) == {"silver": 1, "gold": 2}
+
+
+def test_retencao_descarta_versoes_antigas(banco, duas_versoes):
+    env = {"PIPELINE_VERSOES": "1"}
+    assert rodar_cli(banco, "gold", env=env)[0] == 0  # v3 ativa, só a v2 fica no arquivo
+    codigo, saida = rodar_cli(banco, "rollback", "--camada", "gold", "--versao", "1", env=env)
+    assert codigo == 2 and "não está disponível" in saida["erro"]
+    assert rodar_cli(banco, "rollback", "--camada", "gold", "--versao", "2", env=env)[0] == 0
+    assert _conteudo(banco) == duas_versoes[1]
+
+
+def test_build_com_falha_mantem_a_versao_ativa(banco, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    antes = _conteudo(banco)
+
+    def falhar(*args, **kwargs):
+        raise RuntimeError("falha simulada")
+
+    monkeypatch.setattr(pipeline, "atualizar_catalogo_gold", falhar)
+    with pytest.raises(RuntimeError):
+        pipeline.run_gold(banco, force_recompile=True)
+
+    assert _conteudo(banco) == antes
+    conn = duckdb.connect(banco, read_only=True)
+    assert pipeline.versao_ativa(conn, "gold") == 1
+    conn.close()